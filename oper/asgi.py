@@ -10,10 +10,10 @@ import os
 
 from channels.security.websocket import AllowedHostsOriginValidator
 from channels.routing import ProtocolTypeRouter, URLRouter
-from django.core.asgi import get_asgi_application
 
 
 import quiz.routing
+from quiz.executor import get_asgi_application
 from quiz.middleware import TokenAuthMiddleware
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oper.settings')
@@ -83,6 +83,9 @@ TEMPLATES = [
 ASGI_APPLICATION = 'oper.asgi.application'
 WSGI_APPLICATION = 'oper.wsgi.application'
 
+# Threads running the sync code of ASGI requests and consumers, unset for one per request
+SYNC_EXECUTOR_WORKERS = int(os.getenv('SYNC_EXECUTOR_WORKERS', '0')) or None
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
@@ -99,6 +102,18 @@ DATABASES = {
         }
 }
 
+# Opt-in connection pool per process, see quiz/backends/postgresql
+if os.getenv('POSTGRES_POOL_MAX_SIZE'):
+    DATABASES['default']['ENGINE'] = 'quiz.backends.postgresql'
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE')),
+            'max_idle': float(os.getenv('POSTGRES_POOL_MAX_IDLE', '300')),
+            'timeout': float(os.getenv('POSTGRES_POOL_TIMEOUT', '10')),
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -145,23 +160,66 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "quiz.authentication.CachedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication"
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "quiz.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "quiz.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 20
 }
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379')
 
+# core: channels and groups in Redis lists and sorted sets, pubsub: Redis pub/sub, no group
+# membership writes, memory: single process only, for tests. Several comma separated
+# REDIS_CHANNEL_HOSTS shard channels and groups between them. The core layer's connection
+# pools raise when more commands than REDIS_CHANNEL_MAX_CONNECTIONS are in flight at once, as
+# in a reconnect storm, and its blocking pops wait up to 5 seconds: the socket timeout must be
+# longer than that.
+CHANNEL_LAYER_BACKENDS = {
+    'core': 'channels_redis.core.RedisChannelLayer',
+    'pubsub': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+    'memory': 'channels.layers.InMemoryChannelLayer',
+}
+CHANNEL_LAYER = os.getenv('CHANNEL_LAYER', 'core')
+
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': CHANNEL_LAYER_BACKENDS[CHANNEL_LAYER],
         'CONFIG': {
-            'hosts': [REDIS_URL],
+            'hosts': [
+                {
+                    'address': host,
+                    'max_connections': int(os.getenv('REDIS_CHANNEL_MAX_CONNECTIONS', '1000')),
+                    'socket_timeout': 15,
+                }
+                for host in os.getenv('REDIS_CHANNEL_HOSTS', REDIS_URL).split(',')
+            ],
+        } if CHANNEL_LAYER != 'memory' else {},
+    },
+}
+
+# Shared between processes: answer key versions and cached token users
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'OPTIONS': {
+            # Under ASGI every request may run on its own thread, wait for a free connection
+            # rather than fail when more of them than the pool holds hit the cache at once
+            'pool_class': 'redis.BlockingConnectionPool',
+            'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', '100')),
         },
     },
 }
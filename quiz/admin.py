@@ -1,12 +1,12 @@
 import nested_admin
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from django.db.models import Avg
 from django.template.defaultfilters import truncatechars
 from django.urls import reverse
 from django.utils.html import format_html
 
 from . import models
+from .stats import with_stats
 
 
 class ChoiceInline(nested_admin.NestedTabularInline):
@@ -78,6 +78,9 @@ class QuizAdmin(nested_admin.NestedModelAdmin):
         ),
     )
 
+    def get_queryset(self, request):
+        return with_stats(super().get_queryset(request).select_related("owner"))
+
     def save_model(self, request, obj, form, change):
         """Automatically set the creator to the current user"""
         if not change:  # Only for new objects
@@ -86,20 +89,19 @@ class QuizAdmin(nested_admin.NestedModelAdmin):
 
     @admin.display()
     def total_questions(self, obj):
-        return obj.questions.count()
+        return obj.total_questions
     total_questions.short_description = "Questions"
 
     @admin.display()
     def total_attempts(self, obj):
-        return obj.attempts.count()
+        return obj.stats_in_progress_attempts + obj.stats_completed_attempts + obj.stats_expired_attempts
     total_attempts.short_description = "Attempts"
 
     @admin.display()
     def average_score(self, obj):
-        avg = obj.attempts.filter(status="completed").aggregate(avg_score=Avg("score"))[
-            "avg_score"
-        ]
-        return f"{avg:.1f}" if avg else "N/A"
+        if not obj.stats_completed_attempts:
+            return "N/A"
+        return f"{obj.stats_score_sum / obj.stats_completed_attempts:.1f}"
     average_score.short_description = "Avg Score"
 
     def action_buttons(self, obj):
@@ -156,6 +158,7 @@ class QuizAttemptAdmin(admin.ModelAdmin):
         "action_buttons",
     ]
     list_filter = ["status", "created_at", "quiz"]
+    list_select_related = ["participant", "quiz"]
     search_fields = ["participant__username", "quiz__title"]
     readonly_fields = [
         "id",
@@ -0,0 +1,339 @@
+"""
+Write-behind submission of answers, enabled with the `ANSWER_WRITE_BEHIND` setting.
+
+A submission is checked against the answer key as usual, then its new answers are appended to a
+durable log and the request returns without touching the attempt's row. The `flush_answers`
+command reads the log in order, loads each batch with `grading.ingest_answers` (a COPY, one
+INSERT, one set-based UPDATE of the scores) and only then deletes the batch from the log.
+
+Replaying the log is safe: an answer is inserted once per (attempt, question) and only inserted
+answers are scored, so entries written before a crash but still in the log change nothing the
+second time. A batch the database turns down is split until the entries it cannot take are
+found, the rest is written; those entries are retried with the next flushes and moved to the
+dead-letter stream once they have been turned down ANSWER_LOG_MAX_ATTEMPTS times, so they never
+hold up the answers logged after them. Failing to reach the database leaves the batch in the log. Each logged answer is also kept in its attempt's pending map until it is flushed,
+which keeps a question from being logged twice and lets the participant read their own answers
+(`apply_pending_answers`) before they reach the database.
+
+The default backend keeps the log in a Redis stream, run Redis with `appendonly yes` so accepted
+answers survive a restart. `InMemoryAnswerLog` keeps the same interface in process memory for
+tests and single-process development. Select the backend with the `ANSWER_LOG_BACKEND` setting.
+"""
+import logging
+import threading
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from itertools import count
+from typing import NamedTuple
+
+import redis
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .grading import QueuedAnswer, get_answer_key, ingest_answers
+from .models import Answer, Attempt
+
+logger = logging.getLogger(__name__)
+
+ANSWER_LOG_BATCH_SIZE = getattr(settings, "ANSWER_LOG_BATCH_SIZE", 5000)
+# Seconds the flusher waits when the log is empty
+ANSWER_LOG_FLUSH_INTERVAL = getattr(settings, "ANSWER_LOG_FLUSH_INTERVAL", 0.5)
+# Flushes an entry may be turned down by before it is dead-lettered
+ANSWER_LOG_MAX_ATTEMPTS = getattr(settings, "ANSWER_LOG_MAX_ATTEMPTS", 3)
+
+
+class PendingAnswer(NamedTuple):
+    choice_id: int
+    answered_at: datetime
+
+
+class FlushResult(NamedTuple):
+    entries: int
+    answers: int
+    attempts: int
+    completed: int
+    dead_lettered: int
+
+
+def write_behind() -> bool:
+    return getattr(settings, "ANSWER_WRITE_BEHIND", False)
+
+
+def _parse_pending(value: str) -> PendingAnswer:
+    choice_id, timestamp = value.split(":")
+    return PendingAnswer(int(choice_id), datetime.fromtimestamp(float(timestamp), dt_timezone.utc))
+
+
+class RedisAnswerLog:
+    """
+    Answers in the `answer_log` stream, pending answers in a hash per attempt, the times each
+    entry was turned down in a hash and dead letters in a stream of their own.
+    """
+    # Logs the answers to questions not pending for the attempt yet, atomically. Returns their questions.
+    APPEND_SCRIPT = """
+        local appended = {}
+        for i = 5, #ARGV, 2 do
+            if redis.call('HSETNX', KEYS[2], ARGV[i], ARGV[i + 1] .. ':' .. ARGV[4]) == 1 then
+                redis.call('XADD', KEYS[1], '*', 'attempt', ARGV[1], 'quiz', ARGV[2], 'participant', ARGV[3],
+                           'answered_at', ARGV[4], 'question', ARGV[i], 'choice', ARGV[i + 1])
+                table.insert(appended, ARGV[i])
+            end
+        end
+        return appended
+    """
+
+    def __init__(self, url: str = "", stream: str = "answer_log"):
+        self.redis = redis.Redis.from_url(url or settings.REDIS_URL, decode_responses=True)
+        self.stream = stream
+        self.append_script = self.redis.register_script(self.APPEND_SCRIPT)
+
+    def pending_key(self, attempt_id) -> str:
+        return f"{self.stream}:pending:{attempt_id}"
+
+    @property
+    def failures_key(self) -> str:
+        return f"{self.stream}:failures"
+
+    @property
+    def dead_letter_stream(self) -> str:
+        return f"{self.stream}:dead"
+
+    def append(self, attempt: Attempt, answers: list[tuple[int, int]], answered_at: datetime) -> list[int]:
+        """
+        Log (question id, choice id) answers of an attempt, skipping the questions pending already.
+        Returns the questions logged.
+        """
+        args = [str(attempt.pk), str(attempt.quiz_id), str(attempt.participant_id), answered_at.timestamp()]
+        for question_id, choice_id in answers:
+            args.extend([question_id, choice_id])
+        appended = self.append_script(keys=[self.stream, self.pending_key(attempt.pk)], args=args)
+        return [int(question_id) for question_id in appended]
+
+    def read(self, count: int) -> list[tuple[str, QueuedAnswer]]:
+        """
+        The oldest `count` entries of the log.
+        """
+        entries = self.redis.xrange(self.stream, count=count)
+        return [(entry_id, QueuedAnswer(
+            uuid.UUID(fields["attempt"]),
+            uuid.UUID(fields["quiz"]),
+            uuid.UUID(fields["participant"]),
+            int(fields["question"]),
+            int(fields["choice"]),
+            datetime.fromtimestamp(float(fields["answered_at"]), dt_timezone.utc),
+        )) for entry_id, fields in entries]
+
+    def delete(self, entries: list[tuple[str, QueuedAnswer]]) -> None:
+        """
+        Remove written entries from the log and from their attempts' pending answers.
+        """
+        with self.redis.pipeline() as pipe:
+            pipe.xdel(self.stream, *(entry_id for entry_id, _ in entries))
+            pipe.hdel(self.failures_key, *(entry_id for entry_id, _ in entries))
+            for entry_id, answer in entries:
+                pipe.hdel(self.pending_key(answer.attempt_id), answer.question_id)
+            pipe.execute()
+
+    def turned_down(self, entry_id: str) -> int:
+        """
+        Count one more time the database turned an entry down. Returns how many times it was.
+        """
+        return self.redis.hincrby(self.failures_key, entry_id, 1)
+
+    def dead_letter(self, entries: list[tuple[str, QueuedAnswer]]) -> None:
+        """
+        Move entries the database keeps turning down to the dead-letter stream.
+        """
+        with self.redis.pipeline() as pipe:
+            for entry_id, answer in entries:
+                pipe.xadd(self.dead_letter_stream, {
+                    "entry": entry_id, "attempt": str(answer.attempt_id), "quiz": str(answer.quiz_id),
+                    "participant": str(answer.participant_id), "question": answer.question_id,
+                    "choice": answer.choice_id, "answered_at": answer.answered_at.timestamp(),
+                })
+            pipe.execute()
+        self.delete(entries)
+
+    def dead_letters(self) -> int:
+        return self.redis.xlen(self.dead_letter_stream)
+
+    def pending(self, attempt_id) -> dict[int, PendingAnswer]:
+        """
+        The attempt's logged answers not written yet, by question id.
+        """
+        return {
+            int(question_id): _parse_pending(value)
+            for question_id, value in self.redis.hgetall(self.pending_key(attempt_id)).items()
+        }
+
+    def size(self) -> int:
+        return self.redis.xlen(self.stream)
+
+
+class InMemoryAnswerLog:
+    def __init__(self):
+        self.entries: dict[str, QueuedAnswer] = {}
+        self.pending_answers: dict[str, dict[int, PendingAnswer]] = {}
+        self.failures: dict[str, int] = {}
+        self.dead: list[tuple[str, QueuedAnswer]] = []
+        self.ids = count()
+        self.lock = threading.Lock()
+
+    def append(self, attempt: Attempt, answers: list[tuple[int, int]], answered_at: datetime) -> list[int]:
+        appended = []
+        with self.lock:
+            pending = self.pending_answers.setdefault(str(attempt.pk), {})
+            for question_id, choice_id in answers:
+                if question_id not in pending:
+                    pending[question_id] = PendingAnswer(choice_id, answered_at)
+                    self.entries[str(next(self.ids))] = QueuedAnswer(
+                        attempt.pk, attempt.quiz_id, attempt.participant_id, question_id, choice_id, answered_at
+                    )
+                    appended.append(question_id)
+        return appended
+
+    def read(self, count: int) -> list[tuple[str, QueuedAnswer]]:
+        with self.lock:
+            return list(self.entries.items())[:count]
+
+    def delete(self, entries: list[tuple[str, QueuedAnswer]]) -> None:
+        with self.lock:
+            for entry_id, answer in entries:
+                self.entries.pop(entry_id, None)
+                self.failures.pop(entry_id, None)
+                self.pending_answers.get(str(answer.attempt_id), {}).pop(answer.question_id, None)
+
+    def turned_down(self, entry_id: str) -> int:
+        with self.lock:
+            self.failures[entry_id] = self.failures.get(entry_id, 0) + 1
+            return self.failures[entry_id]
+
+    def dead_letter(self, entries: list[tuple[str, QueuedAnswer]]) -> None:
+        with self.lock:
+            self.dead.extend(entries)
+        self.delete(entries)
+
+    def dead_letters(self) -> int:
+        with self.lock:
+            return len(self.dead)
+
+    def pending(self, attempt_id) -> dict[int, PendingAnswer]:
+        with self.lock:
+            return dict(self.pending_answers.get(str(attempt_id), {}))
+
+    def size(self) -> int:
+        with self.lock:
+            return len(self.entries)
+
+
+@lru_cache
+def _answer_log(backend: str):
+    return import_string(backend)()
+
+
+def get_answer_log():
+    return _answer_log(getattr(settings, "ANSWER_LOG_BACKEND", "quiz.answer_log.RedisAnswerLog"))
+
+
+def append_answers(attempt: Attempt, answers: list[tuple[int, int]]) -> list[int]:
+    """
+    Log a batch of (question id, choice id) answers for an attempt instead of writing them.
+
+    Answers are expected to be validated against the answer key already. Questions the attempt
+    has answered before, written or pending, are skipped. Returns the questions logged.
+    """
+    answered = set(Answer.objects.filter(attempt_id=attempt.pk).values_list("question_id", flat=True))
+    new_answers = []
+    for question_id, choice_id in answers:
+        if question_id not in answered:
+            answered.add(question_id)
+            new_answers.append((question_id, choice_id))
+    if not new_answers:
+        return []
+    return get_answer_log().append(attempt, new_answers, timezone.now())
+
+
+def apply_pending_answers(attempt: Attempt) -> dict[int, PendingAnswer]:
+    """
+    Show an attempt to its participant as it will be once its pending answers are written: their
+    points are added to `score`, their number to `answered_count` when annotated, and the attempt
+    is completed when they answer its last question. Nothing is saved.
+
+    Returns the pending answers, by question id.
+    """
+    pending = get_answer_log().pending(attempt.pk)
+    if not pending or attempt.status == Attempt.COMPLETED:
+        return {}
+    # Written already, their entries are on their way out of the log
+    written = set(Answer.objects.filter(attempt_id=attempt.pk).values_list("question_id", flat=True))
+    pending = {question_id: answer for question_id, answer in pending.items() if question_id not in written}
+    if not pending:
+        return {}
+
+    answer_key = get_answer_key(attempt.quiz_id)
+    attempt.score += sum(answer_key.points_for(question_id, answer.choice_id) for question_id, answer in pending.items())
+    if hasattr(attempt, "answered_count"):
+        attempt.answered_count += len(pending)
+    if attempt.status == Attempt.IN_PROGRESS and len(written) + len(pending) >= attempt.quiz.total_questions:
+        attempt.status = Attempt.COMPLETED
+        attempt.completed_at = max(answer.answered_at for answer in pending.values())
+    return pending
+
+
+def flush_answer_log(batch_size: int = ANSWER_LOG_BATCH_SIZE) -> FlushResult:
+    """
+    Write the oldest `batch_size` entries of the log, then delete them from it.
+    """
+    log = get_answer_log()
+    entries = log.read(batch_size)
+    if not entries:
+        return FlushResult(0, 0, 0, 0, 0)
+    return FlushResult(len(entries), *_write(log, entries))
+
+
+def _write(log, entries: list[tuple[str, QueuedAnswer]]) -> tuple[int, int, int, int]:
+    """
+    Write entries and delete them from the log, halving them while the database turns them down.
+    Returns the answers written, attempts scored and completed, and the entries dead-lettered.
+    Failing to reach the database raises, the entries stay in the log.
+    """
+    try:
+        result = ingest_answers([answer for _, answer in entries])
+    except (OperationalError, InterfaceError):
+        raise
+    except DatabaseError:
+        if len(entries) > 1:
+            middle = len(entries) // 2
+            return tuple(map(sum, zip(_write(log, entries[:middle]), _write(log, entries[middle:]))))
+        entry_id, answer = entries[0]
+        if log.turned_down(entry_id) < ANSWER_LOG_MAX_ATTEMPTS:
+            logger.exception("Logged answer %s turned down, retrying with the next flush", answer)
+            return 0, 0, 0, 0
+        logger.exception("Logged answer %s turned down %d times, dead-lettered", answer, ANSWER_LOG_MAX_ATTEMPTS)
+        log.dead_letter(entries)
+        return 0, 0, 0, 1
+    log.delete(entries)
+    return (*result, 0)
+
+
+def run_flusher(stop: threading.Event, batch_size: int = ANSWER_LOG_BATCH_SIZE,
+                interval: float = ANSWER_LOG_FLUSH_INTERVAL) -> None:
+    """
+    Flush the log until `stop` is set, batch after batch while it has entries.
+    """
+    while not stop.is_set():
+        close_old_connections()
+        try:
+            result = flush_answer_log(batch_size)
+        except Exception:
+            logger.exception("Flushing the answer log failed, retrying")
+            result = FlushResult(0, 0, 0, 0, 0)
+        if result.entries:
+            logger.info("Flushed %d logged answers: %d written, %d attempts scored, %d completed, %d dead-lettered",
+                        *result)
+        if result.entries < batch_size:
+            stop.wait(interval)
+    close_old_connections()
@@ -0,0 +1,215 @@
+"""
+Async implementations of the hot read endpoints for the ASGI stack.
+
+Each view answers GET and HEAD itself through Django's async ORM interface and hands any other
+method to the sync DRF view of the same URL, which also supplies the querysets, serializers,
+permissions, pagination and conditional GET validators, so both behave the same. Requests go
+through the DRF view's own steps: content negotiation (anything but JSON is left to the DRF view),
+versioning, the configured authentication classes, permissions and throttles. Authentication runs
+on a thread unless the request's token is in the in-process token cache, which needs no I/O.
+
+Used by `urls.py` when ASYNC_READ_VIEWS is set. It is off by default, the gain over the DRF views
+on their threads varies with the deployment: measure it with `tests/benchmarks/test_async_benchmark.py`.
+"""
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+
+from .answer_log import write_behind
+from .authentication import CachedTokenAuthentication, cached_token_user
+from .conditional import set_validators
+from .payloads import participant_payload, payload_version
+from .renderers import FastJSONRenderer
+from .views import AttemptProgress, ListPlayableQuiz, QuizDetail, QuizProgress, payload_response
+
+ASYNC_READ_VIEWS = getattr(settings, "ASYNC_READ_VIEWS", False)
+
+_renderer = FastJSONRenderer()
+
+
+def json_response(data, status: int = 200) -> HttpResponse:
+    return HttpResponse(_renderer.render(data), content_type=_renderer.media_type, status=status)
+
+
+class AsyncReadView(ABC):
+    """
+    Async GET for the sync DRF `view_class`, other methods are left to the DRF view.
+    """
+    view_class = None
+
+    def __init__(self, request, args, kwargs):
+        self.request = request
+        view = self.view = self.view_class()
+        view.args, view.kwargs = args, kwargs
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        view.format_kwarg = view.get_format_suffix(**kwargs)
+
+    @classmethod
+    def as_view(cls):
+        fallback = sync_to_async(cls.view_class.as_view())
+
+        async def view(request, *args, **kwargs):
+            if cls.handles(request):
+                async_view = cls(request, args, kwargs)
+                if async_view.negotiate():
+                    return await async_view.dispatch()
+            return await fallback(request, *args, **kwargs)
+
+        # Token and session reads only, like DRF views
+        view.csrf_exempt = True
+        return view
+
+    @classmethod
+    def handles(cls, request) -> bool:
+        """
+        Whether the request is served here rather than by the DRF view.
+        """
+        return request.method in ("GET", "HEAD")
+
+    def negotiate(self) -> bool:
+        """
+        The DRF view's content negotiation, False unless it picks JSON.
+        """
+        request = self.view.request
+        try:
+            renderer, media_type = self.view.perform_content_negotiation(request)
+        except exceptions.NotAcceptable:
+            return False
+        if renderer.format != _renderer.format:
+            return False
+        request.accepted_renderer, request.accepted_media_type = _renderer, media_type
+        return True
+
+    async def dispatch(self) -> HttpResponse:
+        try:
+            await self.initial()
+            return await self.get()
+        except ObjectDoesNotExist:
+            return self.handle_exception(Http404())
+        except Exception as exc:
+            return self.handle_exception(exc)
+
+    async def initial(self) -> None:
+        """
+        `APIView.initial`, the content negotiation aside.
+        """
+        view, request = self.view, self.view.request
+        request.version, request.versioning_scheme = view.determine_version(request, *view.args, **view.kwargs)
+        await self.perform_authentication()
+        view.check_permissions(request)
+        if view.get_throttles():
+            await sync_to_async(view.check_throttles)(request)
+
+    async def perform_authentication(self) -> None:
+        """
+        Authenticate with the view's authentication classes, right here when the first one finds
+        the token's user in the in-process cache, on a thread otherwise.
+        """
+        view, request = self.view, self.view.request
+        auth = get_authorization_header(request).split()
+        if (request.authenticators and isinstance(request.authenticators[0], CachedTokenAuthentication)
+                and len(auth) == 2 and auth[0].lower() == b"token"
+                and cached_token_user(auth[1].decode(errors="replace")) is not None):
+            view.perform_authentication(request)
+        else:
+            await sync_to_async(view.perform_authentication)(request)
+
+    def handle_exception(self, exc: Exception) -> HttpResponse:
+        """
+        `APIView.handle_exception`, rendered as JSON.
+        """
+        view = self.view
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            auth_header = view.get_authenticate_header(view.request)
+            if auth_header:
+                exc.auth_header = auth_header
+            else:
+                exc.status_code = 403
+        response = view.get_exception_handler()(exc, view.get_exception_handler_context())
+        if response is None:
+            raise exc
+        rendered = json_response(response.data, response.status_code)
+        for header in ("WWW-Authenticate", "Retry-After"):
+            if header in response:
+                rendered[header] = response[header]
+        return rendered
+
+    async def get(self) -> HttpResponse:
+        view = self.view
+        view.validator_values = await view.get_validator_queryset().order_by().aaggregate(**view.validators)
+        etag, last_modified = view.make_validators()
+        if etag is not None:
+            response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return set_validators(response, etag, last_modified)
+        return set_validators(await self.read(), etag, last_modified)
+
+    @abstractmethod
+    async def read(self) -> HttpResponse:
+        """
+        The response to a GET the validators did not answer.
+        """
+
+    async def get_object(self):
+        """
+        `GenericAPIView.get_object` through the async ORM.
+        """
+        view = self.view
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        queryset = view.filter_queryset(view.get_queryset())
+        obj = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+        view.check_object_permissions(view.request, obj)
+        return obj
+
+
+class AsyncRetrieveView(AsyncReadView):
+    async def read(self) -> HttpResponse:
+        instance = await self.get_object()
+        return json_response(self.view.get_serializer(instance).data)
+
+
+class AsyncListView(AsyncReadView):
+    async def read(self) -> HttpResponse:
+        view = self.view
+        queryset = view.filter_queryset(view.get_queryset())
+        page = await view.paginator.apaginate_queryset(queryset, view.request, view)
+        return json_response(view.paginator.get_paginated_data(view.get_serializer(page, many=True).data))
+
+
+class AsyncListPlayableQuiz(AsyncListView):
+    view_class = ListPlayableQuiz
+
+
+class AsyncQuizDetail(AsyncRetrieveView):
+    view_class = QuizDetail
+
+    async def read(self) -> HttpResponse:
+        if "creator" in self.request.path:
+            return await super().read()
+
+        values = self.view.validator_values
+        if values["modified_at"] is None:
+            raise Http404
+        version = payload_version(values["content_version"], values["modified_at"])
+        payload = await sync_to_async(participant_payload)(self.view.kwargs["pk"], version)
+        return payload_response(self.request, payload)
+
+
+class AsyncQuizProgress(AsyncRetrieveView):
+    view_class = QuizProgress
+
+
+class AsyncAttemptProgress(AsyncRetrieveView):
+    view_class = AttemptProgress
+
+    @classmethod
+    def handles(cls, request) -> bool:
+        # Answers pending in the write-behind log are read with blocking calls, left to the DRF view
+        return super().handles(request) and not write_behind()
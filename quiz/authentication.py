@@ -0,0 +1,137 @@
+"""
+Cached token authentication, shared by the REST API and the WebSocket middleware.
+
+Resolving a token costs a Token + user join on every request and every socket connect. The
+user's field values are cached by token key in two layers: a small in-process LRU whose entries
+live for TOKEN_CACHE_TTL seconds, in front of the shared cache (TOKEN_SHARED_CACHE_TTL seconds).
+The password hash and the last login are left out (`UNCACHED_USER_FIELDS`), they are loaded if a
+request asks for them; each lookup gets a user instance of its own built from the values.
+Deleting a token or saving its user evicts it from the shared cache and the local LRU at once;
+other processes drop their local copy within TOKEN_CACHE_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_SIZE = getattr(settings, "TOKEN_CACHE_SIZE", 10000)
+TOKEN_CACHE_TTL = getattr(settings, "TOKEN_CACHE_TTL", 30)
+TOKEN_SHARED_CACHE_TTL = getattr(settings, "TOKEN_SHARED_CACHE_TTL", 300)
+
+# Never cached, and deferred on the cached users
+UNCACHED_USER_FIELDS = {"password", "last_login"}
+
+
+class TTLCache:
+    """
+    Thread-safe LRU mapping whose entries expire `ttl` seconds after they were set.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+_users = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+
+def _cache_key(key: str) -> str:
+    return f"auth_token:{key}"
+
+
+def _cached_fields() -> list[str]:
+    return [field.attname for field in get_user_model()._meta.concrete_fields
+            if field.attname not in UNCACHED_USER_FIELDS]
+
+
+def _user(entry: tuple):
+    """
+    A user of its own from the cached values of `_cached_fields()`.
+    """
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, _cached_fields(), entry)
+
+
+def cached_token_user(key: str):
+    """
+    The user of a token if it is in the in-process cache, without any I/O.
+    """
+    entry = _users.get(key)
+    return _user(entry) if entry is not None else None
+
+
+def get_token_user(key: str):
+    """
+    The user a token belongs to, or None for an unknown token.
+    """
+    entry = _users.get(key)
+    if entry is not None:
+        return _user(entry)
+
+    entry = cache.get(_cache_key(key))
+    if entry is None:
+        entry = get_user_model().objects.filter(auth_token__key=key).values_list(*_cached_fields()).first()
+        if entry is None:
+            return None
+        cache.set(_cache_key(key), entry, TOKEN_SHARED_CACHE_TTL)
+    _users.set(key, entry)
+    return _user(entry)
+
+
+def invalidate_tokens(*keys: str) -> None:
+    """
+    Evict tokens from the shared cache and this process' cache.
+    """
+    cache.delete_many([_cache_key(key) for key in keys])
+    for key in keys:
+        _users.delete(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    DRF token authentication resolving tokens through the token cache.
+    """
+
+    def authenticate_credentials(self, key):
+        user = get_token_user(key)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return user, Token(key=key, user=user)
@@ -0,0 +1,104 @@
+"""
+PostgreSQL backend checking connections out of a psycopg pool.
+
+Django's backend opens a connection whenever a thread first touches the database and closes it
+at the end of the request (CONN_MAX_AGE = 0), or after every `database_sync_to_async` call.
+With ENGINE "quiz.backends.postgresql" and a "pool" dict in OPTIONS (`ConnectionPool` arguments:
+min_size, max_size, max_idle, timeout, ...) the connection of each thread comes from a pool
+shared by the process instead, and closing hands it back, so connections and their prepared
+statements outlive requests. Connections are checked before being handed out, and a thread that
+goes away without closing its connection returns it to the pool too.
+
+With a pool, queries are bound server side and prepared on their `prepare_threshold`th execution
+on a connection (OPTIONS["prepare_threshold"], default PREPARE_THRESHOLD).
+"""
+import weakref
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresDatabaseCreation
+from psycopg_pool import ConnectionPool
+
+PREPARE_THRESHOLD = 5
+
+
+class DatabaseCreation(PostgresDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # The pool's idle connections would keep the test database in use
+        self.connection.close_pool()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    # Shared by the wrappers of all threads, by alias and database name
+    pools: dict[tuple[str, str], ConnectionPool] = {}
+
+    @property
+    def pool_options(self) -> dict | None:
+        options = self.settings_dict["OPTIONS"].get("pool")
+        if not options or self.alias == NO_DB_ALIAS:
+            return None
+        return {} if options is True else options
+
+    @property
+    def pool(self) -> ConnectionPool | None:
+        options = self.pool_options
+        if options is None:
+            return None
+        key = (self.alias, self.settings_dict["NAME"])
+        if key not in self.pools:
+            if self.settings_dict["CONN_MAX_AGE"] != 0:
+                raise ImproperlyConfigured("Pooled connections are returned after each request, "
+                                           "CONN_MAX_AGE must be 0.")
+            pool = ConnectionPool(
+                kwargs=self.get_connection_params(),
+                open=False,
+                check=ConnectionPool.check_connection,
+                name=f"{self.alias}-{self.settings_dict['NAME']}",
+                **options,
+            )
+            # Another thread may have got there first
+            pool = self.pools.setdefault(key, pool)
+            pool.open()
+        return self.pools[key]
+
+    def close_pool(self):
+        key = (self.alias, self.settings_dict["NAME"])
+        self.close()
+        if pool := self.pools.pop(key, None):
+            pool.close()
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        if self.pool_options is not None:
+            if "server_side_binding" not in self.settings_dict["OPTIONS"]:
+                conn_params["cursor_factory"] = base.ServerBindingCursor
+            conn_params["prepare_threshold"] = self.settings_dict["OPTIONS"].get("prepare_threshold",
+                                                                                 PREPARE_THRESHOLD)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection = pool.getconn()
+        # Set up like a new connection, pooled ones keep the state of their last user
+        self.isolation_level = base.IsolationLevel.READ_COMMITTED
+        if (isolation_level := self.settings_dict["OPTIONS"].get("isolation_level")) is not None:
+            self.isolation_level = base.IsolationLevel(isolation_level)
+            connection.isolation_level = self.isolation_level
+        self.return_on_collect = weakref.finalize(self, pool.putconn, connection)
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool_options is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.return_on_collect.detach()
+            connection, self.connection = self.connection, None
+            connection._pool.putconn(connection)
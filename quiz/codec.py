@@ -0,0 +1,44 @@
+"""
+JSON encoding shared by the API renderers/parsers and the WebSocket consumers.
+
+Uses orjson when it is installed (`pip install QaaS[fast-json]`), which encodes UUIDs and
+datetimes natively, and falls back to the standard library with DRF's encoder otherwise.
+Both produce compact UTF-8 output.
+"""
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the installed extras
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(value):
+    # Types orjson does not know (Decimal, lazy strings, querysets...) as DRF would encode them
+    return _encoder.default(value)
+
+
+def dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def dumps_text(data) -> str:
+    """
+    `dumps` for text frames.
+    """
+    return dumps(data).decode()
+
+
+def loads(data: bytes | str):
+    """
+    Parse a JSON document, raising ValueError when it is malformed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
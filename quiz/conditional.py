@@ -0,0 +1,89 @@
+"""
+Conditional GET support for the API views.
+
+Validators are computed by a single aggregate query over the rows a response is built from
+(latest `modified_at`, row counts, the `modified_at` of nested objects...), before anything is
+serialized. A request whose `If-None-Match` or `If-Modified-Since` still matches is answered with
+304 Not Modified; other responses carry the `ETag` header to poll with, and `Last-Modified` when
+the timestamps alone tell every change apart.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GETs for list and retrieve views.
+
+    `validators` are aggregates over `get_validator_queryset()`, any change to the response must
+    change one of them. The ones named in `modified_validators` are timestamps, the latest is the
+    response's Last-Modified date. Those in `stamped_validators` never change without one of the
+    timestamps moving too. Views with any other validator (counts, scores...) send no
+    Last-Modified, a client polling with If-Modified-Since alone would miss their changes. The
+    aggregated values are kept on `validator_values`.
+    """
+    validators = {"modified_at": Max("modified_at"), "count": Count("pk")}
+    modified_validators = ["modified_at"]
+    stamped_validators: list[str] = []
+
+    def get_validator_queryset(self):
+        """
+        `get_queryset()`, narrowed down to the requested object on retrieve views.
+        """
+        queryset = self.get_queryset()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if hasattr(self, "retrieve") and lookup_url_kwarg in self.kwargs:
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def get_validators(self) -> tuple[str | None, int | None]:
+        """
+        ETag and Last-Modified timestamp of the response, None when there is nothing to validate
+        (or, for Last-Modified, when the timestamps do not follow every change).
+        """
+        self.validator_values = self.get_validator_queryset().order_by().aggregate(**self.validators)
+        return self.make_validators()
+
+    def make_validators(self) -> tuple[str | None, int | None]:
+        """
+        `get_validators` from the already aggregated `validator_values`.
+        """
+        modified = [self.validator_values[name] for name in self.modified_validators]
+        if not any(modified):
+            return None, None
+
+        # Weak, the same content may be rendered and encoded differently
+        state = repr((self.request.get_full_path(), self.request.accepted_renderer.format,
+                      sorted(self.validator_values.items())))
+        etag = f'W/"{hashlib.md5(state.encode()).hexdigest()}"'
+        if not set(self.validator_values) <= {*self.modified_validators, *self.stamped_validators}:
+            return etag, None
+        return etag, int(max(value for value in modified if value).timestamp())
+
+    def get(self, request, *args, **kwargs):
+        # Validator querysets may filter on the user, anonymous requests are left to the permissions
+        if request.user.is_anonymous:
+            return super().get(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators()
+        if etag is None:
+            return super().get(request, *args, **kwargs)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag: str | None, last_modified: int | None):
+    """
+    Add the validators to a successful or 304 response.
+    """
+    if etag is not None and (200 <= response.status_code < 300 or response.status_code == 304):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
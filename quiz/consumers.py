@@ -1,15 +1,51 @@
-import json
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 from django.utils import timezone
 
-from quiz.models import Invitation
+from quiz import codec
+from quiz.executor import database_sync_to_async
+from quiz.grading import QueuedAnswer
+from quiz.leaderboard import LEADERBOARD_PUSH_RATE, expire_snapshots, group_name, leaderboard_snapshot
+from quiz.live import (
+    HOST, LIVE_ANSWER_WINDOW, PARTICIPANT, current_question, end_session, get_answer_buffer, live_group, live_role,
+    next_question,
+)
+from quiz.models import Invitation, Quiz
+from quiz.notifications import inbox, mark_read, user_group
+from quiz.presence import PRESENCE_TTL, get_presence
 
 User = get_user_model()
 
 
+def parse_cursor(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_id(value) -> bool:
+    # 1.0 and True compare equal to 1 but are no ids, and would not load as one
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def query_cursor(scope) -> int | None:
+    cursor = parse_qs(scope.get("query_string", b"").decode()).get("cursor")
+    return parse_cursor(cursor[0]) if cursor else None
+
+
 class InvitationConsumer(AsyncWebsocketConsumer):
+    """
+    A user's notifications. Open sockets keep the user present, so notifications are sent to them
+    as they come as well as kept in their inbox, and replay the inbox on connect: the unread
+    notifications, or those after the `cursor` query parameter.
+    """
     async def connect(self):
         self.user = self.scope["user"]
 
@@ -18,7 +54,7 @@ class InvitationConsumer(AsyncWebsocketConsumer):
             return
 
         # Create a user-specific group
-        self.group_name = f"user_{self.user.id}"
+        self.group_name = user_group(self.user.id)
 
         # Join the group
         await self.channel_layer.group_add(
@@ -27,20 +63,60 @@ class InvitationConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
+        await self.mark_present()
+        self.heartbeat_task = asyncio.create_task(self.heartbeat())
+        await self.replay(query_cursor(self.scope))
 
     async def disconnect(self, close_code):
+        if not hasattr(self, "group_name"):
+            return
+        if getattr(self, "heartbeat_task", None):
+            self.heartbeat_task.cancel()
+        await sync_to_async(get_presence().remove, thread_sensitive=False)(self.user.id, self.channel_name)
+
         # Leave the group
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
 
+    async def mark_present(self):
+        await sync_to_async(get_presence().add, thread_sensitive=False)(self.user.id, self.channel_name)
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(PRESENCE_TTL / 3)
+            await self.mark_present()
+
+    async def replay(self, cursor):
+        page = await database_sync_to_async(inbox)(self.user.id, cursor)
+        for notification in page["notifications"]:
+            await self.send(text_data=codec.dumps_text(notification))
+        await self.send_inbox(page["cursor"], page["unread"], page["more"])
+
+    async def send_inbox(self, cursor, unread: int, more: bool = False):
+        await self.send(text_data=codec.dumps_text({
+            "type": "inbox",
+            "cursor": cursor,
+            "unread": unread,
+            "more": more,
+        }))
+
     # Receive message from WebSocket
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        data = codec.loads(text_data)
         message_type = data.get("type")
 
-        if message_type == "invitation_response":
+        if message_type == "replay":
+            await self.replay(parse_cursor(data.get("cursor")))
+
+        elif message_type == "notifications_read":
+            cursor = parse_cursor(data.get("cursor"))
+            if cursor is not None:
+                unread = await database_sync_to_async(mark_read)(self.user.id, cursor)
+                await self.send_inbox(cursor, unread)
+
+        elif message_type == "invitation_response":
             invitation_id = data.get("invitation_id")
             status = data.get("status")
 
@@ -48,7 +124,7 @@ class InvitationConsumer(AsyncWebsocketConsumer):
             await self.update_invitation_status(invitation_id, status)
 
             # Send confirmation back to the client
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=codec.dumps_text({
                 "type": "response_confirmation",
                 "invitation_id": invitation_id,
                 "status": status,
@@ -79,4 +155,172 @@ class InvitationConsumer(AsyncWebsocketConsumer):
     # Receive message from group
     async def invitation_message(self, event):
         # Send message to WebSocket
-        await self.send(text_data=json.dumps(event["content"]))
+        await self.send(text_data=codec.dumps_text(event["content"]))
+
+
+class LeaderboardConsumer(AsyncWebsocketConsumer):
+    """
+    Streams a quiz's leaderboard. Change notifications are coalesced so each socket gets at
+    most LEADERBOARD_PUSH_RATE snapshots per second, however fast scores change.
+    """
+    async def connect(self):
+        self.user = self.scope["user"]
+        self.quiz_id = self.scope["url_route"]["kwargs"]["quiz_id"]
+
+        if not self.user.is_authenticated or not await self.can_view_quiz():
+            await self.close()
+            return
+
+        self.group_name = group_name(self.quiz_id)
+        self.last_push = 0.0
+        self.push_task = None
+
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+        await self.push()
+
+    async def disconnect(self, close_code):
+        if getattr(self, "push_task", None):
+            self.push_task.cancel()
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
+
+    @database_sync_to_async
+    def can_view_quiz(self):
+        return Quiz.objects.filter(
+            Q(owner=self.user) | Q(attempts__participant=self.user), pk=self.quiz_id
+        ).exists()
+
+    # Receive message from group
+    async def leaderboard_changed(self, event):
+        expire_snapshots(self.quiz_id)
+        if self.push_task is not None:
+            # A push is already scheduled and will read the latest standings
+            return
+        delay = max(0.0, self.last_push + 1 / LEADERBOARD_PUSH_RATE - time.monotonic())
+        self.push_task = asyncio.create_task(self.push_later(delay))
+
+    async def quiz_status(self, event):
+        # Opened or closed by the scheduler
+        await self.send(text_data=codec.dumps_text({
+            "type": "quiz_status",
+            "quiz_id": event["quiz_id"],
+            "status": event["status"],
+        }))
+
+    async def push_later(self, delay):
+        await asyncio.sleep(delay)
+        self.push_task = None
+        await self.push()
+
+    async def push(self):
+        self.last_push = time.monotonic()
+        entries = await database_sync_to_async(leaderboard_snapshot)(self.quiz_id)
+        await self.send(text_data=codec.dumps_text({
+            "type": "leaderboard",
+            "quiz_id": str(self.quiz_id),
+            "entries": entries,
+        }))
+
+
+class LiveQuizConsumer(AsyncWebsocketConsumer):
+    """
+    A live session of a quiz, see `live`. The quiz's owner hosts it and sends `next_question`
+    (optionally with the `seconds` to answer it) and `end`. Participants with an attempt in
+    progress get each question as it starts and `answer` it before its deadline; answers are
+    acknowledged as soon as they are buffered.
+    """
+    async def connect(self):
+        self.user = self.scope["user"]
+        self.quiz_id = self.scope["url_route"]["kwargs"]["quiz_id"]
+
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        self.role, self.attempt_id = await database_sync_to_async(live_role)(self.quiz_id, self.user)
+        if self.role is None:
+            await self.close()
+            return
+
+        self.group_name = live_group(self.quiz_id)
+        self.question = None
+        self.answered = set()
+
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+        # Joining a session already under way
+        question = await sync_to_async(current_question, thread_sensitive=False)(self.quiz_id)
+        if question is not None:
+            await self.live_question({"question": question})
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(
+                self.group_name,
+                self.channel_name
+            )
+
+    async def receive(self, text_data):
+        data = codec.loads(text_data)
+        message_type = data.get("type")
+
+        if message_type == "answer" and self.role == PARTICIPANT:
+            await self.answer(data.get("question_id"), data.get("choice_id"))
+
+        elif message_type == "next_question" and self.role == HOST:
+            seconds = data.get("seconds")
+            if not isinstance(seconds, (int, float)) or seconds <= 0:
+                seconds = LIVE_ANSWER_WINDOW
+            question = await database_sync_to_async(next_question)(self.quiz_id, seconds)
+            if question is None:
+                await self.send_error("There are no more questions")
+            else:
+                await self.channel_layer.group_send(self.group_name, {"type": "live_question", "question": question})
+
+        elif message_type == "end" and self.role == HOST:
+            await database_sync_to_async(end_session)(self.quiz_id)
+            await self.channel_layer.group_send(self.group_name, {"type": "live_ended"})
+
+    async def answer(self, question_id, choice_id):
+        question = self.question
+        if not is_id(question_id) or not is_id(choice_id):
+            await self.send_error("This is not a valid answer", question_id if is_id(question_id) else None)
+        elif question is None or question_id != question["question_id"]:
+            await self.send_error("This is not the current question", question_id)
+        elif time.time() > question["deadline"]:
+            await self.send_error("Time is up for this question", question_id)
+        elif question_id in self.answered:
+            await self.send_error("This question has already been answered", question_id)
+        elif choice_id not in question["choice_ids"]:
+            await self.send_error("This is not a valid answer", question_id)
+        elif not get_answer_buffer().add(
+            QueuedAnswer(self.attempt_id, self.quiz_id, self.user.id, question["question_id"], choice_id)
+        ):
+            await self.send_error("Too many answers are waiting, try again", question_id)
+        else:
+            self.answered.add(question_id)
+            await self.send(text_data=codec.dumps_text({"type": "answer_ack", "question_id": question_id}))
+
+    async def send_error(self, message: str, question_id=None):
+        await self.send(text_data=codec.dumps_text({"type": "error", "question_id": question_id, "message": message}))
+
+    # Receive message from group
+    async def live_question(self, event):
+        question = event["question"]
+        self.question = {**question, "choice_ids": {choice["id"] for choice in question["choices"]}}
+        await self.send(text_data=codec.dumps_text({"type": "question", **question}))
+
+    async def live_ended(self, event):
+        self.question = None
+        await self.send(text_data=codec.dumps_text({"type": "ended"}))
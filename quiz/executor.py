@@ -0,0 +1,137 @@
+"""
+Bounded thread pool for the sync work of the ASGI process.
+
+By default Django gives every request its own thread to run its sync code (sync views and
+middleware, the async ORM) in, and with it its own database connection, however many requests
+are in flight; Channels' `database_sync_to_async` runs everything of the consumers on a single
+thread per process. With SYNC_EXECUTOR_WORKERS set both go to one pool of that many threads:
+concurrency is bounded by the pool size, and each worker keeps its own database connection,
+across jobs when CONN_MAX_AGE allows. `get_executor().metrics()` reports how saturated it is.
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import SyncToAsync
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+
+SYNC_EXECUTOR_WORKERS = getattr(settings, "SYNC_EXECUTOR_WORKERS", None)
+
+
+class SyncExecutor(ThreadPoolExecutor):
+    """
+    Thread pool counting how many jobs wait for a worker and for how long.
+    """
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix="sync-executor")
+        self.workers = max_workers
+        self.counters: Counter = Counter()
+        self.busy = 0
+        self.peak_busy = 0
+        self.peak_queued = 0
+        self.wait_time = 0.0
+        self.lock = threading.Lock()
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued_at = time.monotonic()
+
+        def run():
+            with self.lock:
+                self.counters["started"] += 1
+                self.busy += 1
+                self.peak_busy = max(self.peak_busy, self.busy)
+                self.wait_time += time.monotonic() - queued_at
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.busy -= 1
+                    self.counters["completed"] += 1
+
+        with self.lock:
+            self.counters["submitted"] += 1
+            self.peak_queued = max(self.peak_queued, self.counters["submitted"] - self.counters["started"])
+        return super().submit(run)
+
+    def metrics(self) -> dict:
+        """
+        Pool size, busy workers, queued jobs and the average time jobs waited for a worker.
+        """
+        with self.lock:
+            started = self.counters["started"]
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queued": self.counters["submitted"] - started,
+                "submitted": self.counters["submitted"],
+                "completed": self.counters["completed"],
+                "peak_busy": self.peak_busy,
+                "peak_queued": self.peak_queued,
+                "average_wait": self.wait_time / started if started else 0.0,
+            }
+
+
+_executor: SyncExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> SyncExecutor | None:
+    """
+    The process' pool, None when SYNC_EXECUTOR_WORKERS is not set.
+    """
+    global _executor
+    if not SYNC_EXECUTOR_WORKERS:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = SyncExecutor(SYNC_EXECUTOR_WORKERS)
+        return _executor
+
+
+def database_sync_to_async(func):
+    """
+    Channels' `database_sync_to_async`, running on the pool when there is one.
+    """
+    executor = get_executor()
+    if executor is None:
+        return DatabaseSyncToAsync(func)
+    return DatabaseSyncToAsync(func, thread_sensitive=False, executor=executor)
+
+
+class PooledASGIHandler(ASGIHandler):
+    """
+    ASGI handler running the thread sensitive sync code of each request on the pool.
+
+    Django runs a request's sync code on the executor asgiref keeps for the request's
+    ThreadSensitiveContext, a new single thread by default. The pool takes its place for the
+    duration of the request.
+    """
+
+    def __init__(self, executor: SyncExecutor):
+        super().__init__()
+        self.executor = executor
+
+    async def handle(self, scope, receive, send):
+        context = SyncToAsync.thread_sensitive_context.get(None)
+        if context is None:
+            return await super().handle(scope, receive, send)
+        SyncToAsync.context_to_thread_executor[context] = self.executor
+        try:
+            return await super().handle(scope, receive, send)
+        finally:
+            # Leaving the context shuts its executor down, the pool outlives the request
+            SyncToAsync.context_to_thread_executor.pop(context, None)
+
+
+def get_asgi_application():
+    """
+    Django's ASGI application, on the pool when SYNC_EXECUTOR_WORKERS is set.
+    """
+    import django
+    django.setup(set_prefix=False)
+    executor = get_executor()
+    return PooledASGIHandler(executor) if executor is not None else ASGIHandler()
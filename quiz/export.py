@@ -0,0 +1,119 @@
+"""
+Streamed exports of a quiz's attempts, one row per answer (attempts without answers get one row
+with empty answer columns).
+
+The rows are read from a server-side cursor in chunks of EXPORT_CHUNK_SIZE inside one read-only
+transaction, so the export is a consistent snapshot and nothing is materialized on either side.
+Under ASGI each step of a sync iterator may run on another thread (and another database
+connection, see `executor.py`), so a thread of its own per export keeps the cursor and renders
+the chunks, handing them to the response's async iterator through a queue of EXPORT_QUEUE_SIZE
+chunks: memory stays bounded by that, whatever the size of the quiz.
+"""
+import logging
+import queue
+import threading
+from itertools import islice
+from typing import AsyncIterator
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from .models import Attempt
+from .renderers import StreamingRenderer
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+EXPORT_QUEUE_SIZE = getattr(settings, "EXPORT_QUEUE_SIZE", 4)
+
+# Column name -> lookup
+EXPORT_COLUMNS = {
+    "attempt": "pk",
+    "participant": "participant_id",
+    "username": "participant__username",
+    "status": "status",
+    "score": "score",
+    "started_at": "created_at",
+    "completed_at": "completed_at",
+    "question": "answers__question_id",
+    "selected_choice": "answers__selected_choice_id",
+    "is_correct": "answers__selected_choice__is_correct",
+    "answered_at": "answers__answered_at",
+}
+
+_END = object()
+
+
+def export_rows(quiz_id):
+    """
+    The export's rows as tuples of EXPORT_COLUMNS, ordered by attempt then question.
+    """
+    return (
+        Attempt.objects.filter(quiz_id=quiz_id)
+        .order_by("pk", "answers__question_id")
+        .values_list(*EXPORT_COLUMNS.values())
+    )
+
+
+class _Producer(threading.Thread):
+    def __init__(self, quiz_id, renderer: StreamingRenderer, chunk_size: int):
+        super().__init__(name="quiz-export", daemon=True)
+        self.quiz_id = quiz_id
+        self.renderer = renderer
+        self.chunk_size = chunk_size
+        self.chunks: queue.Queue = queue.Queue(EXPORT_QUEUE_SIZE)
+        self.stop = threading.Event()
+
+    def put(self, item) -> bool:
+        """
+        Hand over a chunk, False once the response has gone away.
+        """
+        while not self.stop.is_set():
+            try:
+                self.chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self) -> None:
+        columns = list(EXPORT_COLUMNS)
+        end = _END
+        try:
+            # Inside a transaction the cursor streams, in autocommit it would be materialized WITH HOLD
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET TRANSACTION READ ONLY")
+                rows = export_rows(self.quiz_id).iterator(chunk_size=self.chunk_size)
+                if not self.put(self.renderer.render_header(columns)):
+                    return
+                while batch := list(islice(rows, self.chunk_size)):
+                    if not self.put(self.renderer.render_rows(columns, batch)):
+                        return
+        except Exception as exc:
+            logger.exception("Exporting quiz %s failed", self.quiz_id)
+            end = exc
+        finally:
+            connections.close_all()
+            self.put(end)
+
+
+async def stream_export(quiz_id, renderer: StreamingRenderer,
+                        chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    The rendered export of a quiz, chunk by chunk. A failure part way raises, cutting the response short.
+    """
+    producer = _Producer(quiz_id, renderer, chunk_size)
+    producer.start()
+    try:
+        while True:
+            chunk = await sync_to_async(producer.chunks.get, thread_sensitive=False)()
+            if chunk is _END:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            if chunk:
+                yield chunk
+    finally:
+        producer.stop.set()
@@ -0,0 +1,452 @@
+"""
+Grading of answers: answer keys and batch submission.
+
+An answer key is a compact map of question id -> (points, correct choice id, valid choice ids)
+built once per quiz and kept in process memory. Every key carries the version it was built
+against; the current version of each quiz lives in the shared cache and is replaced whenever a
+question or choice of that quiz changes, so stale keys are rebuilt on next use.
+
+Scores are accumulated incrementally as answers come in; when the key itself changes
+`regrade_quiz` recomputes the scores of every attempt of a quiz set-based, in chunks. Regrades
+scheduled by changes to questions and choices run on a background thread of the process, once per
+quiz however many changes asked for one before its turn came.
+
+Answers accepted ahead of being written (live sessions, the write-behind answer log) are written
+in batches of any number of attempts by `ingest_answers`.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .leaderboard import rebuild_leaderboard, record_score, record_scores
+from .models import Answer, Attempt, Choice, Question, Quiz
+from .stats import (
+    rebuild_quiz_stats, record_answer_batch, record_answers, record_attempt_change, record_completed_batch,
+)
+from .transactions import on_commit_once
+
+logger = logging.getLogger(__name__)
+
+ANSWER_KEY_CACHE_SIZE = getattr(settings, "ANSWER_KEY_CACHE_SIZE", 1024)
+REGRADE_CHUNK_SIZE = getattr(settings, "REGRADE_CHUNK_SIZE", 1000)
+
+
+class QuestionKey(NamedTuple):
+    points: int
+    correct_choice_id: int | None
+    choice_ids: frozenset[int]
+
+
+class AnswerKey(NamedTuple):
+    quiz_id: uuid.UUID
+    version: str
+    questions: dict[int, QuestionKey]
+
+    def is_valid(self, question_id: int, choice_id: int) -> bool:
+        question = self.questions.get(question_id)
+        return question is not None and choice_id in question.choice_ids
+
+    def points_for(self, question_id: int, choice_id: int) -> int:
+        """
+        Points earned by selecting `choice_id` for `question_id`.
+        """
+        question = self.questions.get(question_id)
+        if question is None or question.correct_choice_id != choice_id:
+            return 0
+        return question.points
+
+
+_answer_keys: OrderedDict = OrderedDict()
+_lock = threading.Lock()
+
+
+def _version_key(quiz_id) -> str:
+    return f"answer_key_version:{quiz_id}"
+
+
+def _current_version(quiz_id) -> str:
+    version = cache.get(_version_key(quiz_id))
+    if version is None:
+        # Nobody has built a key since the version expired, first one wins
+        cache.add(_version_key(quiz_id), uuid.uuid4().hex, timeout=None)
+        version = cache.get(_version_key(quiz_id))
+    return version
+
+
+def build_answer_key(quiz_id, version: str = "") -> AnswerKey:
+    """
+    Build an answer key for a quiz with a single query.
+    """
+    points = {}
+    correct = {}
+    choices: dict[int, set[int]] = {}
+    rows = Choice.objects.filter(question__quiz_id=quiz_id).values_list(
+        "question_id", "question__points", "id", "is_correct"
+    )
+    for question_id, question_points, choice_id, is_correct in rows:
+        points[question_id] = question_points
+        choices.setdefault(question_id, set()).add(choice_id)
+        if is_correct:
+            correct[question_id] = choice_id
+
+    questions = {
+        question_id: QuestionKey(points[question_id], correct.get(question_id), frozenset(choice_ids))
+        for question_id, choice_ids in choices.items()
+    }
+    return AnswerKey(quiz_id, version, questions)
+
+
+def get_answer_key(quiz_id) -> AnswerKey:
+    """
+    Return the answer key for a quiz, building it if the local copy is missing or stale.
+    """
+    # Read the version before building so a concurrent change always forces a rebuild
+    version = _current_version(quiz_id)
+    with _lock:
+        answer_key = _answer_keys.get(quiz_id)
+        if answer_key is not None and answer_key.version == version:
+            _answer_keys.move_to_end(quiz_id)
+            return answer_key
+
+    answer_key = build_answer_key(quiz_id, version)
+    with _lock:
+        _answer_keys[quiz_id] = answer_key
+        _answer_keys.move_to_end(quiz_id)
+        while len(_answer_keys) > ANSWER_KEY_CACHE_SIZE:
+            _answer_keys.popitem(last=False)
+    return answer_key
+
+
+def _bump_version(quiz_id) -> None:
+    cache.set(_version_key(quiz_id), uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_answer_key(quiz_id) -> None:
+    """
+    Publish a new answer key version for a quiz.
+    The version is bumped again on commit so a key rebuilt from uncommitted rows never sticks.
+    """
+    _bump_version(quiz_id)
+    transaction.on_commit(lambda: _bump_version(quiz_id))
+
+
+class SubmissionResult(NamedTuple):
+    answers: list[Answer]
+    score: int
+    answered: int
+    completed: bool
+
+
+def submit_answers(attempt: Attempt, answers: list[tuple[int, int]]) -> SubmissionResult:
+    """
+    Record a batch of (question id, choice id) answers for an attempt in one transaction.
+
+    Answers are expected to be validated against the answer key already. Questions the attempt
+    has answered before are skipped, the new answers are inserted with a single statement and
+    the score is applied with one UPDATE, which also completes the attempt once every question
+    of the quiz has been answered.
+    """
+    answer_key = get_answer_key(attempt.quiz_id)
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Lock the attempt so concurrent submissions cannot score the same question twice
+        score, status = (
+            Attempt.objects.select_for_update()
+            .filter(pk=attempt.pk)
+            .values_list("score", "status")
+            .get()
+        )
+        answered = set(Answer.objects.filter(attempt_id=attempt.pk).values_list("question_id", flat=True))
+
+        new_answers = []
+        for question_id, choice_id in answers:
+            if question_id not in answered:
+                answered.add(question_id)
+                new_answers.append(Answer(attempt_id=attempt.pk, question_id=question_id, selected_choice_id=choice_id))
+        Answer.objects.bulk_create(new_answers)
+        record_answers(attempt.pk, [(a.question_id, a.selected_choice_id) for a in new_answers])
+
+        points = sum(answer_key.points_for(a.question_id, a.selected_choice_id) for a in new_answers)
+        updates = {"score": F("score") + points, "modified_at": now}
+        completed = status == Attempt.IN_PROGRESS and len(answered) >= attempt.quiz.total_questions
+        if completed:
+            updates.update(status=Attempt.COMPLETED, completed_at=now)
+        Attempt.objects.filter(pk=attempt.pk).update(**updates)
+
+        attempt.score = score + points
+        attempt.status = Attempt.COMPLETED if completed else status
+        attempt.modified_at = now
+        if completed:
+            attempt.completed_at = now
+        record_attempt_change(attempt, status, score)
+        attempt.remember_loaded_values("status", "score")
+        if points:
+            record_score(attempt.quiz_id, attempt.participant_id, points)
+
+    return SubmissionResult(new_answers, attempt.score, len(answered), completed)
+
+
+class QueuedAnswer(NamedTuple):
+    """
+    An answer accepted before being written, answered now unless `answered_at` says otherwise.
+    """
+    attempt_id: uuid.UUID
+    quiz_id: uuid.UUID
+    participant_id: uuid.UUID
+    question_id: int
+    choice_id: int
+    answered_at: datetime | None = None
+
+
+class IngestResult(NamedTuple):
+    answers: int
+    attempts: int
+    completed: int
+
+
+STAGE_ANSWERS_SQL = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS answer_staging (
+        position integer, attempt_id uuid, question_id bigint, choice_id bigint, answered_at timestamptz
+    ) ON COMMIT DELETE ROWS
+"""
+
+COPY_ANSWERS_SQL = "COPY answer_staging (position, attempt_id, question_id, choice_id, answered_at) FROM STDIN"
+
+# Answers of an attempt that expired count when they were given before the quiz's end, and answers
+# to questions or choices deleted since they were accepted are dropped
+INSERT_ANSWERS_SQL = f"""
+    INSERT INTO {Answer._meta.db_table} (attempt_id, question_id, selected_choice_id, answered_at)
+    SELECT staged.attempt_id, staged.question_id, staged.choice_id, COALESCE(staged.answered_at, %s)
+    FROM answer_staging staged
+    JOIN {Attempt._meta.db_table} attempt ON attempt.id = staged.attempt_id
+    JOIN {Quiz._meta.db_table} quiz ON quiz.id = attempt.quiz_id
+    JOIN {Choice._meta.db_table} choice ON choice.id = staged.choice_id AND choice.question_id = staged.question_id
+    WHERE attempt.status = {Attempt.IN_PROGRESS}
+        OR (attempt.status = {Attempt.EXPIRED} AND staged.answered_at <= quiz.end_time)
+    ORDER BY staged.position
+    ON CONFLICT (attempt_id, question_id) DO NOTHING
+    RETURNING attempt_id, question_id, selected_choice_id
+"""
+
+SCORE_ATTEMPTS_SQL = f"""
+    UPDATE {Attempt._meta.db_table} AS attempt
+    SET score = attempt.score + scored.points,
+        modified_at = %(now)s,
+        status = CASE WHEN scored.completes THEN {Attempt.COMPLETED} ELSE attempt.status END,
+        completed_at = CASE WHEN scored.completes THEN %(now)s ELSE attempt.completed_at END
+    FROM (
+        SELECT a.id, a.score AS old_score, points.points,
+            a.status = {Attempt.IN_PROGRESS}
+                AND (SELECT COUNT(*) FROM {Answer._meta.db_table} WHERE attempt_id = a.id) >= quiz.question_count
+                AS completes
+        FROM unnest(%(attempt_ids)s::uuid[], %(points)s::int[]) AS points(attempt_id, points)
+        JOIN {Attempt._meta.db_table} a ON a.id = points.attempt_id
+        JOIN {Quiz._meta.db_table} quiz ON quiz.id = a.quiz_id
+        FOR UPDATE OF a
+    ) AS scored
+    WHERE attempt.id = scored.id
+    RETURNING attempt.id, attempt.quiz_id, attempt.participant_id, scored.old_score, attempt.score, scored.completes
+"""
+
+
+def ingest_answers(answers: list[QueuedAnswer]) -> IngestResult:
+    """
+    Record a batch of answers of any number of attempts in one transaction.
+
+    The batch is loaded with COPY into a temporary table, then inserted with a single statement
+    that skips the questions answered before, the first answer of the batch winning. Only the
+    inserted answers are scored, with one UPDATE applying each attempt's points and completing
+    the attempts that have answered every question, whose statistics are then recorded together:
+    ingesting the same answers again changes nothing.
+    """
+    now = timezone.now()
+    quizzes = {answer.attempt_id: answer.quiz_id for answer in answers}
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(STAGE_ANSWERS_SQL)
+            # Raw psycopg, its errors are turned into Django's like those of the wrapped cursor
+            with connection.wrap_database_errors, cursor.cursor.copy(COPY_ANSWERS_SQL) as copy:
+                for position, answer in enumerate(answers):
+                    copy.write_row((position, answer.attempt_id, answer.question_id, answer.choice_id,
+                                    answer.answered_at))
+            cursor.execute(INSERT_ANSWERS_SQL, [now])
+            inserted = cursor.fetchall()
+        if not inserted:
+            return IngestResult(0, 0, 0)
+        record_answer_batch(inserted)
+
+        answer_keys = {quiz_id: get_answer_key(quiz_id) for quiz_id in set(quizzes.values())}
+        points: Counter = Counter()
+        for attempt_id, question_id, choice_id in inserted:
+            points[attempt_id] += answer_keys[quizzes[attempt_id]].points_for(question_id, choice_id)
+
+        with connection.cursor() as cursor:
+            cursor.execute(SCORE_ATTEMPTS_SQL, {"now": now, "attempt_ids": list(points), "points": list(points.values())})
+            scored = cursor.fetchall()
+
+        scores: dict = defaultdict(dict)
+        completed = []
+        for attempt_id, quiz_id, participant_id, old_score, score, completes in scored:
+            if completes:
+                completed.append((attempt_id, quiz_id, score))
+            if score != old_score:
+                scores[quiz_id][participant_id] = score - old_score
+        record_completed_batch(completed)
+        for quiz_id, quiz_scores in scores.items():
+            record_scores(quiz_id, quiz_scores)
+
+    return IngestResult(len(inserted), len(scored), len(completed))
+
+
+class RegradeResult(NamedTuple):
+    attempts: int
+    changed: int
+    duration: float
+
+
+# Submissions committing while the UPDATE waits for a row would be overwritten by the score of
+# its older snapshot, the chunk is locked first so the aggregate sees them
+LOCK_CHUNK_SQL = f"""
+    SELECT id FROM {Attempt._meta.db_table} WHERE id = ANY(%s) ORDER BY id FOR UPDATE
+"""
+
+REGRADE_SQL = f"""
+    UPDATE {Attempt._meta.db_table} AS attempt
+    SET score = graded.score, modified_at = %s
+    FROM (
+        SELECT a.id AS attempt_id, COALESCE(SUM(q.points) FILTER (WHERE c.is_correct), 0) AS score
+        FROM {Attempt._meta.db_table} a
+        LEFT JOIN {Answer._meta.db_table} ans ON ans.attempt_id = a.id
+        LEFT JOIN {Choice._meta.db_table} c ON c.id = ans.selected_choice_id
+        LEFT JOIN {Question._meta.db_table} q ON q.id = ans.question_id
+        WHERE a.id = ANY(%s)
+        GROUP BY a.id
+    ) AS graded
+    WHERE attempt.id = graded.attempt_id AND attempt.score <> graded.score
+"""
+
+
+def regrade_quiz(quiz_id, chunk_size: int = REGRADE_CHUNK_SIZE) -> RegradeResult:
+    """
+    Recompute the score of every attempt of a quiz from its answers.
+
+    Each chunk of attempts is locked, then regraded by one UPDATE ... FROM (SELECT ... SUM(points))
+    in its own short transaction, so large quizzes never hold row locks for the whole run.
+    """
+    started = time.monotonic()
+    attempts = changed = 0
+    last_id = None
+
+    while True:
+        chunk = Attempt.objects.filter(quiz_id=quiz_id).order_by("pk")
+        if last_id is not None:
+            chunk = chunk.filter(pk__gt=last_id)
+        attempt_ids = list(chunk.values_list("pk", flat=True)[:chunk_size])
+        if not attempt_ids:
+            break
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(LOCK_CHUNK_SQL, [attempt_ids])
+            cursor.execute(REGRADE_SQL, [timezone.now(), attempt_ids])
+            changed += cursor.rowcount
+        attempts += len(attempt_ids)
+        last_id = attempt_ids[-1]
+
+    if changed:
+        rebuild_quiz_stats(quiz_id)
+        rebuild_leaderboard(quiz_id)
+
+    result = RegradeResult(attempts, changed, time.monotonic() - started)
+    logger.info(
+        "Regraded quiz %s: %d of %d attempts changed in %.3fs",
+        quiz_id, result.changed, result.attempts, result.duration,
+    )
+    return result
+
+
+class Regrader:
+    """
+    Regrades queued quizzes from a background thread. A quiz queued again before its regrade
+    starts is regraded once, one queued while it runs is regraded again afterwards.
+    """
+
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue()
+        self.pending: set = set()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="regrader", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, quiz_id) -> None:
+        with self.lock:
+            if quiz_id in self.pending:
+                return
+            self.pending.add(quiz_id)
+        self.queue.put(quiz_id)
+
+    def flush(self) -> None:
+        """
+        Wait until every queued quiz has been regraded.
+        """
+        self.queue.join()
+
+    def run(self) -> None:
+        while True:
+            quiz_id = self.queue.get()
+            with self.lock:
+                self.pending.discard(quiz_id)
+            try:
+                regrade_quiz(quiz_id)
+            except Exception:
+                logger.exception("Regrading quiz %s failed", quiz_id)
+            finally:
+                # Regrades are rare, no connection is kept open in between
+                connection.close()
+                self.queue.task_done()
+
+
+_regrader: Regrader | None = None
+_regrader_pid: int | None = None
+_regrader_lock = threading.Lock()
+
+
+def get_regrader() -> Regrader:
+    """
+    The process' regrader, started on first use (and again in forked workers).
+    """
+    global _regrader, _regrader_pid
+    with _regrader_lock:
+        if _regrader is None or _regrader_pid != os.getpid():
+            _regrader = Regrader()
+            _regrader_pid = os.getpid()
+        return _regrader
+
+
+def regrade_in_background() -> bool:
+    return getattr(settings, "REGRADE_IN_BACKGROUND", True)
+
+
+def schedule_regrade(quiz_id) -> None:
+    """
+    Regrade a quiz once the transaction that changed its answer key commits, once however many of
+    its questions and choices the transaction changed. The regrade runs on the regrader's thread,
+    or right away with `REGRADE_IN_BACKGROUND` off.
+    """
+    if regrade_in_background():
+        on_commit_once(("regrade", quiz_id), lambda: get_regrader().enqueue(quiz_id))
+    else:
+        on_commit_once(("regrade", quiz_id), lambda: regrade_quiz(quiz_id))
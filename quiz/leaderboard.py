@@ -0,0 +1,269 @@
+"""
+Per-quiz leaderboards kept in a sorted set, keyed by participant.
+
+The default backend stores each quiz's board in a Redis sorted set on the Redis used by the
+channel layer, so score updates are a single O(log n) ZINCRBY. `InMemoryLeaderboard` keeps
+the same interface in process memory for tests and single-process development.
+Select the backend with the `LEADERBOARD_BACKEND` setting.
+
+A participant's entry is the sum of the scores of their attempts. Changes are announced to the
+quiz's sockets at most LEADERBOARD_PUSH_RATE times per second across all processes: the backend
+holds each quiz's announcement slot, changes made while it is taken are announced by a trailing
+flush once it frees up.
+"""
+import bisect
+import threading
+import time
+import uuid
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils.module_loading import import_string
+
+from .models import Attempt, QuizUser
+from .notifications import GroupMessage, send_to_groups
+
+LEADERBOARD_SIZE = getattr(settings, "LEADERBOARD_SIZE", 10)
+# Maximum number of change announcements per second per quiz, and of pushes each socket receives
+LEADERBOARD_PUSH_RATE = getattr(settings, "LEADERBOARD_PUSH_RATE", 2)
+
+
+class RedisLeaderboard:
+    def __init__(self, url: str = ""):
+        self.redis = redis.Redis.from_url(url or settings.REDIS_URL, decode_responses=True)
+
+    @staticmethod
+    def key(quiz_id) -> str:
+        return f"leaderboard:{quiz_id}"
+
+    def add(self, quiz_id, participant_id, points: int) -> None:
+        self.redis.zincrby(self.key(quiz_id), points, str(participant_id))
+
+    def add_many(self, quiz_id, scores: dict) -> None:
+        with self.redis.pipeline(transaction=False) as pipe:
+            for participant_id, points in scores.items():
+                pipe.zincrby(self.key(quiz_id), points, str(participant_id))
+            pipe.execute()
+
+    def replace(self, quiz_id, scores: dict) -> None:
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key(quiz_id))
+            if scores:
+                pipe.zadd(self.key(quiz_id), {str(member): score for member, score in scores.items()})
+            pipe.execute()
+
+    def top(self, quiz_id, count: int) -> list[tuple[str, int]]:
+        entries = self.redis.zrevrange(self.key(quiz_id), 0, count - 1, withscores=True)
+        return [(member, int(score)) for member, score in entries]
+
+    def rank(self, quiz_id, participant_id) -> tuple[int, int] | None:
+        """
+        1-based rank and score of a participant, None if they are not on the board.
+        """
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(self.key(quiz_id), str(participant_id))
+            pipe.zscore(self.key(quiz_id), str(participant_id))
+            rank, score = pipe.execute()
+        if rank is None:
+            return None
+        return rank + 1, int(score)
+
+    def size(self, quiz_id) -> int:
+        return self.redis.zcard(self.key(quiz_id))
+
+    def claim_announcement(self, quiz_id, interval: float) -> tuple[bool, float, float]:
+        """
+        Take a quiz's announcement slot for `interval` seconds if it is free. Whether it was
+        taken, when its holder announced (a timestamp) and the seconds left until it frees up.
+        """
+        key = f"leaderboard_announced:{quiz_id}"
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, time.time(), nx=True, px=max(1, int(interval * 1000)))
+            pipe.get(key)
+            pipe.pttl(key)
+            claimed, announced, ttl = pipe.execute()
+        return bool(claimed), float(announced or 0), max(ttl, 0) / 1000
+
+
+class InMemoryLeaderboard:
+    """
+    Sorted list of (-score, member) per quiz. Lookups are binary searches, updates shift
+    the list, which is fine at test and development sizes.
+    """
+
+    def __init__(self):
+        self.boards: dict[str, list[tuple[int, str]]] = {}
+        self.scores: dict[str, dict[str, int]] = {}
+        self.announced: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, quiz_id, participant_id, points: int) -> None:
+        quiz_id, member = str(quiz_id), str(participant_id)
+        with self.lock:
+            board = self.boards.setdefault(quiz_id, [])
+            scores = self.scores.setdefault(quiz_id, {})
+            if member in scores:
+                board.pop(bisect.bisect_left(board, (-scores[member], member)))
+            scores[member] = scores.get(member, 0) + points
+            bisect.insort(board, (-scores[member], member))
+
+    def add_many(self, quiz_id, scores: dict) -> None:
+        for participant_id, points in scores.items():
+            self.add(quiz_id, participant_id, points)
+
+    def replace(self, quiz_id, scores: dict) -> None:
+        with self.lock:
+            self.scores[str(quiz_id)] = {str(member): score for member, score in scores.items()}
+            self.boards[str(quiz_id)] = sorted((-score, member) for member, score in self.scores[str(quiz_id)].items())
+
+    def top(self, quiz_id, count: int) -> list[tuple[str, int]]:
+        return [(member, -score) for score, member in self.boards.get(str(quiz_id), [])[:count]]
+
+    def rank(self, quiz_id, participant_id) -> tuple[int, int] | None:
+        member = str(participant_id)
+        score = self.scores.get(str(quiz_id), {}).get(member)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.boards[str(quiz_id)], (-score, member)) + 1, score
+
+    def size(self, quiz_id) -> int:
+        return len(self.scores.get(str(quiz_id), {}))
+
+    def claim_announcement(self, quiz_id, interval: float) -> tuple[bool, float, float]:
+        now = time.time()
+        with self.lock:
+            announced = self.announced.get(str(quiz_id), 0.0)
+            if announced + interval <= now:
+                self.announced[str(quiz_id)] = announced = now
+                return True, now, interval
+        return False, announced, announced + interval - now
+
+
+@lru_cache
+def _leaderboard(backend: str):
+    return import_string(backend)()
+
+
+def get_leaderboard():
+    return _leaderboard(getattr(settings, "LEADERBOARD_BACKEND", "quiz.leaderboard.RedisLeaderboard"))
+
+
+def group_name(quiz_id) -> str:
+    return f"leaderboard_{quiz_id}"
+
+
+# Quiz id -> time of the latest change waiting for the trailing flush
+_pending_changes: dict[str, float] = {}
+_pending_lock = threading.Lock()
+
+
+def _announce_change(quiz_id, changed_at: float | None = None) -> None:
+    """
+    Tell the quiz's sockets its board changed, or leave it to the trailing flush when a change was
+    announced less than one push interval ago.
+    """
+    expire_snapshots(quiz_id)
+    changed_at = changed_at or time.time()
+    claimed, announced, wait = get_leaderboard().claim_announcement(quiz_id, 1 / LEADERBOARD_PUSH_RATE)
+    if claimed:
+        send_to_groups([GroupMessage(group_name(quiz_id), {"type": "leaderboard_changed"})])
+        return
+    if announced >= changed_at:
+        # Announced by another process since the change
+        return
+
+    with _pending_lock:
+        scheduled = str(quiz_id) in _pending_changes
+        _pending_changes[str(quiz_id)] = max(changed_at, _pending_changes.get(str(quiz_id), 0.0))
+    if not scheduled:
+        timer = threading.Timer(wait, _flush_change, (quiz_id,))
+        timer.daemon = True
+        timer.start()
+
+
+def _flush_change(quiz_id) -> None:
+    with _pending_lock:
+        changed_at = _pending_changes.pop(str(quiz_id))
+    _announce_change(quiz_id, changed_at)
+
+
+def _add_score(quiz_id, participant_id, points: int) -> None:
+    get_leaderboard().add(quiz_id, participant_id, points)
+    _announce_change(quiz_id)
+
+
+def record_score(quiz_id, participant_id, points: int) -> None:
+    """
+    Add points to a participant's entry once the transaction that scored them commits.
+    Zero points still put the participant on the board.
+    """
+    transaction.on_commit(lambda: _add_score(quiz_id, participant_id, points))
+
+
+def record_scores(quiz_id, scores: dict) -> None:
+    """
+    Add the points of many participants at once when the transaction commits, announcing one change.
+    """
+    def add_scores():
+        get_leaderboard().add_many(quiz_id, scores)
+        _announce_change(quiz_id)
+
+    if scores:
+        transaction.on_commit(add_scores)
+
+
+def rebuild_leaderboard(quiz_id) -> None:
+    """
+    Replace a quiz's board with the scores stored on its attempts, summed per participant.
+    """
+    scores = dict(
+        Attempt.objects.filter(quiz_id=quiz_id).order_by().values("participant_id")
+        .annotate(total=Sum("score")).values_list("participant_id", "total")
+    )
+    get_leaderboard().replace(quiz_id, scores)
+    _announce_change(quiz_id)
+
+
+_snapshots: dict[str, tuple[float, list[dict]]] = {}
+_changed_at: dict[str, float] = {}
+
+
+def expire_snapshots(quiz_id) -> None:
+    """
+    Stop serving snapshots of a board read before now.
+    """
+    _changed_at[str(quiz_id)] = time.monotonic()
+
+
+def leaderboard_snapshot(quiz_id, count: int = LEADERBOARD_SIZE) -> list[dict]:
+    """
+    Top entries of a board with the participants' usernames. Snapshots are shared by every
+    socket of the process until the board changes or for one push interval, so a busy quiz
+    costs at most LEADERBOARD_PUSH_RATE lookups per second per process.
+    """
+    cache_key = f"{quiz_id}:{count}"
+    cached = _snapshots.get(cache_key)
+    now = time.monotonic()
+    if cached and cached[0] >= _changed_at.get(str(quiz_id), 0) and now - cached[0] < 1 / LEADERBOARD_PUSH_RATE:
+        return cached[1]
+
+    entries = get_leaderboard().top(quiz_id, count)
+    usernames = dict(
+        QuizUser.objects.filter(pk__in=[member for member, _ in entries]).values_list("pk", "username")
+    )
+    snapshot = [
+        {
+            "rank": rank,
+            "participant": {"id": member, "username": usernames.get(uuid.UUID(member))},
+            "score": score,
+        }
+        for rank, (member, score) in enumerate(entries, start=1)
+    ]
+    if len(_snapshots) > 1024:
+        _snapshots.clear()
+        _changed_at.clear()
+    _snapshots[cache_key] = (now, snapshot)
+    return snapshot
@@ -0,0 +1,209 @@
+"""
+Live sessions: the quiz's owner moves every participant to the next question at the same moment,
+participants answer it before its deadline.
+
+The current question of a session is kept in the shared cache so sockets joining late get it too,
+and is pushed to the quiz's live group as it starts. Answers are checked against it by the socket
+and acknowledged straight away, then held in the process' `AnswerBuffer`. A background thread
+writes the buffered answers every LIVE_FLUSH_INTERVAL seconds with `grading.ingest_answers`, a few
+set-based statements per batch whatever the number of participants: one COPY and one INSERT of the
+answers, one UPDATE scoring (and completing) their attempts, one upsert of the answer counters, two
+of the statistics of the attempts it completes and one leaderboard update per quiz. Writes are idempotent: a batch that failed to reach the database
+is retried with the next one, a batch the database turned down is split until the answers it
+cannot take are set aside as dead letters, logged and counted.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections
+
+from .grading import QueuedAnswer, ingest_answers
+from .models import Attempt, Question, Quiz
+from .serializers import ChoiceSerializer
+
+logger = logging.getLogger(__name__)
+
+# Seconds participants have to answer a question, unless the host says otherwise
+LIVE_ANSWER_WINDOW = getattr(settings, "LIVE_ANSWER_WINDOW", 20)
+LIVE_FLUSH_INTERVAL = getattr(settings, "LIVE_FLUSH_INTERVAL", 0.25)
+# Answers held per process before new ones are turned away
+LIVE_BUFFER_SIZE = getattr(settings, "LIVE_BUFFER_SIZE", 100_000)
+LIVE_SESSION_TTL = getattr(settings, "LIVE_SESSION_TTL", 6 * 3600)
+# Dead letters kept in memory for inspection, the oldest go first
+LIVE_DEAD_LETTERS = getattr(settings, "LIVE_DEAD_LETTERS", 1000)
+
+HOST = "host"
+PARTICIPANT = "participant"
+
+
+class AnswerBuffer:
+    """
+    Live answers waiting to be written, flushed in batches by a background thread.
+    """
+
+    def __init__(self, interval: float = LIVE_FLUSH_INTERVAL, max_size: int = LIVE_BUFFER_SIZE):
+        self.interval = interval
+        self.max_size = max_size
+        self.answers: list[QueuedAnswer] = []
+        self.counters: Counter = Counter()
+        self.dead_letters: deque[QueuedAnswer] = deque(maxlen=LIVE_DEAD_LETTERS)
+        self.lock = threading.Lock()
+        # One flush at a time, from the thread or from `flush()`
+        self.flush_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="live-answer-buffer", daemon=True)
+        self.thread.start()
+
+    def add(self, answer: QueuedAnswer) -> bool:
+        """
+        Buffer an answer, False when the buffer is full.
+        """
+        with self.lock:
+            if len(self.answers) >= self.max_size:
+                self.counters["rejected"] += 1
+                return False
+            self.answers.append(answer)
+            self.counters["buffered"] += 1
+            return True
+
+    def metrics(self) -> dict:
+        """
+        Counts of buffered, rejected, written, failed and dead-lettered answers, flushes and the
+        current backlog.
+        """
+        with self.lock:
+            return {
+                **{name: self.counters[name]
+                   for name in ("buffered", "rejected", "written", "failed", "dead_lettered", "flushes")},
+                "backlog": len(self.answers),
+            }
+
+    def flush(self) -> None:
+        """
+        Write the buffered answers now.
+        """
+        with self.flush_lock:
+            with self.lock:
+                batch, self.answers = self.answers, []
+            if not batch:
+                return
+            try:
+                self.write(batch)
+            except Exception:
+                logger.exception("Writing %d live answers failed, retrying with the next batch", len(batch))
+                with self.lock:
+                    self.counters["failed"] += len(batch)
+                    self.answers[:0] = batch
+                return
+            with self.lock:
+                self.counters["flushes"] += 1
+
+    def write(self, batch: list[QueuedAnswer]) -> None:
+        """
+        Write a batch, halving it while the database turns it down, down to the answers it cannot
+        take. Failing to reach the database raises, the batch is retried whole.
+        """
+        try:
+            result = ingest_answers(batch)
+        except (OperationalError, InterfaceError):
+            raise
+        except DatabaseError:
+            if len(batch) == 1:
+                logger.exception("Live answer %s turned down, dead-lettered", batch[0])
+                with self.lock:
+                    self.counters["dead_lettered"] += 1
+                    self.dead_letters.append(batch[0])
+                return
+            middle = len(batch) // 2
+            self.write(batch[:middle])
+            self.write(batch[middle:])
+            return
+        with self.lock:
+            self.counters["written"] += result.answers
+
+    def run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            # Drop a connection that broke, like at the end of a request
+            close_old_connections()
+            self.flush()
+            close_old_connections()
+
+
+_buffer: AnswerBuffer | None = None
+_buffer_pid: int | None = None
+_buffer_lock = threading.Lock()
+
+
+def get_answer_buffer() -> AnswerBuffer:
+    """
+    The process' answer buffer, started on first use (and again in forked workers).
+    """
+    global _buffer, _buffer_pid
+    with _buffer_lock:
+        if _buffer is None or _buffer_pid != os.getpid():
+            _buffer = AnswerBuffer()
+            _buffer_pid = os.getpid()
+        return _buffer
+
+
+def live_group(quiz_id) -> str:
+    return f"live_{quiz_id}"
+
+
+def _session_key(quiz_id) -> str:
+    return f"live_session:{quiz_id}"
+
+
+def live_role(quiz_id, user) -> tuple[str | None, uuid.UUID | None]:
+    """
+    Whether the user hosts the quiz's session or takes part in it with their attempt in progress.
+    """
+    if Quiz.objects.filter(pk=quiz_id, owner=user).exists():
+        return HOST, None
+    attempt_id = Attempt.objects.filter(
+        quiz_id=quiz_id, participant=user, status=Attempt.IN_PROGRESS
+    ).values_list("pk", flat=True).first()
+    return (PARTICIPANT, attempt_id) if attempt_id else (None, None)
+
+
+def current_question(quiz_id) -> dict | None:
+    return cache.get(_session_key(quiz_id))
+
+
+def next_question(quiz_id, seconds: float = LIVE_ANSWER_WINDOW) -> dict | None:
+    """
+    Start the question after the current one, open for `seconds`. None after the last question.
+    """
+    current = current_question(quiz_id)
+    question = (
+        Question.objects.filter(quiz_id=quiz_id, order__gt=current["order"] if current else -1)
+        .prefetch_related("choices")
+        .order_by("order")
+        .first()
+    )
+    if question is None:
+        return None
+    live_question = {
+        "question_id": question.pk,
+        "text": question.text,
+        "order": question.order,
+        "points": question.points,
+        "choices": [dict(choice) for choice in ChoiceSerializer(question.choices.all(), many=True).data],
+        "deadline": time.time() + seconds,
+    }
+    cache.set(_session_key(quiz_id), live_question, LIVE_SESSION_TTL)
+    return live_question
+
+
+def end_session(quiz_id) -> None:
+    """
+    Forget the session's question and write the answers buffered by this process.
+    """
+    cache.delete(_session_key(quiz_id))
+    get_answer_buffer().flush()
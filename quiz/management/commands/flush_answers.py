@@ -0,0 +1,49 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from quiz.answer_log import ANSWER_LOG_BATCH_SIZE, ANSWER_LOG_FLUSH_INTERVAL, flush_answer_log, run_flusher
+from quiz.notifications import get_dispatcher
+
+
+class Command(BaseCommand):
+    help = "Write the answers of the write-behind answer log to the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Write the answers logged so far and exit")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ANSWER_LOG_BATCH_SIZE,
+            help="Answers written per transaction",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=ANSWER_LOG_FLUSH_INTERVAL,
+            help="Seconds to wait when the log is empty",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            entries = answers = dead_lettered = 0
+            while True:
+                result = flush_answer_log(options["batch_size"])
+                entries += result.entries
+                answers += result.answers
+                dead_lettered += result.dead_lettered
+                if result.entries < options["batch_size"]:
+                    break
+            # Leaderboard updates go out from the dispatcher's thread
+            get_dispatcher().flush()
+            self.stdout.write(self.style.SUCCESS(f"Flushed {entries} logged answers, {answers} written, "
+                                                 f"{dead_lettered} dead-lettered"))
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        self.stdout.write("Answer log flusher running")
+        run_flusher(stop, options["batch_size"], options["interval"])
+        get_dispatcher().flush()
@@ -0,0 +1,28 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.models import Quiz
+from quiz.stats import rebuild_quiz_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild quiz statistics and per-question item analytics from the recorded attempts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz_ids", nargs="*", help="IDs of the quizzes to rebuild, all quizzes if omitted")
+
+    def handle(self, *args, **options):
+        quiz_ids = options["quiz_ids"]
+        for quiz_id in quiz_ids:
+            try:
+                exists = Quiz.objects.filter(pk=quiz_id).exists()
+            except ValidationError:
+                exists = False
+            if not exists:
+                raise CommandError(f"Quiz {quiz_id} does not exist")
+
+        rebuilt = 0
+        for quiz_id in quiz_ids or Quiz.objects.values_list("pk", flat=True).iterator():
+            rebuild_quiz_stats(quiz_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics of {rebuilt} quizzes"))
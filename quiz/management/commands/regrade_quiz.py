@@ -0,0 +1,33 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.grading import REGRADE_CHUNK_SIZE, regrade_quiz
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = "Recompute the scores of every attempt of the given quizzes from their answers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz_ids", nargs="+", help="IDs of the quizzes to regrade")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=REGRADE_CHUNK_SIZE,
+            help="Number of attempts regraded per transaction",
+        )
+
+    def handle(self, *args, **options):
+        for quiz_id in options["quiz_ids"]:
+            try:
+                exists = Quiz.objects.filter(pk=quiz_id).exists()
+            except ValidationError:
+                exists = False
+            if not exists:
+                raise CommandError(f"Quiz {quiz_id} does not exist")
+
+            result = regrade_quiz(quiz_id, chunk_size=options["chunk_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Regraded {quiz_id}: {result.changed} of {result.attempts} attempts changed "
+                f"in {result.duration:.3f}s"
+            ))
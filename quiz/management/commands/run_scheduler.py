@@ -0,0 +1,45 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from quiz.notifications import get_dispatcher
+from quiz.scheduler import SCHEDULER_HORIZON, SCHEDULER_RELOAD_INTERVAL, DeadlineScheduler, apply_deadlines
+
+
+class Command(BaseCommand):
+    help = ("Open and close quizzes at their start and end times, expiring the attempts and invitations "
+            "of the closed ones.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Apply the deadlines that have passed and exit")
+        parser.add_argument(
+            "--horizon",
+            type=float,
+            default=SCHEDULER_HORIZON,
+            help="Seconds of upcoming deadlines kept in memory",
+        )
+        parser.add_argument(
+            "--reload-interval",
+            type=float,
+            default=SCHEDULER_RELOAD_INTERVAL,
+            help="Seconds between reloads of the upcoming deadlines",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            result = apply_deadlines()
+            # The status events go out from the dispatcher's thread
+            get_dispatcher().flush()
+            self.stdout.write(self.style.SUCCESS(
+                f"Opened {len(result.opened)} quizzes, closed {len(result.closed)}, expired "
+                f"{result.expired_attempts} attempts and {result.expired_invitations} invitations"
+            ))
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        self.stdout.write("Scheduler running")
+        DeadlineScheduler(options["horizon"], options["reload_interval"]).run(stop)
+        get_dispatcher().flush()
@@ -1,19 +1,37 @@
+import asyncio
+
 from channels.middleware import BaseMiddleware
-from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth import get_user_model
-from rest_framework.authtoken.models import Token
+
+from quiz.authentication import cached_token_user, get_token_user
+from quiz.executor import database_sync_to_async
 
 User = get_user_model()
 
 
-@database_sync_to_async
-def get_user(token_key):
-    try:
-        token = Token.objects.get(key=token_key)
-        return token.user
-    except Token.DoesNotExist:
+# Lookups in flight, so a reconnect storm resolves each token once
+_lookups: dict[tuple[int, str], asyncio.Future] = {}
+
+
+async def _lookup_user(token_key):
+    key = (id(asyncio.get_running_loop()), token_key)
+    lookup = _lookups.get(key)
+    if lookup is None:
+        lookup = asyncio.ensure_future(database_sync_to_async(get_token_user)(token_key))
+        _lookups[key] = lookup
+        lookup.add_done_callback(lambda _: _lookups.pop(key, None))
+    return await asyncio.shield(lookup)
+
+
+async def get_user(token_key):
+    # Reconnects are served from the in-process cache without a thread hop
+    user = cached_token_user(token_key)
+    if user is None:
+        user = await _lookup_user(token_key)
+    if user is None or not user.is_active:
         return AnonymousUser()
+    return user
 
 
 class TokenAuthMiddleware(BaseMiddleware):
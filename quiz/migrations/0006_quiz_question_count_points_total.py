@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_quiz_totals(apps, schema_editor):
+    Quiz = apps.get_model("quiz", "Quiz")
+    Question = apps.get_model("quiz", "Question")
+
+    totals = Question.objects.filter(quiz=OuterRef("pk")).order_by().values("quiz")
+    Quiz.objects.update(
+        question_count=Coalesce(Subquery(totals.annotate(c=Count("pk")).values("c")), 0),
+        points_total=Coalesce(Subquery(totals.annotate(p=Sum("points")).values("p")), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_attempt_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='points_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_quiz_totals, migrations.RunPython.noop),
+    ]
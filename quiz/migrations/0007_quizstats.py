@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Statuses: 1 in progress, 2 completed, 3 expired
+BACKFILL_SQL = """
+    INSERT INTO quiz_quizstats (
+        quiz_id, shard, in_progress_attempts, completed_attempts, expired_attempts,
+        score_sum, score_squares_sum, min_score, max_score
+    )
+    SELECT
+        quiz_id, 0,
+        COUNT(*) FILTER (WHERE status = 1),
+        COUNT(*) FILTER (WHERE status = 2),
+        COUNT(*) FILTER (WHERE status = 3),
+        COALESCE(SUM(score) FILTER (WHERE status = 2), 0),
+        COALESCE(SUM(score::bigint * score) FILTER (WHERE status = 2), 0),
+        MIN(score) FILTER (WHERE status = 2),
+        MAX(score) FILTER (WHERE status = 2)
+    FROM quiz_attempt
+    GROUP BY quiz_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_quiz_question_count_points_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('in_progress_attempts', models.IntegerField(default=0)),
+                ('completed_attempts', models.IntegerField(default=0)),
+                ('expired_attempts', models.IntegerField(default=0)),
+                ('score_sum', models.BigIntegerField(default=0)),
+                ('score_squares_sum', models.BigIntegerField(default=0)),
+                ('min_score', models.PositiveIntegerField(blank=True, null=True)),
+                ('max_score', models.PositiveIntegerField(blank=True, null=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='quiz.quiz')),
+            ],
+            options={
+                'verbose_name_plural': 'Quiz stats',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='quizstats',
+            constraint=models.UniqueConstraint(fields=('quiz', 'shard'), name='one_stats_row_per_quiz_shard'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
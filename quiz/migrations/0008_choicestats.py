@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_quizstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChoiceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('answer_count', models.IntegerField(default=0)),
+                ('completed_answer_count', models.IntegerField(default=0)),
+                ('completed_score_sum', models.BigIntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='quiz.choice')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choice_stats', to='quiz.question')),
+            ],
+            options={
+                'verbose_name_plural': 'Choice stats',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='choicestats',
+            constraint=models.UniqueConstraint(fields=('choice', 'shard'), name='one_stats_row_per_choice_shard'),
+        ),
+    ]
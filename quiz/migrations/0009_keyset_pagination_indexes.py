@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:25
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to the tables
+    atomic = False
+
+    dependencies = [
+        ('quiz', '0008_choicestats'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='attempt',
+            index=models.Index(fields=['participant', '-created_at', '-id'], name='attempt_participant_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invitation',
+            index=models.Index(fields=['participant', '-created_at', '-id'], name='invitation_participant_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='quiz',
+            index=models.Index(fields=['owner', '-created_at', '-id'], name='quiz_owner_created_idx'),
+        ),
+    ]
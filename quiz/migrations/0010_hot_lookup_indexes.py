@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:29
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to the tables
+    atomic = False
+
+    dependencies = [
+        ('quiz', '0009_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='attempt',
+            index=models.Index(fields=['quiz', 'status'], name='attempt_quiz_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='invitation',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['participant', '-created_at', '-id'], name='invitation_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:03
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to the tables
+    atomic = False
+
+    dependencies = [
+        ('quiz', '0012_notification'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quiz',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Draft'), (4, 'Scheduled'), (2, 'Active'), (3, 'Closed')], default=1),
+        ),
+        # Active quizzes that have not started yet wait for the scheduler to open them
+        migrations.RunSQL(
+            "UPDATE quiz_quiz SET status = 4 WHERE status = 2 AND start_time > now()",
+            "UPDATE quiz_quiz SET status = 2 WHERE status = 4",
+        ),
+        AddIndexConcurrently(
+            model_name='quiz',
+            index=models.Index(condition=models.Q(('status', 4)), fields=['start_time'], name='quiz_scheduled_start_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='quiz',
+            index=models.Index(condition=models.Q(('status__in', [2, 4])), fields=['end_time'], name='quiz_open_end_idx'),
+        ),
+    ]
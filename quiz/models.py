@@ -2,9 +2,10 @@ import uuid
 from datetime import datetime, timezone
 
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models import Count, Q, Sum, UniqueConstraint
+from django.db import models, transaction
+from django.db.models import Count, Q, UniqueConstraint
 from django.utils.translation import gettext_lazy as _
 
 
@@ -28,6 +29,31 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class LoadedValuesMixin(models.Model):
+    """
+    Remember the values an instance was loaded with so signals can work out what changed.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def loaded_value(self, field_name: str):
+        """
+        Value of `field_name` when the instance was loaded (or last seen by the signals).
+        """
+        return getattr(self, "_loaded_values", {}).get(field_name, getattr(self, field_name))
+
+    def remember_loaded_values(self, *field_names: str) -> None:
+        loaded = getattr(self, "_loaded_values", {})
+        self._loaded_values = {**loaded, **{name: getattr(self, name) for name in field_names}}
+
+
 class Quiz(BaseModel):
     """
     Representation of a basic quiz structure.
@@ -38,8 +64,11 @@ class Quiz(BaseModel):
     DRAFT = 1
     ACTIVE = 2
     CLOSED = 3
+    # Published, waiting for its start time
+    SCHEDULED = 4
     STATUS = [
         (DRAFT, _("Draft")),
+        (SCHEDULED, _("Scheduled")),
         (ACTIVE, _("Active")),
         (CLOSED, _("Closed")),
     ]
@@ -50,19 +79,45 @@ class Quiz(BaseModel):
     status = models.PositiveSmallIntegerField(choices=STATUS, default=DRAFT)
     start_time = models.DateTimeField(null=True, blank=True)
     end_time = models.DateTimeField(null=True, blank=True)
+    # Denormalized from the questions, maintained by signals
+    question_count = models.PositiveIntegerField(default=0, editable=False)
+    points_total = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped by signals whenever a question or choice changes
+    content_version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
         verbose_name_plural = "Quizzes"
+        indexes = [
+            # Keyset pagination of a user's quizzes
+            models.Index(fields=["owner", "-created_at", "-id"], name="quiz_owner_created_idx"),
+            # Upcoming deadlines of the scheduler, see scheduler.py
+            models.Index(
+                fields=["start_time"],
+                condition=Q(status=4),  # SCHEDULED
+                name="quiz_scheduled_start_idx",
+            ),
+            models.Index(
+                fields=["end_time"],
+                condition=Q(status__in=[2, 4]),  # ACTIVE, SCHEDULED
+                name="quiz_open_end_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Published ahead of its start time, the scheduler opens it when the time comes
+        if self.status == self.ACTIVE and self.start_time and self.start_time > datetime.now(timezone.utc):
+            self.status = self.SCHEDULED
+        super().save(*args, **kwargs)
+
     @property
     def is_active(self) -> bool:
         """
-        Check if a quiz is still active.
-        TODO: Use a signal to set status
+        Check if a quiz is still active. The scheduler keeps `status` in step with the start and
+        end times, these are checked too for the moments before it catches up.
         """
         if not self.status == self.ACTIVE:
             return False
@@ -70,7 +125,7 @@ class Quiz(BaseModel):
         now = datetime.now(timezone.utc)
         if self.start_time and self.start_time > now:
             return False
-        if self.end_time and now  < self.end_time:
+        if self.end_time and self.end_time <= now:
             return False
 
         return True
@@ -80,19 +135,18 @@ class Quiz(BaseModel):
         """
         Retrieve the maximum score possible.
         """
-        return self.questions.all().aggregate(Sum("points"))["points__sum"]
+        return self.points_total
 
     @property
     def total_questions(self) -> int:
-
-        return self.questions.count()
+        return self.question_count
 
     @property
     def participant_stats(self):
         return self.attempts.values("status").annotate(count=Count("pk"))
 
 
-class Question(models.Model):
+class Question(LoadedValuesMixin):
     """
     Model representing a question in a Quiz.
     """
@@ -123,12 +177,18 @@ class Question(models.Model):
     def __str__(self) -> str:
         return f"{self.quiz.title} - Question {self.order + 1}"
 
+    def save(self, *args, **kwargs):
+        # Run the post_save bookkeeping in the same transaction as the row itself
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     @property
     def correct_choice(self):
-        return self.choices.filter(is_correct=True).first()
+        # At most one choice is correct, so skip the ordering and read it from the partial unique index
+        return next(iter(self.choices.filter(is_correct=True).order_by()[:1]), None)
 
 
-class Choice(models.Model):
+class Choice(LoadedValuesMixin):
     """
     A single option for a question. Only a single choice may be marked as 'is_correct'.
     """
@@ -186,12 +246,22 @@ class Invitation(BaseModel):
                 name="one_entry_per_participant_per_quiz",
             ),
         ]
+        indexes = [
+            # Keyset pagination of a user's invitations
+            models.Index(fields=["participant", "-created_at", "-id"], name="invitation_participant_idx"),
+            # A user's open invitations, a small slice of all invitations
+            models.Index(
+                fields=["participant", "-created_at", "-id"],
+                condition=Q(status=1),  # PENDING
+                name="invitation_pending_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.quiz.title} - {self.participant.email}"
 
 
-class Attempt(BaseModel):
+class Attempt(LoadedValuesMixin, BaseModel):
     """
     Represents an attempt by a user at a quiz. For the moment limited to 1 (one).
     """
@@ -214,6 +284,12 @@ class Attempt(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination of a user's attempts
+            models.Index(fields=["participant", "-created_at", "-id"], name="attempt_participant_idx"),
+            # Attempts of a quiz by status: participant stats and statistics rebuilds
+            models.Index(fields=["quiz", "status"], name="attempt_quiz_status_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.participant.username} - {self.quiz.title} ({self.status})"
@@ -253,3 +329,84 @@ class Answer(models.Model):
 
     def __str__(self) -> str:
         return f"Answer: {self.selected_choice.text}"
+
+
+class QuizStats(models.Model):
+    """
+    Running statistics of a quiz's attempts, split over a few shard rows per quiz so concurrent
+    writes for a popular quiz do not all queue on one row. Scores only cover completed attempts.
+    """
+
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="stats")
+    shard = models.PositiveSmallIntegerField(default=0)
+    in_progress_attempts = models.IntegerField(default=0)
+    completed_attempts = models.IntegerField(default=0)
+    expired_attempts = models.IntegerField(default=0)
+    score_sum = models.BigIntegerField(default=0)
+    score_squares_sum = models.BigIntegerField(default=0)
+    min_score = models.PositiveIntegerField(null=True, blank=True)
+    max_score = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Quiz stats"
+        constraints = [
+            UniqueConstraint(
+                fields=["quiz", "shard"],
+                name="one_stats_row_per_quiz_shard",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.quiz.title} - Stats shard {self.shard}"
+
+
+class ChoiceStats(models.Model):
+    """
+    Running answer counts of a choice, sharded like `QuizStats`. The completed columns only cover
+    answers of completed attempts and sum those attempts' final scores, which is what item
+    discrimination is computed from.
+    """
+
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE, related_name="stats")
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="choice_stats")
+    shard = models.PositiveSmallIntegerField(default=0)
+    answer_count = models.IntegerField(default=0)
+    completed_answer_count = models.IntegerField(default=0)
+    completed_score_sum = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Choice stats"
+        constraints = [
+            UniqueConstraint(
+                fields=["choice", "shard"],
+                name="one_stats_row_per_choice_shard",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.choice} - Stats shard {self.shard}"
+
+
+class Notification(models.Model):
+    """
+    A notification sent while its recipient had no socket open, kept until they read it. IDs are
+    the cursors sockets replay the inbox from.
+    """
+
+    recipient = models.ForeignKey(QuizUser, on_delete=models.CASCADE, related_name="notifications")
+    content = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            # Replay of a user's inbox after a cursor
+            models.Index(fields=["recipient", "id"], name="notification_recipient_idx"),
+            # Unread notifications: the replay without a cursor and the unread counter
+            models.Index(fields=["recipient", "id"], condition=Q(read_at__isnull=True),
+                         name="notification_unread_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.recipient} - {self.content.get('type')} ({self.id})"
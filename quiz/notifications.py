@@ -0,0 +1,234 @@
+"""
+WebSocket notifications, sent off the request path.
+
+Messages are queued once the transaction that produced them commits, so a rolled back request
+never notifies anyone and the response does not wait on the channel layer. A single dispatcher
+thread per process runs its own event loop, takes queued messages off in batches and sends each
+batch concurrently, retrying failed sends with a backoff. The queue is bounded: when the channel
+layer falls too far behind new messages are dropped and counted rather than piling up in memory.
+
+Every notification is kept in its recipient's inbox in the transaction that produced it. Users
+with a socket open (see `presence`) are sent it as well, with its `notification_id`; whatever a
+socket missed (offline, dropped by a full queue, lost in flight) is replayed from the inbox when it
+connects or asks for it.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+from collections import Counter
+from typing import NamedTuple
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+from .presence import get_presence
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_QUEUE_SIZE = getattr(settings, "NOTIFICATION_QUEUE_SIZE", 10000)
+NOTIFICATION_BATCH_SIZE = getattr(settings, "NOTIFICATION_BATCH_SIZE", 500)
+# Maximum number of group sends in flight at once
+NOTIFICATION_CONCURRENCY = getattr(settings, "NOTIFICATION_CONCURRENCY", 100)
+NOTIFICATION_RETRIES = getattr(settings, "NOTIFICATION_RETRIES", 3)
+NOTIFICATION_RETRY_DELAY = getattr(settings, "NOTIFICATION_RETRY_DELAY", 0.1)
+# Inbox notifications sent per replay, a socket asks for the next page with the returned cursor
+INBOX_REPLAY_SIZE = getattr(settings, "INBOX_REPLAY_SIZE", 100)
+
+
+class GroupMessage(NamedTuple):
+    group: str
+    event: dict
+
+
+class NotificationDispatcher:
+    """
+    Sends queued group messages to the channel layer from a background thread.
+    """
+
+    def __init__(self, queue_size: int = NOTIFICATION_QUEUE_SIZE, batch_size: int = NOTIFICATION_BATCH_SIZE):
+        self.queue: queue.Queue[GroupMessage] = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.counters: Counter = Counter()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="notification-dispatcher", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, messages: list[GroupMessage]) -> None:
+        for message in messages:
+            try:
+                self.queue.put_nowait(message)
+            except queue.Full:
+                self.count("dropped")
+                logger.warning("Notification queue full, dropped message to %s", message.group)
+            else:
+                self.count("queued")
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] += value
+
+    def metrics(self) -> dict:
+        """
+        Counts of queued, sent, retried, failed and dropped messages, and the current backlog.
+        """
+        with self.lock:
+            return {
+                **{name: self.counters[name] for name in ("queued", "sent", "retried", "failed", "dropped")},
+                "backlog": self.queue.qsize(),
+            }
+
+    def flush(self) -> None:
+        """
+        Wait until every queued message has been sent or given up on.
+        """
+        self.queue.join()
+
+    def run(self) -> None:
+        loop = asyncio.new_event_loop()
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                loop.run_until_complete(self.send_batch(batch))
+            except Exception:
+                logger.exception("Notification batch failed")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def send_batch(self, batch: list[GroupMessage]) -> None:
+        channel_layer = get_channel_layer()
+        semaphore = asyncio.Semaphore(NOTIFICATION_CONCURRENCY)
+
+        async def send(message: GroupMessage):
+            async with semaphore:
+                for attempt in range(NOTIFICATION_RETRIES + 1):
+                    try:
+                        await channel_layer.group_send(message.group, message.event)
+                    except Exception:
+                        if attempt == NOTIFICATION_RETRIES:
+                            self.count("failed")
+                            logger.exception("Could not send notification to %s", message.group)
+                            return
+                        self.count("retried")
+                        await asyncio.sleep(NOTIFICATION_RETRY_DELAY * 2 ** attempt)
+                    else:
+                        self.count("sent")
+                        return
+
+        await asyncio.gather(*(send(message) for message in batch))
+
+
+_dispatcher: NotificationDispatcher | None = None
+_dispatcher_pid: int | None = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> NotificationDispatcher:
+    """
+    The process' dispatcher, started on first use (and again in forked workers).
+    """
+    global _dispatcher, _dispatcher_pid
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher_pid != os.getpid():
+            _dispatcher = NotificationDispatcher()
+            _dispatcher_pid = os.getpid()
+        return _dispatcher
+
+
+def send_to_groups(messages: list[GroupMessage]) -> None:
+    """
+    Queue group messages for dispatch once the current transaction commits.
+    """
+    if messages:
+        transaction.on_commit(lambda: get_dispatcher().enqueue(messages))
+
+
+def user_group(user_id) -> str:
+    return f"user_{user_id}"
+
+
+def notify_users(messages: list[tuple[object, dict]]) -> None:
+    """
+    Keep each (user id, content) message in the user's inbox, and send it to the user's group once
+    the transaction commits when they have a socket open.
+    """
+    if not messages:
+        return
+    stored = Notification.objects.bulk_create(
+        Notification(recipient_id=user_id, content=content) for user_id, content in messages
+    )
+    online = get_presence().online({user_id for user_id, _ in messages})
+    send_to_groups([
+        GroupMessage(user_group(notification.recipient_id), {
+            "type": "invitation_message", "content": {**notification.content, "notification_id": notification.pk},
+        })
+        for notification in stored if notification.recipient_id in online
+    ])
+
+
+def inbox(user_id, cursor: int | None = None) -> dict:
+    """
+    A page of a user's inbox: the notifications after `cursor`, or the unread ones without one,
+    each with its `notification_id`. The page's `cursor` is where the next one starts.
+    """
+    notifications = Notification.objects.filter(recipient_id=user_id)
+    pending = notifications.filter(read_at__isnull=True) if cursor is None else notifications.filter(id__gt=cursor)
+    page = list(pending.order_by("id").values_list("id", "content")[:INBOX_REPLAY_SIZE + 1])
+    more = len(page) > INBOX_REPLAY_SIZE
+    page = page[:INBOX_REPLAY_SIZE]
+    return {
+        "notifications": [{**content, "notification_id": id_} for id_, content in page],
+        "cursor": page[-1][0] if page else cursor,
+        "more": more,
+        "unread": notifications.filter(read_at__isnull=True).count(),
+    }
+
+
+def mark_read(user_id, cursor: int) -> int:
+    """
+    Mark a user's notifications up to `cursor` read, and return how many are left unread.
+    """
+    notifications = Notification.objects.filter(recipient_id=user_id, read_at__isnull=True)
+    notifications.filter(id__lte=cursor).update(read_at=timezone.now())
+    return notifications.count()
+
+
+def invitation_message(invitation, quiz, inviter) -> dict:
+    """
+    Content of the notification a participant receives when invited to a quiz.
+    """
+    inviter_name = inviter.get_full_name() or inviter.username
+    return {
+        "type": "invitation",
+        "invitation_id": str(invitation.id),
+        "quiz_id": str(quiz.id),
+        "quiz_title": quiz.title,
+        "inviter": inviter_name,
+        "message": f"You have been invited to take the quiz: {quiz.title} by {inviter_name}"
+    }
+
+
+def invitation_response_message(invitation, quiz, participant, status_text: str) -> dict:
+    """
+    Content of the notification an inviter receives when their invitation is answered.
+    """
+    participant_name = participant.get_full_name() or participant.username
+    return {
+        "type": "invitation_response",
+        "invitation_id": str(invitation.id),
+        "quiz_id": str(quiz.id),
+        "quiz_title": quiz.title,
+        "participant": participant_name,
+        "status": status_text,
+        "message": f"{participant_name} has {status_text.lower()} your invitation to {quiz.title}"
+    }
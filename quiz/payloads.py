@@ -0,0 +1,86 @@
+"""
+Pre-rendered quiz payloads for participants.
+
+Every participant of a quiz gets the same questions and choices, so the payload is rendered once
+per version of the quiz, gzipped and kept in the shared cache as bytes. The version combines the
+quiz's `content_version`, bumped by signals whenever one of its questions or choices changes,
+with its `modified_at`, so edits to either give a new cache entry instead of invalidating one.
+`is_active` depends on the time of day, entries expire at the quiz's next start or end time.
+"""
+import gzip
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import codec
+from .models import Quiz
+from .serializers import ParticipantQuizDetailSerializer
+
+QUIZ_PAYLOAD_CACHE_TTL = getattr(settings, "QUIZ_PAYLOAD_CACHE_TTL", 3600)
+
+# Cache key -> [lock, number of threads holding or waiting for it]
+_build_locks: dict[str, list] = {}
+_build_locks_lock = threading.Lock()
+
+
+def payload_version(content_version: int, modified_at: datetime) -> str:
+    return f"{content_version}.{int(modified_at.timestamp() * 1_000_000)}"
+
+
+def _cache_key(quiz_id, version: str) -> str:
+    return f"quiz_payload:{quiz_id}:{version}"
+
+
+def _timeout(quiz: Quiz) -> int:
+    now = timezone.now()
+    boundaries = [moment for moment in (quiz.start_time, quiz.end_time) if moment and moment > now]
+    if not boundaries:
+        return QUIZ_PAYLOAD_CACHE_TTL
+    return max(1, min(QUIZ_PAYLOAD_CACHE_TTL, int((min(boundaries) - now).total_seconds()) + 1))
+
+
+@contextmanager
+def _building(key: str):
+    """
+    Hold the build lock of a cache key, so payloads of other quizzes or versions build alongside.
+    """
+    with _build_locks_lock:
+        entry = _build_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _build_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _build_locks[key]
+
+
+def render_participant_payload(quiz_id) -> tuple[bytes, int]:
+    """
+    The gzipped participant payload of a quiz and how long it may be cached for.
+    """
+    quiz = Quiz.objects.select_related("owner").prefetch_related("questions__choices").get(pk=quiz_id)
+    data = ParticipantQuizDetailSerializer(quiz).data
+    return gzip.compress(codec.dumps(data)), _timeout(quiz)
+
+
+def participant_payload(quiz_id, version: str) -> bytes:
+    """
+    The gzipped participant payload of a quiz at `version`, rendered on the first request only.
+    """
+    key = _cache_key(quiz_id, version)
+    payload = cache.get(key)
+    if payload is None:
+        # A quiz opening at its start time is requested by every participant at once, render it once
+        with _building(key):
+            payload = cache.get(key)
+            if payload is None:
+                payload, timeout = render_participant_payload(quiz_id)
+                cache.set(key, payload, timeout)
+    return payload
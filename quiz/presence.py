@@ -0,0 +1,92 @@
+"""
+Which users have a notification socket open, so messages only go over the channel layer to users
+who can receive them.
+
+Each open `InvitationConsumer` is a member of its user's sorted set, scored with the time it expires:
+PRESENCE_TTL seconds after its last heartbeat. Several tabs are several members, and the entries of
+sockets whose server went away expire on their own. The default backend keeps the sets in Redis,
+`InMemoryPresence` keeps the same interface in process memory for tests and single-process
+development. Select the backend with the `PRESENCE_BACKEND` setting.
+"""
+import logging
+import threading
+import time
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_TTL = getattr(settings, "PRESENCE_TTL", 60)
+
+
+class RedisPresence:
+    def __init__(self, url: str = ""):
+        self.redis = redis.Redis.from_url(url or settings.REDIS_URL, decode_responses=True)
+
+    @staticmethod
+    def key(user_id) -> str:
+        return f"presence:{user_id}"
+
+    def add(self, user_id, channel_name: str) -> None:
+        """
+        Register a socket, or extend its registration by PRESENCE_TTL seconds.
+        """
+        now = time.time()
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.key(user_id), "-inf", now)
+            pipe.zadd(self.key(user_id), {channel_name: now + PRESENCE_TTL})
+            pipe.expire(self.key(user_id), PRESENCE_TTL)
+            pipe.execute()
+
+    def remove(self, user_id, channel_name: str) -> None:
+        self.redis.zrem(self.key(user_id), channel_name)
+
+    def online(self, user_ids) -> set:
+        """
+        The users of `user_ids` with a socket open. Everybody is offline when Redis cannot tell.
+        """
+        user_ids = list(user_ids)
+        now = time.time()
+        try:
+            with self.redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.zcount(self.key(user_id), now, "+inf")
+                counts = pipe.execute()
+        except redis.RedisError:
+            logger.exception("Could not look up presence, treating %d users as offline", len(user_ids))
+            return set()
+        return {user_id for user_id, count in zip(user_ids, counts) if count}
+
+
+class InMemoryPresence:
+    def __init__(self):
+        self.entries: dict[str, dict[str, float]] = {}
+        self.lock = threading.Lock()
+
+    def add(self, user_id, channel_name: str) -> None:
+        with self.lock:
+            self.entries.setdefault(str(user_id), {})[channel_name] = time.time() + PRESENCE_TTL
+
+    def remove(self, user_id, channel_name: str) -> None:
+        with self.lock:
+            self.entries.get(str(user_id), {}).pop(channel_name, None)
+
+    def online(self, user_ids) -> set:
+        now = time.time()
+        with self.lock:
+            return {
+                user_id for user_id in user_ids
+                if any(expires > now for expires in self.entries.get(str(user_id), {}).values())
+            }
+
+
+@lru_cache
+def _presence(backend: str):
+    return import_string(backend)()
+
+
+def get_presence():
+    return _presence(getattr(settings, "PRESENCE_BACKEND", "quiz.presence.RedisPresence"))
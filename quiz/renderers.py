@@ -0,0 +1,86 @@
+import csv
+import io
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from rest_framework.fields import DateTimeField
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from . import codec
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Compact JSON through the shared codec. Indented output (e.g. for the browsable API) is left
+    to DRF's renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        rendered = codec.dumps(data)
+        # Keep the output a strict javascript subset, as DRF does
+        if b"\xe2\x80\xa8" in rendered or b"\xe2\x80\xa9" in rendered:
+            rendered = rendered.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return rendered
+
+
+class StreamingRenderer(BaseRenderer, ABC):
+    """
+    Renders rows, tuples of values of `columns`, a chunk at a time for streamed responses.
+    `render` takes a dict or a list of dicts, like error details. Timestamps are formatted as the
+    serializers of the JSON responses format them (`DATETIME_FORMAT`, current time zone).
+    """
+    charset = "utf-8"
+    datetime_field = DateTimeField()
+
+    def format_rows(self, rows: list[tuple]) -> list[tuple]:
+        to_representation = self.datetime_field.to_representation
+        return [tuple(to_representation(value) if isinstance(value, datetime) else value for value in row)
+                for row in rows]
+
+    def render_header(self, columns: list[str]) -> bytes:
+        return b""
+
+    @abstractmethod
+    def render_rows(self, columns: list[str], rows: list[tuple]) -> bytes:
+        """
+        The rows of a chunk, rendered.
+        """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        columns = list(rows[0]) if rows else []
+        return self.render_header(columns) + self.render_rows(columns, [tuple(row.values()) for row in rows])
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def _write(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def render_header(self, columns: list[str]) -> bytes:
+        return self._write([columns])
+
+    def render_rows(self, columns: list[str], rows: list[tuple]) -> bytes:
+        return self._write(self.format_rows(rows))
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """
+    One compact JSON object per line.
+    """
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render_rows(self, columns: list[str], rows: list[tuple]) -> bytes:
+        return b"".join(codec.dumps(dict(zip(columns, row))) + b"\n" for row in self.format_rows(rows))
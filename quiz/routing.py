@@ -3,4 +3,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r"ws/invitations/$", consumers.InvitationConsumer.as_asgi()),
+    re_path(r"ws/quizzes/(?P<quiz_id>[0-9a-f-]{36})/leaderboard/$", consumers.LeaderboardConsumer.as_asgi()),
+    re_path(r"ws/quizzes/(?P<quiz_id>[0-9a-f-]{36})/live/$", consumers.LiveQuizConsumer.as_asgi()),
 ]
@@ -0,0 +1,151 @@
+"""
+Deadline scheduler moving quizzes through their lifecycle at their start and end times.
+
+Scheduled quizzes open at their `start_time` and open quizzes close at their `end_time`. The
+scheduler keeps the deadlines of the next SCHEDULER_HORIZON seconds in a min-heap, loaded from
+the partial indexes on those columns, and sleeps until the earliest one. The heap is reloaded
+every SCHEDULER_RELOAD_INTERVAL seconds to pick up quizzes created or moved in the meantime.
+
+When deadlines pass, every quiz that is due moves at once: one UPDATE opens quizzes, one closes
+them, and one statement each expires the attempts in progress and the pending invitations of the
+closed quizzes. Each quiz that changed gets a `quiz_status` event on its group once the
+transaction commits. Submissions that beat the scheduler to an expired attempt are still turned
+down, see `AttemptSubmissionSerializer`.
+"""
+import heapq
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .leaderboard import group_name
+from .models import Invitation, Quiz
+from .notifications import GroupMessage, send_to_groups
+from .stats import expire_attempts
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_HORIZON = getattr(settings, "SCHEDULER_HORIZON", 3600)
+SCHEDULER_RELOAD_INTERVAL = getattr(settings, "SCHEDULER_RELOAD_INTERVAL", 60)
+
+OPEN_SQL = f"""
+    UPDATE {Quiz._meta.db_table}
+    SET status = {Quiz.ACTIVE}, modified_at = %(now)s
+    WHERE status = {Quiz.SCHEDULED}
+        AND (start_time IS NULL OR start_time <= %(now)s)
+        AND (end_time IS NULL OR end_time > %(now)s)
+    RETURNING id
+"""
+
+CLOSE_SQL = f"""
+    UPDATE {Quiz._meta.db_table}
+    SET status = {Quiz.CLOSED}, modified_at = %(now)s
+    WHERE status IN ({Quiz.SCHEDULED}, {Quiz.ACTIVE}) AND end_time <= %(now)s
+    RETURNING id
+"""
+
+
+class Deadline(NamedTuple):
+    at: datetime
+    quiz_id: uuid.UUID
+
+
+class DeadlineResult(NamedTuple):
+    opened: list[uuid.UUID]
+    closed: list[uuid.UUID]
+    expired_attempts: int
+    expired_invitations: int
+
+
+def apply_deadlines(now: datetime | None = None) -> DeadlineResult:
+    """
+    Open and close every quiz whose start or end time has passed, and expire the attempts and
+    invitations of the closed ones.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(OPEN_SQL, {"now": now})
+            opened = [row[0] for row in cursor.fetchall()]
+            cursor.execute(CLOSE_SQL, {"now": now})
+            closed = [row[0] for row in cursor.fetchall()]
+
+        expired_attempts = expired_invitations = 0
+        if closed:
+            expired_attempts = expire_attempts(closed, now)
+            expired_invitations = Invitation.objects.filter(
+                quiz_id__in=closed, status=Invitation.PENDING
+            ).update(status=Invitation.EXPIRED, modified_at=now)
+
+        send_to_groups([
+            GroupMessage(group_name(quiz_id), {"type": "quiz_status", "quiz_id": str(quiz_id), "status": status})
+            for status, quiz_ids in ((Quiz.ACTIVE, opened), (Quiz.CLOSED, closed))
+            for quiz_id in quiz_ids
+        ])
+
+    result = DeadlineResult(opened, closed, expired_attempts, expired_invitations)
+    if opened or closed:
+        logger.info(
+            "Opened %d quizzes, closed %d, expired %d attempts and %d invitations",
+            len(opened), len(closed), expired_attempts, expired_invitations,
+        )
+    return result
+
+
+class DeadlineScheduler:
+    def __init__(self, horizon: float = SCHEDULER_HORIZON, reload_interval: float = SCHEDULER_RELOAD_INTERVAL):
+        self.horizon = timedelta(seconds=horizon)
+        self.reload_interval = timedelta(seconds=reload_interval)
+        self.deadlines: list[Deadline] = []
+        self.reload_at: datetime | None = None
+
+    def load(self, now: datetime) -> None:
+        """
+        Replace the heap with the deadlines up to the horizon, including the overdue ones.
+        """
+        until = now + self.horizon
+        starts = Quiz.objects.filter(
+            Q(start_time__isnull=True) | Q(start_time__lte=until), status=Quiz.SCHEDULED
+        ).values_list("start_time", "pk")
+        ends = Quiz.objects.filter(
+            status__in=[Quiz.SCHEDULED, Quiz.ACTIVE], end_time__lte=until
+        ).values_list("end_time", "pk")
+        self.deadlines = [Deadline(at or now, quiz_id) for at, quiz_id in [*starts, *ends]]
+        heapq.heapify(self.deadlines)
+        self.reload_at = now + self.reload_interval
+
+    def run_due(self, now: datetime | None = None) -> DeadlineResult | None:
+        """
+        Apply the deadlines that have passed, if any.
+        """
+        now = now or timezone.now()
+        if self.reload_at is None or now >= self.reload_at:
+            self.load(now)
+        due = False
+        while self.deadlines and self.deadlines[0].at <= now:
+            heapq.heappop(self.deadlines)
+            due = True
+        # Quizzes due at the same time, or moved since the heap was loaded, all go in one pass
+        return apply_deadlines(now) if due else None
+
+    def seconds_until_next(self, now: datetime) -> float:
+        wake_at = min(self.deadlines[0].at, self.reload_at) if self.deadlines else self.reload_at
+        return max(0.0, (wake_at - now).total_seconds())
+
+    def run(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            # Like the end of a request, drop a connection that broke or outlived CONN_MAX_AGE
+            close_old_connections()
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception("Applying quiz deadlines failed, retrying after the next reload")
+                self.deadlines = []
+                self.reload_at = timezone.now() + self.reload_interval
+            stop.wait(self.seconds_until_next(timezone.now()))
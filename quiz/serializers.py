@@ -1,13 +1,22 @@
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
+import uuid
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
 from django.utils import timezone
 from rest_framework import serializers
 
 from . import models
+from .answer_log import append_answers, apply_pending_answers, write_behind
+from .grading import get_answer_key, submit_answers
+from .notifications import invitation_message, notify_users
+from .stats import item_analytics, score_stddev
 
 QuizUserModel = get_user_model()
 
+BULK_INVITATION_LIMIT = getattr(settings, "BULK_INVITATION_LIMIT", 10000)
+
 
 class UserSerializer(serializers.ModelSerializer):
 
@@ -54,7 +63,7 @@ class QuizSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.Quiz
-        fields = "__all__"
+        exclude = ["question_count", "points_total", "content_version"]
 
     def create(self, validated_data):
         validated_data["owner"] = self.context["request"].user
@@ -86,26 +95,84 @@ class QuizDetailSerializer(serializers.ModelSerializer):
         depth = 2
 
 
+class ChoiceSerializer(serializers.ModelSerializer):
+    """Choice as shown to participants, without the answer"""
+
+    class Meta:
+        model = models.Choice
+        fields = ["id", "text", "order"]
+
+
+class ParticipantQuestionSerializer(QuestionSerializer):
+    """Question as shown to participants"""
+
+    choices = ChoiceSerializer(many=True, read_only=True)
+
+
+class ParticipantQuizDetailSerializer(QuizDetailSerializer):
+    """Quiz as shown to participants, see `payloads.participant_payload`"""
+
+    questions = ParticipantQuestionSerializer(many=True, read_only=True)
+
+
 class QuizProgressSerializer(serializers.ModelSerializer):
     """
-
+    Quiz statistics, read from the `stats_*` annotations added by `stats.with_stats`
     """
     total_questions = serializers.ReadOnlyField()
     total_attempts = serializers.SerializerMethodField()
     average_score = serializers.SerializerMethodField()
+    lowest_score = serializers.ReadOnlyField(source="stats_min_score")
+    highest_score = serializers.ReadOnlyField(source="stats_max_score")
+    score_stddev = serializers.SerializerMethodField()
+    participant_stats = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Quiz
-        fields = ["id", "total_attempts", "total_questions", "average_score", "participant_stats"]
+        fields = [
+            "id",
+            "total_attempts",
+            "total_questions",
+            "average_score",
+            "lowest_score",
+            "highest_score",
+            "score_stddev",
+            "participant_stats",
+        ]
 
     def get_total_attempts(self, obj: models.Quiz) -> int:
-        return obj.attempts.count()
+        return obj.stats_in_progress_attempts + obj.stats_completed_attempts + obj.stats_expired_attempts
 
     def get_average_score(self, obj: models.Quiz) -> float:
-        attempts = obj.attempts.filter(status=models.Attempt.COMPLETED)
-        if not attempts:
+        if not obj.stats_completed_attempts or not obj.max_score:
             return 0.0
-        return round(sum(a.percentage_score or 0 for a in attempts) / len(attempts), 2)
+        return round(obj.stats_score_sum / obj.stats_completed_attempts / obj.max_score * 100, 2)
+
+    def get_score_stddev(self, obj: models.Quiz) -> float:
+        return round(score_stddev(obj.stats_completed_attempts, obj.stats_score_sum, obj.stats_score_squares_sum), 2)
+
+    def get_participant_stats(self, obj: models.Quiz) -> list[dict]:
+        counts = [
+            (models.Attempt.IN_PROGRESS, obj.stats_in_progress_attempts),
+            (models.Attempt.COMPLETED, obj.stats_completed_attempts),
+            (models.Attempt.EXPIRED, obj.stats_expired_attempts),
+        ]
+        return [{"status": status, "count": count} for status, count in counts if count]
+
+
+class QuestionAnalyticsSerializer(serializers.ModelSerializer):
+    """
+    Item analytics of every question of a quiz, from the incrementally maintained counters
+    """
+    completed_attempts = serializers.ReadOnlyField(source="stats_completed_attempts")
+    questions = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.Quiz
+        fields = ["id", "completed_attempts", "questions"]
+
+    def get_questions(self, obj: models.Quiz) -> list[dict]:
+        return item_analytics(obj)
 
 
 class AttemptProgressSerializer(serializers.ModelSerializer):
@@ -114,12 +181,18 @@ class AttemptProgressSerializer(serializers.ModelSerializer):
     """
     score = serializers.ReadOnlyField()
     percentage_score = serializers.ReadOnlyField()
-    answered_questions_count = serializers.ReadOnlyField()
+    # Annotated by `views.with_answered_count`
+    answered_questions_count = serializers.IntegerField(source="answered_count", read_only=True)
 
     class Meta:
         model = models.Attempt
         fields = ["id", "score", "percentage_score", "answered_questions_count"]
 
+    def to_representation(self, instance):
+        if write_behind():
+            apply_pending_answers(instance)
+        return super().to_representation(instance)
+
 
 class AttemptSerializer(serializers.ModelSerializer):
     """
@@ -133,6 +206,31 @@ class AttemptSerializer(serializers.ModelSerializer):
         fields = ["id", "quiz", "participant", "score"]
 
 
+class DashboardAttemptSerializer(serializers.ModelSerializer):
+    """
+    A playable quiz with the participant's own attempt, read from `ParticipantDashboard`'s annotations
+    """
+    quiz = QuizSerializer(read_only=True)
+    total_questions = serializers.IntegerField(source="quiz.question_count", read_only=True)
+    max_score = serializers.ReadOnlyField()
+    percentage_score = serializers.ReadOnlyField()
+    answered_questions_count = serializers.IntegerField(source="answered_count", read_only=True)
+
+    class Meta:
+        model = models.Attempt
+        fields = [
+            "id",
+            "quiz",
+            "status",
+            "score",
+            "max_score",
+            "percentage_score",
+            "answered_questions_count",
+            "total_questions",
+            "completed_at",
+        ]
+
+
 class AnswerSerializer(serializers.ModelSerializer):
     """
     Serialize an answer for submission
@@ -143,25 +241,34 @@ class AnswerSerializer(serializers.ModelSerializer):
         fields = ["id", "attempt", "question", "selected_choice"]
 
     def validate(self, attrs):
-        if attrs["attempt"].quiz != attrs["question"].quiz:
+        answer_key = get_answer_key(attrs["attempt"].quiz_id)
+        if attrs["question"].pk not in answer_key.questions:
             raise serializers.ValidationError("This question is not part of this quiz")
-        if attrs["selected_choice"].question != attrs["question"]:
+        if not answer_key.is_valid(attrs["question"].pk, attrs["selected_choice"].pk):
             raise serializers.ValidationError("This is not a valid answer")
         return attrs
 
-    def create(self, validated_data):
-        answer = super().create(validated_data)
-        if answer.selected_choice.is_correct:
-            answer.attempt.score += answer.question.points
-            answer.attempt.save()
+
+class SubmittedAnswerSerializer(serializers.ModelSerializer):
+    """
+    An answer within a batch submission. Related objects are referenced by id only, the whole
+    batch is checked against the quiz's answer key by the submission serializer.
+    """
+    attempt = serializers.UUIDField(source="attempt_id", required=False)
+    question = serializers.IntegerField(source="question_id")
+    selected_choice = serializers.IntegerField(source="selected_choice_id")
+
+    class Meta:
+        model = models.Answer
+        fields = ["id", "attempt", "question", "selected_choice"]
 
 
 class AttemptSubmissionSerializer(serializers.ModelSerializer):
     """
-    This is not the best way to do this. My mind hit a blank. Sorry!
+    Submit a batch of answers for an attempt
     """
     quiz = QuizDetailSerializer(read_only=True)
-    answers = AnswerSerializer(many=True)
+    answers = SubmittedAnswerSerializer(many=True)
     participant = UserSerializer(read_only=True)
 
     class Meta:
@@ -170,25 +277,43 @@ class AttemptSubmissionSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "quiz", "participant", "status"]
         depth = 2
 
+    def validate_answers(self, answers):
+        answer_key = get_answer_key(self.instance.quiz_id)
+        for answer in answers:
+            if answer.get("attempt_id", self.instance.pk) != self.instance.pk:
+                raise serializers.ValidationError("This answer belongs to another attempt")
+            if answer["question_id"] not in answer_key.questions:
+                raise serializers.ValidationError("This question is not part of this quiz")
+            if not answer_key.is_valid(answer["question_id"], answer["selected_choice_id"]):
+                raise serializers.ValidationError("This is not a valid answer")
+        return answers
+
     def update(self, instance: models.Attempt, validated_data):
         if instance.status == models.Attempt.COMPLETED:
             raise serializers.ValidationError("This quiz has already been completed!")
-        if instance.quiz.end_time and instance.quiz.end_time <= timezone.now():
-            validated_data["status"] = models.Attempt.EXPIRED
-            instance = super().update(instance, validated_data)
+        if instance.status == models.Attempt.IN_PROGRESS and instance.quiz.end_time \
+                and instance.quiz.end_time <= timezone.now():
+            instance.status = models.Attempt.EXPIRED
+            instance.save(update_fields=["status", "modified_at"])
         if instance.status == models.Attempt.EXPIRED:
             raise serializers.ValidationError("This quiz is no longer accepting submissions!")
 
-        answers = validated_data.pop("answers")
-        for answer in answers:
-            if not answer.get("id"):
-                ans = AnswerSerializer(**answer)
-                ans.save()
-        if len(answers) == instance.quiz.total_questions:
-            validated_data["completed_at"] = timezone.now()
-            validated_data["status"] = models.Attempt.COMPLETED
-
-        return super().update(instance, validated_data)
+        answers = [(a["question_id"], a["selected_choice_id"]) for a in validated_data.pop("answers")]
+        if write_behind():
+            append_answers(instance, answers)
+        else:
+            submit_answers(instance, answers)
+        return instance
+
+    def to_representation(self, instance):
+        pending = apply_pending_answers(instance) if write_behind() else {}
+        data = super().to_representation(instance)
+        # Not written yet, so without an id
+        data["answers"].extend(
+            {"id": None, "attempt": str(instance.pk), "question": question_id, "selected_choice": answer.choice_id}
+            for question_id, answer in pending.items()
+        )
+        return data
 
 
 class InvitationCreationSerializer(serializers.ModelSerializer):
@@ -208,34 +333,91 @@ class InvitationCreationSerializer(serializers.ModelSerializer):
         validated_data["invited_by"] = self.context["request"].user
         invitation = super().create(validated_data)
 
-        # Send WebSocket notification
-        channel_layer = get_channel_layer()
-        participant_id = validated_data["participant"].id
-
-        # Get quiz title for the notification
-        quiz_title = invitation.quiz.title
-        inviter_name = invitation.invited_by.get_full_name() or invitation.invited_by.username
-
-        # Prepare the message
-        message = {
-            "type": "invitation",
-            "invitation_id": str(invitation.id),
-            "quiz_id": str(invitation.quiz.id),
-            "quiz_title": quiz_title,
-            "inviter": inviter_name,
-            "message": f"You have been invited to take the quiz: {quiz_title} by {inviter_name}"
-        }
+        # Send WebSocket notification to the participant's group
+        notify_users([(invitation.participant_id, invitation_message(invitation, invitation.quiz, invitation.invited_by))])
+
+        return invitation
 
-        # Send to the participant's group
-        async_to_sync(channel_layer.group_send)(
-            f"user_{participant_id}",
-            {
-                "type": "invitation_message",
-                "content": message
-            }
+
+class BulkInvitationSerializer(serializers.Serializer):
+    """
+    Serializer for inviting many participants at once, by user id or email.
+    Participants who are unknown or already invited are reported as skipped.
+    """
+    participants = serializers.ListField(
+        child=serializers.CharField(max_length=254), allow_empty=False, max_length=BULK_INVITATION_LIMIT, write_only=True
+    )
+
+    def create(self, validated_data):
+        quiz = validated_data["quiz"]
+        inviter = self.context["request"].user
+        requested = validated_data["participants"]
+
+        # Resolve every participant and whether they are invited already in one query
+        ids, emails = set(), set()
+        for value in requested:
+            try:
+                ids.add(uuid.UUID(value))
+            except ValueError:
+                emails.add(value)
+        users = {}
+        invited = set()
+        rows = QuizUserModel.objects.filter(Q(pk__in=ids) | Q(email__in=emails)).annotate(
+            invited=Exists(models.Invitation.objects.filter(quiz=quiz, participant=OuterRef("pk")))
+        ).values_list("pk", "email", "invited")
+        for pk, email, is_invited in rows:
+            users[str(pk)] = users[email] = pk
+            if is_invited:
+                invited.add(pk)
+
+        invitations, requested_as, skipped = [], {}, []
+        for value in requested:
+            try:
+                participant_id = users.get(str(uuid.UUID(value)))
+            except ValueError:
+                participant_id = users.get(value)
+            if participant_id is None:
+                skipped.append({"participant": value, "reason": "unknown_user"})
+            elif participant_id in invited:
+                skipped.append({"participant": value, "reason": "already_invited"})
+            else:
+                invited.add(participant_id)
+                invitation = models.Invitation(quiz=quiz, participant_id=participant_id, invited_by=inviter)
+                invitations.append(invitation)
+                requested_as[invitation.pk] = value
+
+        with transaction.atomic():
+            models.Invitation.objects.bulk_create(invitations, ignore_conflicts=True)
+            # Invitations created concurrently for the same participants were ignored, not inserted
+            inserted = set(
+                models.Invitation.objects.filter(pk__in=[i.pk for i in invitations]).values_list("pk", flat=True)
+            )
+            created = [invitation for invitation in invitations if invitation.pk in inserted]
+            notify_users([(i.participant_id, invitation_message(i, quiz, inviter)) for i in created])
+
+        skipped.extend(
+            {"participant": requested_as[i.pk], "reason": "already_invited"}
+            for i in invitations if i.pk not in inserted
         )
+        return {
+            "created": [{"id": i.pk, "participant": i.participant_id} for i in created],
+            "skipped": skipped,
+        }
 
-        return invitation
+    def to_representation(self, instance):
+        return instance
+
+
+class InvitationSerializer(serializers.ModelSerializer):
+    """
+    Serializer for listing received invitations
+    """
+    quiz = QuizSerializer(read_only=True)
+    invited_by = UserSerializer(read_only=True)
+
+    class Meta:
+        model = models.Invitation
+        fields = ["id", "quiz", "invited_by", "status", "created_at", "responded_at"]
 
 
 class InvitationResponseSerializer(serializers.ModelSerializer):
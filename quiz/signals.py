@@ -1,9 +1,43 @@
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db.models.signals import post_save, pre_save
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
-from .models import Answer, Attempt, Invitation
+from .authentication import invalidate_tokens
+
+from .grading import get_answer_key, invalidate_answer_key, schedule_regrade
+from .leaderboard import rebuild_leaderboard, record_score
+from .models import Answer, Attempt, Choice, Invitation, Question, Quiz
+from .notifications import invitation_response_message, notify_users
+from .stats import record_answers, record_attempt_change, record_attempt_deleted, record_late_answer
+from .transactions import on_commit_once
+
+
+def _invalidate_tokens(*keys: str) -> None:
+    # Again on commit, a request may have cached the old state in the meantime
+    invalidate_tokens(*keys)
+    transaction.on_commit(lambda: invalidate_tokens(*keys))
+
+
+@receiver(post_delete, sender=Token)
+def handle_token_deleted(sender, instance, **kwargs) -> None:
+    _invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def handle_user_saved(sender, instance, created, update_fields=None, **kwargs) -> None:
+    """
+    Cached users must not outlive a deactivation or any other change, except the last_login
+    stamp written on every login.
+    """
+    if created or update_fields == frozenset(["last_login"]):
+        return
+    keys = list(Token.objects.filter(user=instance).values_list("key", flat=True))
+    if keys:
+        _invalidate_tokens(*keys)
 
 
 @receiver(post_save, sender=Invitation)
@@ -12,31 +46,10 @@ def handle_invitation_status_change(sender, instance, created, **kwargs) -> None
     If an invitation is accepted create an attempt.
     """
     if not created and instance.status != Invitation.PENDING:
-        # Invitation status has changed, notify the inviter
-        channel_layer = get_channel_layer()
-        inviter_id = instance.invited_by.id
-
+        # Invitation status has changed, notify the inviter once the change commits
         status_text = dict(Invitation.STATUS_CHOICES)[instance.status]
-
-        # Prepare the message
-        message = {
-            "type": "invitation_response",
-            "invitation_id": str(instance.id),
-            "quiz_id": str(instance.quiz.id),
-            "quiz_title": instance.quiz.title,
-            "participant": instance.participant.get_full_name() or instance.participant.username,
-            "status": status_text,
-            "message": f"{instance.participant.get_full_name() or instance.participant.username} has {status_text.lower()} your invitation to {instance.quiz.title}"
-        }
-
-        # Send to the inviter's group
-        async_to_sync(channel_layer.group_send)(
-            f"user_{inviter_id}",
-            {
-                "type": "invitation_message",
-                "content": message
-            }
-        )
+        message = invitation_response_message(instance, instance.quiz, instance.participant, status_text)
+        notify_users([(instance.invited_by_id, message)])
 
         # If accepted, create an attempt
         if instance.status == Invitation.ACCEPTED:
@@ -50,6 +63,104 @@ def handle_invitation_status_change(sender, instance, created, **kwargs) -> None
 @receiver(post_save, sender=Answer)
 def handle_assigning_score(sender, instance, created, **kwargs) -> None:
     if instance and created:
-        if instance.selected_choice.is_correct:
-            instance.attempt.score += instance.question.points
-            instance.attempt.save()
+        answer_key = get_answer_key(instance.attempt.quiz_id)
+        points = answer_key.points_for(instance.question_id, instance.selected_choice_id)
+        if points:
+            Attempt.objects.filter(pk=instance.attempt_id).update(score=F("score") + points)
+            instance.attempt.score += points
+            instance.attempt.remember_loaded_values("score")
+            record_score(instance.attempt.quiz_id, instance.attempt.participant_id, points)
+
+        if instance.attempt.status == Attempt.COMPLETED:
+            # Late answer to a finished attempt, its score is already part of the statistics
+            record_late_answer(instance.attempt, instance.question_id, instance.selected_choice_id, points)
+        else:
+            record_answers(instance.attempt_id, [(instance.question_id, instance.selected_choice_id)])
+
+
+@receiver(post_save, sender=Attempt)
+def handle_attempt_saved(sender, instance, created, **kwargs) -> None:
+    """
+    Feed status and score transitions into the quiz statistics.
+    """
+    if created:
+        record_attempt_change(instance)
+        record_score(instance.quiz_id, instance.participant_id, instance.score)
+    else:
+        record_attempt_change(instance, instance.loaded_value("status"), instance.loaded_value("score"))
+    instance.remember_loaded_values("status", "score")
+
+
+@receiver(post_delete, sender=Attempt)
+def handle_attempt_deleted(sender, instance, **kwargs) -> None:
+    record_attempt_deleted(instance)
+    quiz_id = instance.quiz_id
+    on_commit_once(("leaderboard", quiz_id), lambda: rebuild_leaderboard(quiz_id))
+
+
+def _update_quiz_totals(question: Question, quiz_id, questions: int, points: int) -> None:
+    Quiz.objects.filter(pk=quiz_id).update(
+        question_count=F("question_count") + questions,
+        points_total=F("points_total") + points,
+    )
+    if Question.quiz.is_cached(question) and question.quiz.pk == quiz_id:
+        question.quiz.refresh_from_db(fields=["question_count", "points_total"])
+
+
+def _bump_content_version(quiz_id) -> None:
+    # Participants' cached quiz payloads and conditional GETs are keyed on these, see payloads.py
+    Quiz.objects.filter(pk=quiz_id).update(content_version=F("content_version") + 1, modified_at=timezone.now())
+
+
+@receiver(post_save, sender=Question)
+def handle_question_saved(sender, instance, created, **kwargs) -> None:
+    """
+    Keep the quiz's question count and maximum score in step with its questions.
+    """
+    old_quiz_id = instance.loaded_value("quiz_id")
+    old_points = instance.loaded_value("points")
+
+    if created:
+        _update_quiz_totals(instance, instance.quiz_id, 1, instance.points)
+    elif old_quiz_id != instance.quiz_id:
+        _update_quiz_totals(instance, old_quiz_id, -1, -old_points)
+        _update_quiz_totals(instance, instance.quiz_id, 1, instance.points)
+        invalidate_answer_key(old_quiz_id)
+        _bump_content_version(old_quiz_id)
+        schedule_regrade(old_quiz_id)
+        schedule_regrade(instance.quiz_id)
+    elif old_points != instance.points:
+        _update_quiz_totals(instance, instance.quiz_id, 0, instance.points - old_points)
+        schedule_regrade(instance.quiz_id)
+
+    instance.remember_loaded_values("quiz_id", "points")
+    # Questions carry the points, so any change makes the quiz's answer key stale
+    invalidate_answer_key(instance.quiz_id)
+    _bump_content_version(instance.quiz_id)
+
+
+@receiver(post_delete, sender=Question)
+def handle_question_deleted(sender, instance, **kwargs) -> None:
+    _update_quiz_totals(instance, instance.quiz_id, -1, -instance.points)
+    invalidate_answer_key(instance.quiz_id)
+    _bump_content_version(instance.quiz_id)
+    # Answers to the question are gone with it
+    schedule_regrade(instance.quiz_id)
+
+
+@receiver(post_save, sender=Choice)
+def handle_choice_saved(sender, instance, created, **kwargs) -> None:
+    quiz_id = instance.question.quiz_id
+    invalidate_answer_key(quiz_id)
+    _bump_content_version(quiz_id)
+    if not created and instance.loaded_value("is_correct") != instance.is_correct:
+        schedule_regrade(quiz_id)
+    instance.remember_loaded_values("is_correct")
+
+
+@receiver(post_delete, sender=Choice)
+def handle_choice_deleted(sender, instance, **kwargs) -> None:
+    quiz_id = instance.question.quiz_id
+    invalidate_answer_key(quiz_id)
+    _bump_content_version(quiz_id)
+    schedule_regrade(quiz_id)
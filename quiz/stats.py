@@ -0,0 +1,438 @@
+"""
+Incrementally maintained per-quiz attempt statistics and per-question item analytics.
+
+Every attempt transition is turned into a delta and upserted into one of the quiz's
+`QuizStats` shard rows, picked from the attempt id. Reads sum the shards of a quiz, which
+`with_stats` does as part of the query loading the quiz itself. Recorded answers and
+completed attempts feed the `ChoiceStats` counters in the same way.
+
+Removing a completed score cannot be applied to a running min/max, so those (rare)
+transitions rebuild the quiz's statistics from its attempts instead.
+
+Every statement recording a delta holds the quiz's advisory lock shared until its transaction
+ends, a rebuild holds it exclusively: a rebuild never reads an attempt change without the delta
+recorded for it, or the other way round.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import IntegerField, Max, Min, OuterRef, QuerySet, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Answer, Attempt, Choice, ChoiceStats, Question, Quiz, QuizStats
+from .transactions import on_commit_once
+
+QUIZ_STATS_SHARDS = getattr(settings, "QUIZ_STATS_SHARDS", 8)
+
+
+def _lock_key(quiz_id: str) -> str:
+    return f"hashtextextended('quiz_stats:' || {quiz_id}::text, 0)"
+
+
+UPSERT_SQL = f"""
+    WITH locked AS (SELECT pg_advisory_xact_lock_shared({_lock_key("%s")}))
+    INSERT INTO {QuizStats._meta.db_table} AS stats (
+        quiz_id, shard, in_progress_attempts, completed_attempts, expired_attempts,
+        score_sum, score_squares_sum, min_score, max_score
+    )
+    SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s
+    FROM locked
+    WHERE EXISTS (SELECT 1 FROM {Quiz._meta.db_table} WHERE id = %s)
+    ON CONFLICT (quiz_id, shard) DO UPDATE SET
+        in_progress_attempts = stats.in_progress_attempts + EXCLUDED.in_progress_attempts,
+        completed_attempts = stats.completed_attempts + EXCLUDED.completed_attempts,
+        expired_attempts = stats.expired_attempts + EXCLUDED.expired_attempts,
+        score_sum = stats.score_sum + EXCLUDED.score_sum,
+        score_squares_sum = stats.score_squares_sum + EXCLUDED.score_squares_sum,
+        min_score = LEAST(stats.min_score, EXCLUDED.min_score),
+        max_score = GREATEST(stats.max_score, EXCLUDED.max_score)
+"""
+
+REBUILD_SQL = f"""
+    INSERT INTO {QuizStats._meta.db_table} (
+        quiz_id, shard, in_progress_attempts, completed_attempts, expired_attempts,
+        score_sum, score_squares_sum, min_score, max_score
+    )
+    SELECT
+        quiz_id, 0,
+        COUNT(*) FILTER (WHERE status = {Attempt.IN_PROGRESS}),
+        COUNT(*) FILTER (WHERE status = {Attempt.COMPLETED}),
+        COUNT(*) FILTER (WHERE status = {Attempt.EXPIRED}),
+        COALESCE(SUM(score) FILTER (WHERE status = {Attempt.COMPLETED}), 0),
+        COALESCE(SUM(score::bigint * score) FILTER (WHERE status = {Attempt.COMPLETED}), 0),
+        MIN(score) FILTER (WHERE status = {Attempt.COMPLETED}),
+        MAX(score) FILTER (WHERE status = {Attempt.COMPLETED})
+    FROM {Attempt._meta.db_table}
+    WHERE quiz_id = %s
+    GROUP BY quiz_id
+    ON CONFLICT (quiz_id, shard) DO UPDATE SET
+        in_progress_attempts = EXCLUDED.in_progress_attempts,
+        completed_attempts = EXCLUDED.completed_attempts,
+        expired_attempts = EXCLUDED.expired_attempts,
+        score_sum = EXCLUDED.score_sum,
+        score_squares_sum = EXCLUDED.score_squares_sum,
+        min_score = EXCLUDED.min_score,
+        max_score = EXCLUDED.max_score
+"""
+
+# Counted on shard 0, reads sum the shards
+EXPIRE_ATTEMPTS_SQL = f"""
+    WITH locked AS (
+        SELECT pg_advisory_xact_lock_shared({_lock_key("quiz_id")}) FROM unnest(%s::uuid[]) AS quiz_id
+    ), expired AS (
+        UPDATE {Attempt._meta.db_table}
+        SET status = {Attempt.EXPIRED}, modified_at = %s
+        WHERE quiz_id = ANY(%s) AND status = {Attempt.IN_PROGRESS}
+        RETURNING quiz_id
+    ), counted AS (
+        INSERT INTO {QuizStats._meta.db_table} AS stats (
+            quiz_id, shard, in_progress_attempts, completed_attempts, expired_attempts,
+            score_sum, score_squares_sum, min_score, max_score
+        )
+        SELECT quiz_id, 0, -COUNT(*), 0, COUNT(*), 0, 0, NULL, NULL
+        FROM expired
+        WHERE (SELECT COUNT(*) FROM locked) >= 0
+        GROUP BY quiz_id
+        ON CONFLICT (quiz_id, shard) DO UPDATE SET
+            in_progress_attempts = stats.in_progress_attempts + EXCLUDED.in_progress_attempts,
+            expired_attempts = stats.expired_attempts + EXCLUDED.expired_attempts
+    )
+    SELECT COUNT(*) FROM expired
+"""
+
+CHOICE_UPSERT_SQL = f"""
+    WITH locked AS (
+        SELECT pg_advisory_xact_lock_shared({_lock_key("quiz_id")})
+        FROM {Question._meta.db_table}
+        WHERE id = ANY(%s::bigint[])
+        GROUP BY quiz_id
+    )
+    INSERT INTO {ChoiceStats._meta.db_table} AS stats (
+        choice_id, question_id, shard, answer_count, completed_answer_count, completed_score_sum
+    )
+    SELECT * FROM (VALUES {{values}}) AS counts
+    WHERE (SELECT COUNT(*) FROM locked) > 0
+    ON CONFLICT (choice_id, shard) DO UPDATE SET
+        answer_count = stats.answer_count + EXCLUDED.answer_count,
+        completed_answer_count = stats.completed_answer_count + EXCLUDED.completed_answer_count,
+        completed_score_sum = stats.completed_score_sum + EXCLUDED.completed_score_sum
+"""
+
+COMPLETED_ANSWERS_SQL = f"""
+    INSERT INTO {ChoiceStats._meta.db_table} AS stats (
+        choice_id, question_id, shard, answer_count, completed_answer_count, completed_score_sum
+    )
+    SELECT selected_choice_id, question_id, %s, 0, 1, %s
+    FROM {Answer._meta.db_table}
+    WHERE attempt_id = %s
+    ON CONFLICT (choice_id, shard) DO UPDATE SET
+        completed_answer_count = stats.completed_answer_count + 1,
+        completed_score_sum = stats.completed_score_sum + EXCLUDED.completed_score_sum
+"""
+
+# Attempts of any number of quizzes moved from in progress to completed, per quiz and shard
+COMPLETED_BATCH_SQL = f"""
+    WITH locked AS (
+        SELECT pg_advisory_xact_lock_shared({_lock_key("quiz_id")})
+        FROM (SELECT DISTINCT quiz_id FROM unnest(%(quiz_ids)s::uuid[]) AS quiz_id) AS quizzes
+    )
+    INSERT INTO {QuizStats._meta.db_table} AS stats (
+        quiz_id, shard, in_progress_attempts, completed_attempts, expired_attempts,
+        score_sum, score_squares_sum, min_score, max_score
+    )
+    SELECT quiz_id, shard, -COUNT(*), COUNT(*), 0, SUM(score), SUM(score::bigint * score), MIN(score), MAX(score)
+    FROM unnest(%(quiz_ids)s::uuid[], %(shards)s::int[], %(scores)s::int[]) AS completed(quiz_id, shard, score)
+    WHERE (SELECT COUNT(*) FROM locked) > 0
+    GROUP BY quiz_id, shard
+    ON CONFLICT (quiz_id, shard) DO UPDATE SET
+        in_progress_attempts = stats.in_progress_attempts + EXCLUDED.in_progress_attempts,
+        completed_attempts = stats.completed_attempts + EXCLUDED.completed_attempts,
+        score_sum = stats.score_sum + EXCLUDED.score_sum,
+        score_squares_sum = stats.score_squares_sum + EXCLUDED.score_squares_sum,
+        min_score = LEAST(stats.min_score, EXCLUDED.min_score),
+        max_score = GREATEST(stats.max_score, EXCLUDED.max_score)
+"""
+
+COMPLETED_ANSWERS_BATCH_SQL = f"""
+    INSERT INTO {ChoiceStats._meta.db_table} AS stats (
+        choice_id, question_id, shard, answer_count, completed_answer_count, completed_score_sum
+    )
+    SELECT answer.selected_choice_id, answer.question_id, completed.shard, 0, COUNT(*), SUM(completed.score)
+    FROM unnest(%(attempt_ids)s::uuid[], %(shards)s::int[], %(scores)s::int[]) AS completed(attempt_id, shard, score)
+    JOIN {Answer._meta.db_table} answer ON answer.attempt_id = completed.attempt_id
+    GROUP BY answer.selected_choice_id, answer.question_id, completed.shard
+    ON CONFLICT (choice_id, shard) DO UPDATE SET
+        completed_answer_count = stats.completed_answer_count + EXCLUDED.completed_answer_count,
+        completed_score_sum = stats.completed_score_sum + EXCLUDED.completed_score_sum
+"""
+
+# The late answer is counted as answered and completed, the attempt's other answers gain its points
+LATE_ANSWER_SQL = f"""
+    WITH locked AS (SELECT pg_advisory_xact_lock_shared({_lock_key("%s")}))
+    INSERT INTO {ChoiceStats._meta.db_table} AS stats (
+        choice_id, question_id, shard, answer_count, completed_answer_count, completed_score_sum
+    )
+    SELECT
+        selected_choice_id, question_id, %s,
+        (question_id = %s)::int, (question_id = %s)::int,
+        CASE WHEN question_id = %s THEN %s ELSE %s END
+    FROM {Answer._meta.db_table}
+    WHERE attempt_id = %s AND (question_id = %s OR %s <> 0) AND (SELECT COUNT(*) FROM locked) > 0
+    ON CONFLICT (choice_id, shard) DO UPDATE SET
+        answer_count = stats.answer_count + EXCLUDED.answer_count,
+        completed_answer_count = stats.completed_answer_count + EXCLUDED.completed_answer_count,
+        completed_score_sum = stats.completed_score_sum + EXCLUDED.completed_score_sum
+"""
+
+CHOICE_REBUILD_SQL = f"""
+    INSERT INTO {ChoiceStats._meta.db_table} (
+        choice_id, question_id, shard, answer_count, completed_answer_count, completed_score_sum
+    )
+    SELECT
+        c.id, c.question_id, 0,
+        COUNT(ans.id),
+        COUNT(ans.id) FILTER (WHERE a.status = {Attempt.COMPLETED}),
+        COALESCE(SUM(a.score) FILTER (WHERE a.status = {Attempt.COMPLETED}), 0)
+    FROM {Choice._meta.db_table} c
+    JOIN {Question._meta.db_table} q ON q.id = c.question_id
+    LEFT JOIN {Answer._meta.db_table} ans ON ans.selected_choice_id = c.id
+    LEFT JOIN {Attempt._meta.db_table} a ON a.id = ans.attempt_id
+    WHERE q.quiz_id = %s
+    GROUP BY c.id, c.question_id
+    ON CONFLICT (choice_id, shard) DO UPDATE SET
+        answer_count = EXCLUDED.answer_count,
+        completed_answer_count = EXCLUDED.completed_answer_count,
+        completed_score_sum = EXCLUDED.completed_score_sum
+"""
+
+
+def shard_for(attempt_id) -> int:
+    return attempt_id.int % QUIZ_STATS_SHARDS
+
+
+def _upsert(quiz_id, attempt_id, counts: dict, score: int | None, old_score: int | None = None) -> None:
+    if score is None:
+        completed_score = [0, 0, None, None]
+    elif old_score is None:
+        completed_score = [score, score * score, score, score]
+    else:
+        # A completed score raised from old_score, which may have been the minimum
+        completed_score = [score - old_score, score * score - old_score * old_score, None, score]
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL, [
+            quiz_id,
+            quiz_id,
+            shard_for(attempt_id),
+            counts.get(Attempt.IN_PROGRESS, 0),
+            counts.get(Attempt.COMPLETED, 0),
+            counts.get(Attempt.EXPIRED, 0),
+            *completed_score,
+            quiz_id,
+        ])
+
+
+def rebuild_quiz_stats(quiz_id) -> None:
+    """
+    Recompute a quiz's statistics and item analytics from its attempts into single shard rows.
+    """
+    with transaction.atomic():
+        # Waits for the transactions recording deltas of the quiz, and holds off new ones
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT pg_advisory_xact_lock({_lock_key('%s')})", [quiz_id])
+        QuizStats.objects.filter(quiz_id=quiz_id).delete()
+        ChoiceStats.objects.filter(question__quiz_id=quiz_id).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SQL, [quiz_id])
+            cursor.execute(CHOICE_REBUILD_SQL, [quiz_id])
+
+
+def record_answers(attempt_id, answers: list[tuple[int, int]]) -> None:
+    """
+    Count newly recorded (question id, choice id) answers of an attempt, in one statement.
+    """
+    record_answer_batch([(attempt_id, question_id, choice_id) for question_id, choice_id in answers])
+
+
+def record_answer_batch(answers: list[tuple]) -> None:
+    """
+    Count newly recorded (attempt id, question id, choice id) answers of any number of attempts,
+    in one statement.
+    """
+    if not answers:
+        return
+    # A statement may only update each counter row once
+    counts = Counter((choice_id, question_id, shard_for(attempt_id)) for attempt_id, question_id, choice_id in answers)
+    values = []
+    for (choice_id, question_id, shard), count in counts.items():
+        values.extend([choice_id, question_id, shard, count, 0, 0])
+    placeholders = ", ".join(["(%s::bigint, %s::bigint, %s::int, %s::int, %s::int, %s::bigint)"] * len(counts))
+    question_ids = list({question_id for _, question_id, _ in counts})
+    with connection.cursor() as cursor:
+        cursor.execute(CHOICE_UPSERT_SQL.format(values=placeholders), [question_ids, *values])
+
+
+def _record_completed_answers(attempt: Attempt) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(COMPLETED_ANSWERS_SQL, [shard_for(attempt.pk), attempt.score, attempt.pk])
+
+
+def record_attempt_change(attempt: Attempt, old_status: int | None = None, old_score: int = 0) -> None:
+    """
+    Apply an attempt's move from (old_status, old_score) to its current status and score.
+    A new attempt has no old status.
+    """
+    if old_status == Attempt.COMPLETED:
+        if attempt.status != Attempt.COMPLETED or attempt.score != old_score:
+            rebuild_quiz_stats(attempt.quiz_id)
+        return
+    if old_status == attempt.status:
+        return
+
+    counts = {attempt.status: 1}
+    if old_status is not None:
+        counts[old_status] = -1
+    score = attempt.score if attempt.status == Attempt.COMPLETED else None
+    _upsert(attempt.quiz_id, attempt.pk, counts, score)
+    if attempt.status == Attempt.COMPLETED:
+        _record_completed_answers(attempt)
+
+
+def record_completed_batch(completed: list[tuple]) -> None:
+    """
+    Apply the moves of (attempt id, quiz id, score) attempts from in progress to completed with
+    their score, and count their answers as completed, in two statements whatever their number.
+    """
+    if not completed:
+        return
+    params = {
+        "attempt_ids": [attempt_id for attempt_id, _, _ in completed],
+        "quiz_ids": [quiz_id for _, quiz_id, _ in completed],
+        "shards": [shard_for(attempt_id) for attempt_id, _, _ in completed],
+        "scores": [score for _, _, score in completed],
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(COMPLETED_BATCH_SQL, params)
+        cursor.execute(COMPLETED_ANSWERS_BATCH_SQL, params)
+
+
+def record_late_answer(attempt: Attempt, question_id: int, choice_id: int, points: int) -> None:
+    """
+    Count an answer recorded after its attempt completed, the attempt's score already raised by
+    its points.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(LATE_ANSWER_SQL, [
+            attempt.quiz_id, shard_for(attempt.pk), question_id, question_id,
+            question_id, attempt.score, points, attempt.pk, question_id, points,
+        ])
+    if not points:
+        return
+    old_score = attempt.score - points
+    _upsert(attempt.quiz_id, attempt.pk, {}, attempt.score, old_score)
+    if not QuizStats.objects.filter(quiz_id=attempt.quiz_id, min_score__lt=old_score).exists():
+        # The old score may have been the lowest, which only a rebuild can tell
+        quiz_id = attempt.quiz_id
+        on_commit_once(("quiz_stats", quiz_id), lambda: rebuild_quiz_stats(quiz_id))
+
+
+def expire_attempts(quiz_ids: list, now) -> int:
+    """
+    Expire the attempts in progress of the quizzes and move them between the counters, in one
+    statement. Returns how many expired.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(EXPIRE_ATTEMPTS_SQL, [quiz_ids, now, quiz_ids])
+        return cursor.fetchone()[0]
+
+
+def record_attempt_deleted(attempt: Attempt) -> None:
+    """
+    Rebuild the statistics once the deletion commits, by which time a cascading quiz deletion
+    has removed the quiz and its statistics as well. The attempt's answers are gone too, which
+    only a rebuild can take out of the choice counters. A quiz is rebuilt once per transaction,
+    however many of its attempts it deletes.
+    """
+    quiz_id = attempt.quiz_id
+    on_commit_once(("quiz_stats", quiz_id), lambda: rebuild_quiz_stats(quiz_id))
+
+
+def with_stats(queryset: QuerySet) -> QuerySet:
+    """
+    Annotate quizzes with their statistics summed over the shards, as `stats_<column>`.
+    """
+    shards = QuizStats.objects.filter(quiz=OuterRef("pk")).order_by().values("quiz")
+    aggregates = {
+        "in_progress_attempts": Sum, "completed_attempts": Sum, "expired_attempts": Sum,
+        "score_sum": Sum, "score_squares_sum": Sum, "min_score": Min, "max_score": Max,
+    }
+    annotations = {}
+    for column, function in aggregates.items():
+        subquery = Subquery(shards.annotate(value=function(column)).values("value"), output_field=IntegerField())
+        annotations[f"stats_{column}"] = subquery if function is not Sum else Coalesce(subquery, 0)
+    return queryset.annotate(**annotations)
+
+
+def score_stddev(completed: int, score_sum: int, score_squares_sum: int) -> float:
+    if not completed:
+        return 0.0
+    mean = score_sum / completed
+    return math.sqrt(max(score_squares_sum / completed - mean * mean, 0.0))
+
+
+def item_analytics(quiz: Quiz) -> list[dict]:
+    """
+    Difficulty, discrimination and choice distribution of every question of a quiz.
+
+    The quiz must be annotated by `with_stats` and have its questions and choices prefetched.
+    The p-value is the share of answers that are correct. Discrimination is the point-biserial
+    correlation between answering correctly and the attempt's total score, over completed
+    attempts.
+    """
+    counters = {
+        row["choice_id"]: row
+        for row in ChoiceStats.objects.filter(question__quiz=quiz).values("choice_id").annotate(
+            answers=Sum("answer_count"),
+            completed=Sum("completed_answer_count"),
+            score_sum=Sum("completed_score_sum"),
+        )
+    }
+    empty = {"answers": 0, "completed": 0, "score_sum": 0}
+    stddev = score_stddev(quiz.stats_completed_attempts, quiz.stats_score_sum, quiz.stats_score_squares_sum)
+
+    analytics = []
+    for question in quiz.questions.all():
+        choices = [(choice, counters.get(choice.pk, empty)) for choice in question.choices.all()]
+        answers = sum(counts["answers"] for _, counts in choices)
+        correct = next((counts for choice, counts in choices if choice.is_correct), empty)
+        completed = sum(counts["completed"] for _, counts in choices)
+        score_sum = sum(counts["score_sum"] for _, counts in choices)
+
+        discrimination = None
+        right, wrong = correct["completed"], completed - correct["completed"]
+        if right and wrong and stddev:
+            right_mean = correct["score_sum"] / right
+            wrong_mean = (score_sum - correct["score_sum"]) / wrong
+            share = right / completed
+            discrimination = round((right_mean - wrong_mean) / stddev * math.sqrt(share * (1 - share)), 3)
+
+        analytics.append({
+            "id": question.pk,
+            "text": question.text,
+            "order": question.order,
+            "answer_count": answers,
+            "p_value": round(correct["answers"] / answers, 3) if answers else None,
+            "discrimination": discrimination,
+            "choices": [
+                {
+                    "id": choice.pk,
+                    "text": choice.text,
+                    "is_correct": choice.is_correct,
+                    "count": counts["answers"],
+                    "share": round(counts["answers"] / answers, 3) if answers else 0.0,
+                }
+                for choice, counts in choices
+            ],
+        })
+    return analytics
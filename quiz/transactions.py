@@ -0,0 +1,26 @@
+"""
+Work deferred until the current transaction commits, run once however many changes within the
+transaction asked for it.
+"""
+from typing import Callable, Hashable
+
+from django.db import connection, transaction
+
+
+def on_commit_once(key: Hashable, func: Callable[[], None]) -> None:
+    """
+    Run `func` once the current transaction commits, unless a callback was scheduled under the
+    same key in the transaction already: the first one to run takes the key and runs, the rest
+    find it gone. Keys left by a rolled back transaction are taken by the next callback for them.
+    """
+    scheduled = getattr(connection, "quiz_on_commit_keys", None)
+    if scheduled is None:
+        scheduled = connection.quiz_on_commit_keys = set()
+    scheduled.add(key)
+
+    def run_once():
+        if key in scheduled:
+            scheduled.discard(key)
+            func()
+
+    transaction.on_commit(run_once)
@@ -1,17 +1,34 @@
 from django.urls import path
 
+from .async_views import ASYNC_READ_VIEWS, AsyncAttemptProgress, AsyncListPlayableQuiz, AsyncQuizDetail, \
+    AsyncQuizProgress
 from .views import CreateInvitation, ListAddQuestion, ListAddQuiz, QuizDetail, RespondInvitation, ListAttempt, \
-    SubmitAttempt, ListPlayableQuiz, QuizProgress, AttemptProgress
+    SubmitAttempt, ListPlayableQuiz, QuizProgress, AttemptProgress, QuestionAnalytics, QuizLeaderboard, \
+    QuizLeaderboardRank, BulkCreateInvitation, ListInvitation, ParticipantDashboard, ExportQuiz
+
+if ASYNC_READ_VIEWS:
+    # Async GET, other methods still go to the DRF views
+    ListPlayableQuiz, QuizDetail, QuizProgress, AttemptProgress = (
+        AsyncListPlayableQuiz, AsyncQuizDetail, AsyncQuizProgress, AsyncAttemptProgress
+    )
 
 urlpatterns = [
     path("quizzes/creator/", ListAddQuiz.as_view(), name="owned_quizzes"),
     path("quizzes/creator/<uuid:pk>/", QuizDetail.as_view(), name="quiz_detail"),
     path("quizzes/creator/<uuid:pk>/questions/", ListAddQuestion.as_view(), name="quiz_questions"),
+    path("quizzes/creator/<uuid:pk>/questions/analytics/", QuestionAnalytics.as_view(),
+         name="quiz_question_analytics"),
     path("quizzes/creator/<uuid:pk>/progress/", QuizProgress.as_view(), name="quiz_progress"),
+    path("quizzes/creator/<uuid:pk>/export/", ExportQuiz.as_view(), name="quiz_export"),
     path("quizzes/creator/<uuid:pk>/invite/", CreateInvitation.as_view(), name="quiz_invitation"),
+    path("quizzes/creator/<uuid:pk>/invite/bulk/", BulkCreateInvitation.as_view(), name="quiz_bulk_invitation"),
+    path("quizzes/invitations/", ListInvitation.as_view(), name="list_invitations"),
     path("quizzes/invitations/<uuid:pk>/", RespondInvitation.as_view(), name="quiz_invitation_response"),
     path("quizzes/", ListPlayableQuiz.as_view(), name="list_playable_quizzes"),
+    path("quizzes/dashboard/", ParticipantDashboard.as_view(), name="participant_dashboard"),
     path("quizzes/<uuid:pk>/", QuizDetail.as_view(), name="view_playable_quizzes"),
+    path("quizzes/<uuid:pk>/leaderboard/", QuizLeaderboard.as_view(), name="quiz_leaderboard"),
+    path("quizzes/<uuid:pk>/leaderboard/me/", QuizLeaderboardRank.as_view(), name="quiz_leaderboard_rank"),
     path("quizzes/attempts/", ListAttempt.as_view(), name="quiz_attempt_creation"),
     path("quizzes/attempts/<uuid:pk>/", SubmitAttempt.as_view(), name="quiz_attempt_submission"),
     path("quizzes/attempts/<uuid:pk>/progress/", AttemptProgress.as_view(), name="quiz_attempt_progress"),
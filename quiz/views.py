@@ -1,12 +1,29 @@
-from rest_framework import generics
+import gzip
 
-from .models import Invitation, Question, Quiz, Attempt
+from django.db.models import Count, Exists, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import generics
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+
+from .answer_log import get_answer_log, write_behind
+from .conditional import ConditionalGetMixin
+from .export import stream_export
+from .leaderboard import LEADERBOARD_SIZE, get_leaderboard, leaderboard_snapshot
+from .models import Answer, Invitation, Question, Quiz, Attempt
+from .pagination import KeysetPagination
+from .payloads import participant_payload, payload_version
 from .permissions import IsQuizOwner, IsInvitee
+from .renderers import CSVRenderer, NDJSONRenderer
 from .serializers import (
     InvitationCreationSerializer, QuestionSerializer, QuizSerializer, QuizDetailSerializer,
     InvitationResponseSerializer, AttemptSerializer, AttemptSubmissionSerializer,
-    QuizProgressSerializer, AttemptProgressSerializer
+    QuizProgressSerializer, AttemptProgressSerializer, QuestionAnalyticsSerializer, BulkInvitationSerializer, \
+    InvitationSerializer, DashboardAttemptSerializer
 )
+from .stats import with_stats
 
 ############################
 # User views
@@ -19,46 +36,151 @@ from .serializers import (
 # Quiz views
 ############################
 
-class ListAddQuiz(generics.ListCreateAPIView):
+QUIZ_STATUS_FILTERS = {"draft": Quiz.DRAFT, "scheduled": Quiz.SCHEDULED, "active": Quiz.ACTIVE, "closed": Quiz.CLOSED}
+
+
+def filter_quiz_status(queryset, request):
+    """
+    `?status=active` (or draft, scheduled, closed) lists the quizzes in that status only, as kept
+    up to date by the scheduler
+    """
+    status = QUIZ_STATUS_FILTERS.get(request.query_params.get("status"))
+    return queryset if status is None else queryset.filter(status=status)
+
+
+class ListAddQuiz(ConditionalGetMixin, generics.ListCreateAPIView):
     """
 
     """
     serializer_class = QuizSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsQuizOwner]
 
     def get_queryset(self):
-        queryset = Quiz.objects.filter(owner=self.request.user)
-        return queryset
+        queryset = Quiz.objects.select_related("owner").filter(owner=self.request.user)
+        return filter_quiz_status(queryset, self.request)
+
+
+def with_answered_count(queryset):
+    """
+    Annotate attempts with their number of answers as `answered_count`, counted per attempt
+    """
+    answered = Answer.objects.filter(attempt=OuterRef("pk")).order_by().values("attempt").annotate(
+        count=Count("pk")
+    ).values("count")
+    return queryset.annotate(answered_count=Coalesce(Subquery(answered, output_field=IntegerField()), Value(0)))
+
+
+class PendingAnswersMixin:
+    """
+    Attempt views showing the participant their answers still in the write-behind log too. The
+    pending answers are part of the validators, a cached response never hides them.
+    """
+
+    def make_validators(self):
+        pending = {}
+        if write_behind() and self.validator_values["modified_at"] is not None:
+            pending = get_answer_log().pending(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        self.validator_values["pending"] = sorted(pending.items())
+        self.validator_values["pending_at"] = max((answer.answered_at for answer in pending.values()), default=None)
+        return super().make_validators()
 
 
-class ListPlayableQuiz(generics.ListAPIView):
+def playable_quizzes(user):
+    """
+    Quizzes the user has an attempt at, once each however many attempts there are
+    """
+    return Quiz.objects.filter(Exists(Attempt.objects.filter(quiz=OuterRef("pk"), participant=user)))
+
+
+class ListPlayableQuiz(ConditionalGetMixin, generics.ListAPIView):
     """
 
     """
     serializer_class = QuizSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Quiz.objects.prefetch_related("attempts__participant").filter(attempts__participant=self.request.user)
+        return filter_quiz_status(playable_quizzes(self.request.user).select_related("owner"), self.request)
 
 
-class QuizDetail(generics.RetrieveUpdateAPIView):
+class QuizDetail(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     """
 
     """
     serializer_class = QuizDetailSerializer
+    # Question and choice changes bump both
+    validators = {"modified_at": Max("modified_at"), "content_version": Max("content_version")}
+    stamped_validators = ["content_version"]
 
     def get_queryset(self):
         if "creator" in self.request.path:
-            return Quiz.objects.filter(owner=self.request.user)
+            return Quiz.objects.select_related("owner").prefetch_related("questions__choices").filter(
+                owner=self.request.user
+            )
         else:
-            return Quiz.objects.prefetch_related("attempts__participant").filter(attempts__participant=self.request.user)
+            return playable_quizzes(self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        if "creator" in request.path:
+            return super().retrieve(request, *args, **kwargs)
+
+        # Participants get the shared pre-rendered payload, the validator query checked access and version
+        if self.validator_values["modified_at"] is None:
+            raise NotFound()
+        version = payload_version(self.validator_values["content_version"], self.validator_values["modified_at"])
+        return payload_response(request, participant_payload(kwargs["pk"], version))
+
 
+def payload_response(request, payload: bytes) -> HttpResponse:
+    """
+    Response with a gzipped JSON payload, inflated for clients that do not accept gzip
+    """
+    if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+        response = HttpResponse(payload, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(payload), content_type="application/json")
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+class ParticipantDashboard(ConditionalGetMixin, generics.ListAPIView):
+    """
+    The user's playable quizzes with the status, score and answered count of their own attempt.
 
-class ListAddQuestion(generics.ListCreateAPIView):
+    Reads the user's attempts rather than the quizzes, so a page is one query whatever the
+    number of attempts other participants made: the answers are counted per attempt of the page.
+    """
+    serializer_class = DashboardAttemptSerializer
+    pagination_class = KeysetPagination
+    validators = {
+        "modified_at": Max("modified_at"),
+        "quiz_modified_at": Max("quiz__modified_at"),
+        "count": Count("pk", distinct=True),
+        "score": Sum("score"),
+        "answered_at": Max("answers__answered_at"),
+        "answers": Count("answers"),
+    }
+    modified_validators = ["modified_at", "quiz_modified_at", "answered_at"]
+
+    def get_validator_queryset(self):
+        return Attempt.objects.filter(participant=self.request.user)
+
+    def get_queryset(self):
+        return with_answered_count(Attempt.objects.select_related("quiz__owner").filter(participant=self.request.user))
+
+
+class ListAddQuestion(ConditionalGetMixin, generics.ListCreateAPIView):
     """
     Creation and listing of questions
     """
     serializer_class = QuestionSerializer
+    # Questions have no timestamps, their changes bump the quiz's
+    validators = {"modified_at": Max("modified_at")}
+
+    def get_validator_queryset(self):
+        return Quiz.objects.filter(pk=self.kwargs["pk"])
 
     def get_queryset(self):
         quiz_id = self.kwargs["pk"]
@@ -68,52 +190,177 @@ class ListAddQuestion(generics.ListCreateAPIView):
 
 
 # Take quiz
-class ListAttempt(generics.ListAPIView):
+class ListAttempt(ConditionalGetMixin, generics.ListAPIView):
     """
     This actually shows the available attempt so the user can access it
     """
     serializer_class = AttemptSerializer
+    pagination_class = KeysetPagination
+    # Scores are updated without touching modified_at
+    validators = {
+        "modified_at": Max("modified_at"),
+        "quiz_modified_at": Max("quiz__modified_at"),
+        "count": Count("pk"),
+        "score": Sum("score"),
+    }
+    modified_validators = ["modified_at", "quiz_modified_at"]
 
     def get_queryset(self):
-        queryset = Attempt.objects.filter(participant=self.request.user)
+        queryset = Attempt.objects.select_related("quiz__owner", "participant").filter(
+            participant=self.request.user
+        )
 
         return queryset
 
 
-class SubmitAttempt(generics.RetrieveUpdateAPIView):
+class SubmitAttempt(PendingAnswersMixin, ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     """
-    Submit answers for a quiz. This is not my best work.
+    Submit answers for a quiz in a single batch.
     """
     serializer_class = AttemptSubmissionSerializer
+    validators = {
+        "modified_at": Max("modified_at"),
+        "quiz_modified_at": Max("quiz__modified_at"),
+        "answered_at": Max("answers__answered_at"),
+        "answers": Count("answers"),
+    }
+    modified_validators = ["modified_at", "quiz_modified_at", "answered_at", "pending_at"]
 
     def get_queryset(self):
-        queryset = Attempt.objects.filter(participant=self.request.user)
+        queryset = Attempt.objects.select_related("quiz__owner", "participant").prefetch_related(
+            "quiz__questions__choices"
+        ).filter(participant=self.request.user)
 
         return queryset
 
 
 # Quiz stats
-class QuizProgress(generics.RetrieveAPIView):
+class QuizProgress(ConditionalGetMixin, generics.RetrieveAPIView):
     """
     See statistics for an individual quiz
     """
-    queryset = Quiz.objects.all()
+    queryset = with_stats(Quiz.objects.select_related("owner"))
     serializer_class = QuizProgressSerializer
     permission_classes = [IsQuizOwner]
+    # The statistics rows have no timestamps, their counters are the version
+    validators = {
+        "modified_at": Max("modified_at"),
+        **{column: Sum(f"stats__{column}") for column in (
+            "in_progress_attempts", "completed_attempts", "expired_attempts", "score_sum", "score_squares_sum"
+        )},
+    }
+
+    def get_validator_queryset(self):
+        # Only the owner may be told the statistics did not change
+        return Quiz.objects.filter(pk=self.kwargs["pk"], owner=self.request.user)
+
+
+class ExportQuiz(generics.GenericAPIView):
+    """
+    Stream a quiz's attempts with their participants and answers, as CSV or NDJSON (`?format=`)
+    """
+    queryset = Quiz.objects.all()
+    permission_classes = [IsQuizOwner]
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    def get(self, request, *args, **kwargs):
+        quiz = self.get_object()
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(stream_export(quiz.pk, renderer), content_type=renderer.media_type)
+        response["Content-Disposition"] = f'attachment; filename="quiz-{quiz.pk}.{renderer.format}"'
+        return response
+
+
+class QuestionAnalytics(ConditionalGetMixin, generics.RetrieveAPIView):
+    """
+    Difficulty, discrimination and choice distribution of each question of a quiz
+    """
+    queryset = with_stats(Quiz.objects.select_related("owner").prefetch_related("questions__choices"))
+    serializer_class = QuestionAnalyticsSerializer
+    permission_classes = [IsQuizOwner]
+    validators = {
+        "modified_at": Max("modified_at"),
+        **{column: Sum(f"questions__choice_stats__{column}") for column in (
+            "answer_count", "completed_answer_count", "completed_score_sum"
+        )},
+        # Completed attempts and discrimination follow the quiz's statistics, summed over their
+        # shards by subqueries so the choice rows do not multiply them
+        **{column: Max(f"stats_{column}") for column in (
+            "in_progress_attempts", "completed_attempts", "expired_attempts", "score_sum", "score_squares_sum"
+        )},
+    }
+
+    def get_validator_queryset(self):
+        return with_stats(Quiz.objects.filter(pk=self.kwargs["pk"], owner=self.request.user))
+
+
+# Leaderboards
+class LeaderboardMixin:
+    """
+    Leaderboards are visible to the quiz owner and its participants
+    """
+
+    def get_queryset(self):
+        user = self.request.user
+        return Quiz.objects.filter(Q(owner=user) | Q(attempts__participant=user)).distinct()
+
+
+class QuizLeaderboard(LeaderboardMixin, generics.RetrieveAPIView):
+    """
+    Top participants of a quiz, `?limit=` sets how many (default LEADERBOARD_SIZE, at most 100)
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        quiz = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get("limit", LEADERBOARD_SIZE)), 1), 100)
+        except ValueError:
+            limit = LEADERBOARD_SIZE
+        return Response({
+            "quiz": quiz.pk,
+            "size": get_leaderboard().size(quiz.pk),
+            "results": leaderboard_snapshot(quiz.pk, limit),
+        })
+
+
+class QuizLeaderboardRank(LeaderboardMixin, generics.RetrieveAPIView):
+    """
+    Rank and score of the requesting participant
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        quiz = self.get_object()
+        leaderboard = get_leaderboard()
+        entry = leaderboard.rank(quiz.pk, request.user.pk)
+        if entry is None:
+            raise NotFound("You are not on this leaderboard.")
+        rank, score = entry
+        return Response({"quiz": quiz.pk, "rank": rank, "score": score, "size": leaderboard.size(quiz.pk)})
 
 
 # Attempt stats
-class AttemptProgress(generics.RetrieveAPIView):
+class AttemptProgress(PendingAnswersMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     """
     See the progress of an individual attempt
     """
     serializer_class = AttemptProgressSerializer
+    validators = {
+        "modified_at": Max("modified_at"),
+        "quiz_modified_at": Max("quiz__modified_at"),
+        "score": Max("score"),
+        "answered_at": Max("answers__answered_at"),
+        "answers": Count("answers"),
+    }
+    modified_validators = ["modified_at", "quiz_modified_at", "answered_at", "pending_at"]
 
     def get_queryset(self):
-        queryset = Attempt.objects.filter(participant=self.request.user)
+        queryset = with_answered_count(Attempt.objects.select_related("quiz").filter(participant=self.request.user))
 
         return queryset
 
+    def get_validator_queryset(self):
+        return Attempt.objects.filter(participant=self.request.user, pk=self.kwargs["pk"])
+
 
 # Send invitation
 class CreateInvitation(generics.CreateAPIView):
@@ -123,8 +370,37 @@ class CreateInvitation(generics.CreateAPIView):
     serializer_class = InvitationCreationSerializer
 
 
+class BulkCreateInvitation(generics.CreateAPIView):
+    """
+    Invite a list of participants, given as user ids or emails, with a single insert and one
+    batch of WebSocket notifications.
+    """
+    serializer_class = BulkInvitationSerializer
+    permission_classes = [IsQuizOwner]
+    queryset = Quiz.objects.select_related("owner")
+
+    def perform_create(self, serializer):
+        serializer.save(quiz=self.get_object())
+
+
+class ListInvitation(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Invitations received by the user, newest first. `?status=pending` lists the open ones only.
+    """
+    serializer_class = InvitationSerializer
+    pagination_class = KeysetPagination
+    validators = {"modified_at": Max("modified_at"), "quiz_modified_at": Max("quiz__modified_at"), "count": Count("pk")}
+    modified_validators = ["modified_at", "quiz_modified_at"]
+
+    def get_queryset(self):
+        queryset = Invitation.objects.select_related("quiz__owner", "invited_by").filter(participant=self.request.user)
+        if self.request.query_params.get("status") == "pending":
+            queryset = queryset.filter(status=Invitation.PENDING)
+        return queryset
+
+
 # Respond to invitation
-class RespondInvitation(generics.RetrieveUpdateAPIView):
+class RespondInvitation(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     """
     View for invitation responses as a fallback should channels not work
     """
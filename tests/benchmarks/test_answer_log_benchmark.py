@@ -0,0 +1,69 @@
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from quiz.answer_log import append_answers, flush_answer_log, get_answer_log
+from quiz.grading import submit_answers
+from quiz.models import Answer, Attempt, Choice, Question, Quiz
+
+User = get_user_model()
+
+pytestmark = [pytest.mark.django_db, pytest.mark.benchmark]
+
+PARTICIPANTS = 2000
+QUESTIONS = 5
+# Submissions of the baseline, written one transaction each
+BASELINE_SUBMISSIONS = 1000
+
+
+def test_write_behind_submissions(settings):
+    """
+    Every participant submits one answer at a time, written straight away or logged and flushed
+    to the database in batches.
+    """
+    settings.ANSWER_LOG_BACKEND = "quiz.answer_log.RedisAnswerLog"
+    owner = User.objects.create(username="log_owner", email="log_owner@test.com")
+    quiz = Quiz.objects.create(owner=owner, title="Write-behind", status=Quiz.ACTIVE)
+    answers = []
+    for order in range(QUESTIONS):
+        question = Question.objects.create(quiz=quiz, text=f"Question {order}", order=order)
+        choices = Choice.objects.bulk_create(Choice(question=question, text=f"Choice {index}", order=index,
+                                                    is_correct=index == 0) for index in range(4))
+        answers.append((question.pk, choices[0].pk))
+    users = User.objects.bulk_create(
+        User(username=f"logged{index}", email=f"logged{index}@test.com") for index in range(PARTICIPANTS)
+    )
+    attempts = Attempt.objects.bulk_create(Attempt(quiz=quiz, participant=user) for user in users)
+    for attempt in attempts:
+        attempt.quiz = quiz
+    log = get_answer_log()
+    assert log.size() == 0
+
+    started = time.perf_counter()
+    for attempt in attempts[:BASELINE_SUBMISSIONS]:
+        submit_answers(attempt, answers[:1])
+    baseline = BASELINE_SUBMISSIONS / (time.perf_counter() - started)
+    Answer.objects.all().delete()
+    Attempt.objects.filter(quiz=quiz).update(status=Attempt.IN_PROGRESS, score=0)
+
+    started = time.perf_counter()
+    for answer in answers:
+        for attempt in attempts:
+            append_answers(attempt, [answer])
+    total = PARTICIPANTS * QUESTIONS
+    accepted = total / (time.perf_counter() - started)
+
+    flushes = 0
+    started = time.perf_counter()
+    while flush_answer_log().entries:
+        flushes += 1
+    written = total / (time.perf_counter() - started)
+
+    assert Answer.objects.filter(attempt__quiz=quiz).count() == total
+    assert not Attempt.objects.filter(quiz=quiz, status=Attempt.IN_PROGRESS).exists()
+    assert log.size() == 0
+
+    print(f"\n{PARTICIPANTS} participants, {QUESTIONS} questions: {accepted:.0f} submissions/s logged, "
+          f"{written:.0f} answers/s flushed in {flushes} batches; "
+          f"one transaction per submission: {baseline:.0f} submissions/s")
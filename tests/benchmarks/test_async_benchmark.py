@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import path
+from rest_framework.authtoken.models import Token
+
+from quiz.async_views import AsyncAttemptProgress, AsyncQuizDetail
+from quiz.models import Attempt, Choice, Question, Quiz
+from quiz.views import AttemptProgress, QuizDetail
+
+User = get_user_model()
+
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.benchmark, pytest.mark.urls(__name__)]
+
+CLIENTS = 1000
+QUESTIONS = 20
+# Every request in flight may hold a database connection, stay below Postgres' default 100
+IN_FLIGHT = 80
+
+urlpatterns = [
+    path("sync/quizzes/<uuid:pk>/", QuizDetail.as_view()),
+    path("async/quizzes/<uuid:pk>/", AsyncQuizDetail.as_view()),
+    path("sync/attempts/<uuid:pk>/progress/", AttemptProgress.as_view()),
+    path("async/attempts/<uuid:pk>/progress/", AsyncAttemptProgress.as_view()),
+]
+
+
+async def get(application, path: str, token: str) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"authorization", f"Token {token}".encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await application(scope, receive, send)
+    return status
+
+
+def test_concurrent_reads():
+    """
+    CLIENTS participants open the quiz and poll their progress at the same time.
+    """
+    owner = User.objects.create(username="bench_owner", email="bench_owner@test.com")
+    quiz = Quiz.objects.create(owner=owner, title="Opening", status=Quiz.ACTIVE)
+    for order in range(QUESTIONS):
+        question = Question.objects.create(quiz=quiz, text=f"Question {order}", order=order)
+        Choice.objects.bulk_create(Choice(question=question, text=f"Choice {index}", order=index,
+                                          is_correct=index == 0) for index in range(4))
+    users = User.objects.bulk_create(
+        User(username=f"client{index}", email=f"client{index}@test.com") for index in range(CLIENTS)
+    )
+    tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+    attempts = Attempt.objects.bulk_create(Attempt(quiz=quiz, participant=user) for user in users)
+    application = ASGIHandler()
+
+    def run(prefix: str) -> float:
+        requests = [
+            *(get(application, f"/{prefix}/quizzes/{quiz.id}/", token.key) for token in tokens),
+            *(get(application, f"/{prefix}/attempts/{attempt.id}/progress/", token.key)
+              for token, attempt in zip(tokens, attempts)),
+        ]
+
+        async def run_all():
+            # The clients all connect at once, the proxy in front lets IN_FLIGHT requests through
+            in_flight = asyncio.Semaphore(IN_FLIGHT)
+
+            async def proxied(request):
+                async with in_flight:
+                    return await request
+
+            return await asyncio.gather(*(proxied(request) for request in requests))
+
+        started = time.perf_counter()
+        statuses = asyncio.run(run_all())
+        elapsed = time.perf_counter() - started
+        assert set(statuses) == {200}, statuses
+        return elapsed
+
+    # Warm the token and payload caches for both
+    run("sync")
+    sync, async_ = run("sync"), run("async")
+    print(f"\n{CLIENTS * 2} concurrent reads, {IN_FLIGHT} in flight: sync {sync:.2f}s ({CLIENTS * 2 / sync:.0f} req/s), "
+          f"async {async_:.2f}s ({CLIENTS * 2 / async_:.0f} req/s)")
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from quiz.authentication import _users
+from quiz.middleware import get_user
+
+User = get_user_model()
+
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.benchmark]
+
+USERS = 500
+RECONNECTS = 10000
+
+
+@database_sync_to_async
+def uncached_user(key):
+    return Token.objects.select_related("user").get(key=key).user
+
+
+def test_reconnect_storm():
+    """
+    Every client reconnects at once after a deploy, RECONNECTS connects over USERS tokens.
+    """
+    users = User.objects.bulk_create(
+        User(username=f"storm{index}", email=f"storm{index}@test.com") for index in range(USERS)
+    )
+    tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+    keys = [token.key for token in tokens]
+    storm = [keys[index % USERS] for index in range(RECONNECTS)]
+
+    async def connect_all(resolve):
+        return await asyncio.gather(*(resolve(key) for key in storm))
+
+    def run(resolve):
+        queries = []
+        with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+            started = time.perf_counter()
+            async_to_sync(connect_all)(resolve)
+            return time.perf_counter() - started, len(queries)
+
+    uncached, uncached_queries = run(uncached_user)
+    _users.clear()
+    cached, cached_queries = run(get_user)
+    print(f"\n{RECONNECTS} connects: uncached {uncached:.2f}s / {uncached_queries} queries, "
+          f"cached {cached:.2f}s / {cached_queries} queries")
+    assert cached_queries <= USERS
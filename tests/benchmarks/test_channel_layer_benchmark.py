@@ -0,0 +1,119 @@
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+import pytest
+import redis
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+
+from quiz import consumers
+from quiz.consumers import InvitationConsumer
+
+pytestmark = pytest.mark.benchmark
+
+USERS = 10000
+DELIVERIES = 500
+# Handshakes and disconnects in flight at once
+CONCURRENCY = 500
+
+
+def host(address: str) -> dict:
+    return {"address": address, "max_connections": CONCURRENCY * 2, "socket_timeout": 15}
+
+
+def layers(redis_url: str) -> dict:
+    shards = [host(f"{redis_url}/1"), host(f"{redis_url}/2")]
+    return {
+        "core": ("core", [host(redis_url)]),
+        "core, 2 shards": ("core", shards),
+        "pubsub": ("pubsub", [host(redis_url)]),
+        "pubsub, 2 shards": ("pubsub", shards),
+        "memory": ("memory", None),
+    }
+
+
+def redis_commands(client) -> int:
+    return sum(stats["calls"] for stats in client.info("commandstats").values())
+
+
+async def bounded(calls) -> tuple[float, list]:
+    """
+    Run the calls, CONCURRENCY at a time like a server's handshakes; how long that took and their results.
+    """
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def call(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(call(coroutine) for coroutine in calls))
+    return time.perf_counter() - started, results
+
+
+async def connect(communicator) -> bool:
+    connected, _ = await communicator.connect(timeout=60)
+    # The inbox summary that follows the handshake
+    await communicator.receive_json_from(timeout=60)
+    return connected
+
+
+async def run_layer(settings, backend: str, hosts: list[str] | None, client) -> dict:
+    settings.CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": settings.CHANNEL_LAYER_BACKENDS[backend],
+            "CONFIG": {"hosts": hosts} if hosts else {},
+        },
+    }
+    channel_layer = get_channel_layer()
+    communicators = []
+    for user_id in range(USERS):
+        communicator = WebsocketCommunicator(InvitationConsumer.as_asgi(), "/ws/invitations/")
+        communicator.scope["user"] = SimpleNamespace(id=user_id, is_authenticated=True)
+        communicators.append(communicator)
+
+    commands = redis_commands(client)
+    connect_time, results = await bounded(connect(communicator) for communicator in communicators)
+    assert all(results)
+    connect_commands = redis_commands(client) - commands
+
+    latencies = []
+    for user_id in range(0, USERS, USERS // DELIVERIES):
+        started = time.perf_counter()
+        await channel_layer.group_send(f"user_{user_id}", {"type": "invitation_message", "content": {"id": user_id}})
+        assert await communicators[user_id].receive_json_from(timeout=10) == {"id": user_id}
+        latencies.append(time.perf_counter() - started)
+
+    commands = redis_commands(client)
+    disconnect, _ = await bounded(communicator.disconnect(timeout=60) for communicator in communicators)
+    disconnect_commands = redis_commands(client) - commands
+    await channel_layer.flush()
+
+    latencies.sort()
+    return {
+        "connect": connect_time / USERS * 1000,
+        "connect_commands": connect_commands / USERS if hosts else 0,
+        "disconnect": disconnect / USERS * 1000,
+        "disconnect_commands": disconnect_commands / USERS if hosts else 0,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def test_invitation_fan_out(settings, monkeypatch):
+    """
+    USERS sockets join their own group, then DELIVERIES of them get an invitation, one at a time.
+    """
+    # Only the layer's cost, the users have empty inboxes
+    monkeypatch.setattr(consumers, "inbox", lambda user_id, cursor: {"notifications": [], "cursor": cursor,
+                                                                      "more": False, "unread": 0})
+    client = redis.Redis.from_url(settings.REDIS_URL)
+    print(f"\n{USERS} users, per socket: connect ms (Redis commands), disconnect ms (Redis commands), "
+          f"delivery latency p50/p99 ms")
+    for name, (backend, hosts) in layers(settings.REDIS_URL).items():
+        result = asyncio.run(run_layer(settings, backend, hosts, client))
+        print(f"{name:>16}: connect {result['connect']:.3f} ({result['connect_commands']:.1f}), "
+              f"disconnect {result['disconnect']:.3f} ({result['disconnect_commands']:.1f}), "
+              f"delivery {result['p50']:.2f}/{result['p99']:.2f}")
@@ -0,0 +1,62 @@
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+
+from quiz.models import Attempt, Quiz
+from quiz.serializers import QuizSerializer
+
+User = get_user_model()
+
+pytestmark = [pytest.mark.django_db, pytest.mark.benchmark]
+
+QUIZZES = 20
+OTHER_ATTEMPTS = 100_000
+
+
+def test_dashboard_with_crowded_quizzes(authenticated_client):
+    """
+    The user's quizzes have OTHER_ATTEMPTS attempts from other participants between them.
+    """
+    client, user = authenticated_client
+    owner = User.objects.create(username="bench_owner", email="bench_owner@test.com")
+    quizzes = Quiz.objects.bulk_create(Quiz(owner=owner, title=f"Quiz {index}") for index in range(QUIZZES))
+    others = User.objects.bulk_create(
+        User(username=f"crowd{index}", email=f"crowd{index}@test.com") for index in range(OTHER_ATTEMPTS // QUIZZES)
+    )
+    Attempt.objects.bulk_create(
+        (Attempt(quiz=quiz, participant=other) for other in others for quiz in quizzes), batch_size=10000
+    )
+    Attempt.objects.bulk_create(Attempt(quiz=quiz, participant=user) for quiz in quizzes)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    def run(fetch):
+        queries = []
+        with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+            started = time.perf_counter()
+            fetch()
+            return time.perf_counter() - started, len(queries)
+
+    def join_and_prefetch():
+        # What ListPlayableQuiz used to run for a page
+        quizzes = Quiz.objects.select_related("owner").prefetch_related("attempts__participant").filter(
+            attempts__participant=user
+        )
+        return QuizSerializer(quizzes[:QUIZZES + 1], many=True).data
+
+    def dashboard():
+        response = client.get(reverse("participant_dashboard"), {"page_size": QUIZZES})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) == QUIZZES
+
+    dashboard()
+    before, before_queries = run(join_and_prefetch)
+    after, after_queries = run(dashboard)
+    print(f"\nplayable quizzes with {OTHER_ATTEMPTS} other attempts: join + prefetch {before * 1000:.1f}ms "
+          f"({before_queries} queries), dashboard {after * 1000:.1f}ms ({after_queries} queries)")
+    # The conditional GET's validators, then the page
+    assert after_queries == 2
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connections
+from django.urls import path
+from rest_framework.authtoken.models import Token
+
+from quiz.backends.postgresql.base import DatabaseWrapper
+from quiz.models import Attempt, Choice, Question, Quiz
+from quiz.views import AttemptProgress, QuizDetail
+from tests.benchmarks.test_async_benchmark import get
+
+User = get_user_model()
+
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.benchmark, pytest.mark.urls(__name__)]
+
+CLIENTS = 500
+QUESTIONS = 20
+IN_FLIGHT = 16
+
+urlpatterns = [
+    path("quizzes/<uuid:pk>/", QuizDetail.as_view()),
+    path("attempts/<uuid:pk>/progress/", AttemptProgress.as_view()),
+]
+
+BACKENDS = {
+    "connection per request": ("django.db.backends.postgresql", {}),
+    "pool": ("quiz.backends.postgresql", {"pool": {"min_size": IN_FLIGHT, "max_size": IN_FLIGHT},
+                                          "prepare_threshold": None}),
+    "pool, prepared statements": ("quiz.backends.postgresql", {"pool": {"min_size": IN_FLIGHT,
+                                                                        "max_size": IN_FLIGHT}}),
+}
+
+
+def test_requests_with_and_without_pool(monkeypatch):
+    """
+    CLIENTS participants open the quiz and poll their progress, IN_FLIGHT requests at a time.
+    """
+    owner = User.objects.create(username="bench_owner", email="bench_owner@test.com")
+    quiz = Quiz.objects.create(owner=owner, title="Opening", status=Quiz.ACTIVE)
+    for order in range(QUESTIONS):
+        question = Question.objects.create(quiz=quiz, text=f"Question {order}", order=order)
+        Choice.objects.bulk_create(Choice(question=question, text=f"Choice {index}", order=index,
+                                          is_correct=index == 0) for index in range(4))
+    users = User.objects.bulk_create(
+        User(username=f"client{index}", email=f"client{index}@test.com") for index in range(CLIENTS)
+    )
+    tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+    attempts = Attempt.objects.bulk_create(Attempt(quiz=quiz, participant=user) for user in users)
+    application = ASGIHandler()
+
+    def run() -> float:
+        requests = [
+            *(get(application, f"/quizzes/{quiz.id}/", token.key) for token in tokens),
+            *(get(application, f"/attempts/{attempt.id}/progress/", token.key)
+              for token, attempt in zip(tokens, attempts)),
+        ]
+
+        async def run_all():
+            in_flight = asyncio.Semaphore(IN_FLIGHT)
+
+            async def limited(request):
+                async with in_flight:
+                    return await request
+
+            return await asyncio.gather(*(limited(request) for request in requests))
+
+        started = time.perf_counter()
+        statuses = asyncio.run(run_all())
+        elapsed = time.perf_counter() - started
+        assert set(statuses) == {200}, statuses
+        return elapsed
+
+    print()
+    # Every request runs on a thread of its own, its connection comes from the backend under test
+    for name, (engine, options) in BACKENDS.items():
+        monkeypatch.setitem(connections.settings["default"], "ENGINE", engine)
+        monkeypatch.setitem(connections.settings["default"], "OPTIONS", options)
+        # Warm the caches and the pool
+        run()
+        elapsed = run()
+        print(f"{name}: {CLIENTS * 2 / elapsed:.0f} req/s")
+        for key in list(DatabaseWrapper.pools):
+            DatabaseWrapper.pools.pop(key).close()
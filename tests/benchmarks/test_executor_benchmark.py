@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import path
+from rest_framework.authtoken.models import Token
+
+from quiz.executor import PooledASGIHandler, SyncExecutor
+from quiz.models import Attempt, Choice, Question, Quiz
+from quiz.views import AttemptProgress, QuizDetail
+from tests.benchmarks.test_async_benchmark import get
+
+User = get_user_model()
+
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.benchmark, pytest.mark.urls(__name__)]
+
+CLIENTS = 500
+QUESTIONS = 20
+POOL_SIZES = [1, 4, 16, 64]
+# Round trip to a database on another host, the local one answers in microseconds
+LATENCY = 0.005
+
+urlpatterns = [
+    path("quizzes/<uuid:pk>/", QuizDetail.as_view()),
+    path("attempts/<uuid:pk>/progress/", AttemptProgress.as_view()),
+]
+
+
+def add_latency(execute, sql, params, many, context):
+    time.sleep(LATENCY)
+    return execute(sql, params, many, context)
+
+
+def on_connection_created(sender, connection, **kwargs):
+    if add_latency not in connection.execute_wrappers:
+        connection.execute_wrappers.append(add_latency)
+
+
+def close_connections(pool: SyncExecutor):
+    """
+    Close the database connection of every worker, the barrier holds each to a single job.
+    """
+    barrier = threading.Barrier(pool.workers)
+
+    def close():
+        barrier.wait(5)
+        connections.close_all()
+
+    for future in [pool.submit(close) for _ in range(pool.workers)]:
+        future.result()
+
+
+def test_throughput_by_pool_size(monkeypatch):
+    """
+    CLIENTS participants open the quiz and poll their progress at once, through the sync views.
+    """
+    owner = User.objects.create(username="bench_owner", email="bench_owner@test.com")
+    quiz = Quiz.objects.create(owner=owner, title="Opening", status=Quiz.ACTIVE)
+    for order in range(QUESTIONS):
+        question = Question.objects.create(quiz=quiz, text=f"Question {order}", order=order)
+        Choice.objects.bulk_create(Choice(question=question, text=f"Choice {index}", order=index,
+                                          is_correct=index == 0) for index in range(4))
+    users = User.objects.bulk_create(
+        User(username=f"client{index}", email=f"client{index}@test.com") for index in range(CLIENTS)
+    )
+    tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+    attempts = Attempt.objects.bulk_create(Attempt(quiz=quiz, participant=user) for user in users)
+
+    def run(application) -> float:
+        async def run_all():
+            # No proxy in front, every client is in flight at once
+            return await asyncio.gather(
+                *(get(application, f"/quizzes/{quiz.id}/", token.key) for token in tokens),
+                *(get(application, f"/attempts/{attempt.id}/progress/", token.key)
+                  for token, attempt in zip(tokens, attempts)),
+            )
+
+        started = time.perf_counter()
+        statuses = asyncio.run(run_all())
+        elapsed = time.perf_counter() - started
+        assert set(statuses) == {200}, statuses
+        return elapsed
+
+    # Each worker keeps its connection from one request to the next
+    monkeypatch.setitem(connections.settings["default"], "CONN_MAX_AGE", 60)
+    connection_created.connect(on_connection_created)
+    print()
+    for size in POOL_SIZES:
+        pool = SyncExecutor(size)
+        application = PooledASGIHandler(pool)
+        # Warm the caches and open the workers' connections
+        run(application)
+        elapsed = run(application)
+        metrics = pool.metrics()
+        print(f"{size:>3} workers: {CLIENTS * 2 / elapsed:>5.0f} req/s, peak queued {metrics['peak_queued']}, "
+              f"average wait {metrics['average_wait'] * 1000:.1f}ms")
+        assert metrics["peak_busy"] <= size
+        close_connections(pool)
+        pool.shutdown()
+    connection_created.disconnect(on_connection_created)
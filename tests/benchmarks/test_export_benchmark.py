@@ -0,0 +1,94 @@
+import asyncio
+import os
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from quiz.export import export_rows, stream_export
+from quiz.models import Answer, Attempt, Choice, Question, Quiz
+from quiz.renderers import CSVRenderer, NDJSONRenderer
+
+User = get_user_model()
+
+# The export reads on a thread of its own, which only sees committed rows
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.benchmark]
+
+QUESTIONS = 10
+SIZES = [100, 50_000]
+
+ANSWER_ALL_SQL = f"""
+    INSERT INTO {Answer._meta.db_table} (attempt_id, question_id, selected_choice_id, answered_at)
+    SELECT attempt.id, question.id, choice.id, now()
+    FROM {Attempt._meta.db_table} attempt
+    JOIN {Question._meta.db_table} question ON question.quiz_id = attempt.quiz_id
+    JOIN {Choice._meta.db_table} choice ON choice.question_id = question.id AND choice."order" = 0
+    WHERE attempt.quiz_id = %s
+"""
+
+
+def rss() -> int:
+    """
+    Resident memory of the process, in bytes.
+    """
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def make_quiz(owner, participants: int) -> Quiz:
+    quiz = Quiz.objects.create(owner=owner, title=f"Export {participants}", status=Quiz.ACTIVE)
+    for order in range(QUESTIONS):
+        question = Question.objects.create(quiz=quiz, text=f"Question {order}", order=order)
+        Choice.objects.bulk_create(Choice(question=question, text=f"Choice {index}", order=index,
+                                          is_correct=index == 0) for index in range(4))
+    users = User.objects.bulk_create(
+        (User(username=f"export{participants}_{index}", email=f"export{participants}_{index}@test.com")
+         for index in range(participants)),
+        batch_size=5000,
+    )
+    Attempt.objects.bulk_create((Attempt(quiz=quiz, participant=user) for user in users), batch_size=5000)
+    with connection.cursor() as cursor:
+        cursor.execute(ANSWER_ALL_SQL, [quiz.pk])
+        # As autovacuum would after the bulk load, the plans of a freshly loaded table are off
+        cursor.execute(f"ANALYZE {Attempt._meta.db_table}, {Answer._meta.db_table}")
+    return quiz
+
+
+async def consume(quiz_id, renderer) -> tuple[int, int]:
+    """
+    Bytes of the export and the peak resident memory seen while streaming it.
+    """
+    size = peak = 0
+    async for chunk in stream_export(quiz_id, renderer):
+        size += len(chunk)
+        peak = max(peak, rss())
+    return size, peak
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="Reads resident memory from /proc")
+def test_streamed_export():
+    """
+    Export quizzes of SIZES participants answering QUESTIONS questions each, streamed, then the
+    largest one read into memory at once.
+    """
+    owner = User.objects.create(username="export_owner", email="export_owner@test.com")
+    quizzes = [make_quiz(owner, participants) for participants in SIZES]
+
+    lines = []
+    for quiz, participants in zip(quizzes, SIZES):
+        rows = participants * QUESTIONS
+        for renderer in (CSVRenderer(), NDJSONRenderer()):
+            baseline = rss()
+            started = time.perf_counter()
+            size, peak = asyncio.run(consume(quiz.pk, renderer))
+            elapsed = time.perf_counter() - started
+            lines.append(f"{rows:>9} rows {renderer.format:>6}: {rows / elapsed:8.0f} rows/s, "
+                         f"{size / 2**20:7.1f} MiB, peak RSS +{max(peak - baseline, 0) / 2**20:.1f} MiB")
+
+    baseline = rss()
+    loaded = list(export_rows(quizzes[-1].pk))
+    lines.append(f"{len(loaded):>9} rows loaded at once: RSS +{(rss() - baseline) / 2**20:.1f} MiB")
+    assert len(loaded) == SIZES[-1] * QUESTIONS
+
+    print("\n" + "\n".join(lines))
@@ -0,0 +1,33 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from quiz.grading import get_answer_key
+from quiz.serializers import AnswerSerializer
+
+pytestmark = [pytest.mark.django_db, pytest.mark.benchmark]
+
+QUESTIONS = 20
+
+
+def test_queries_per_answer(quiz_factory, question_factory, choice_factory, user_factory, attempt_factory):
+    quiz = quiz_factory()
+    answers = []
+    for order in range(QUESTIONS):
+        question = question_factory(quiz=quiz, order=order)
+        choice = choice_factory(question=question, is_correct=True)
+        answers.append((question, choice))
+    attempt = attempt_factory(quiz=quiz, participant=user_factory(username="bench", email="b@en.ch"))
+    serializer = AnswerSerializer()
+
+    def grade():
+        with CaptureQueriesContext(connection) as context:
+            for question, choice in answers:
+                serializer.validate({"attempt": attempt, "question": question, "selected_choice": choice})
+                get_answer_key(attempt.quiz_id).points_for(question.id, choice.id)
+        return len(context.captured_queries) / QUESTIONS
+
+    cold = grade()
+    warm = grade()
+    print(f"\nqueries per answer: cold={cold:.2f} warm={warm:.2f}")
+    assert warm == 0
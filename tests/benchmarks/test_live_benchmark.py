@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.db import connections
+
+from quiz.executor import database_sync_to_async
+from quiz.grading import submit_answers
+from quiz.live import get_answer_buffer
+from quiz.models import Answer, Attempt, Choice, Question, Quiz
+from quiz.routing import websocket_urlpatterns
+from tests.benchmarks.test_channel_layer_benchmark import bounded
+
+User = get_user_model()
+
+pytestmark = [pytest.mark.django_db(transaction=True), pytest.mark.benchmark]
+
+PARTICIPANTS = 2000
+QUESTIONS = 5
+# Answers of the baseline, written one transaction each like SubmitAttempt does
+BASELINE_ANSWERS = 500
+
+
+def communicator(quiz, user) -> WebsocketCommunicator:
+    socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/quizzes/{quiz.id}/live/")
+    socket.scope["user"] = user
+    return socket
+
+
+async def run_session(quiz, owner, users, questions) -> dict:
+    host = communicator(quiz, owner)
+    participants = [communicator(quiz, user) for user in users]
+    assert (await host.connect())[0]
+    _, connected = await bounded(socket.connect(timeout=60) for socket in participants)
+    assert all(ok for ok, _ in connected)
+
+    async def answer(socket, question):
+        received = await socket.receive_json_from(timeout=60)
+        assert received["question_id"] == question.pk
+        await socket.send_json_to({"type": "answer", "question_id": question.pk, "choice_id": received["choices"][0]["id"]})
+        assert (await socket.receive_json_from(timeout=60))["type"] == "answer_ack"
+
+    buffer = get_answer_buffer()
+    written = buffer.metrics()["written"]
+    acknowledging = 0.0
+    started = time.perf_counter()
+    for question in questions:
+        await host.send_json_to({"type": "next_question", "seconds": 600})
+        await host.receive_json_from(timeout=60)
+        elapsed, _ = await bounded(answer(socket, question) for socket in participants)
+        acknowledging += elapsed
+    # Every acknowledged answer reaches the database
+    total = PARTICIPANTS * QUESTIONS
+    while buffer.metrics()["written"] - written < total:
+        await asyncio.sleep(0.01)
+    ingesting = time.perf_counter() - started
+
+    await bounded(socket.disconnect(timeout=60) for socket in [host, *participants])
+    # Outside a server nothing closes the consumers' connection, it would keep the test database in use
+    await database_sync_to_async(connections.close_all)()
+    return {"acknowledged": total / acknowledging, "written": total / ingesting}
+
+
+def test_live_answer_ingestion(settings):
+    """
+    PARTICIPANTS sockets answer QUESTIONS questions as the host moves on, on a local channel layer.
+    """
+    settings.CHANNEL_LAYERS = {"default": {"BACKEND": settings.CHANNEL_LAYER_BACKENDS["memory"], "CONFIG": {}}}
+    owner = User.objects.create(username="live_host", email="live_host@test.com")
+    quiz = Quiz.objects.create(owner=owner, title="Live", status=Quiz.ACTIVE)
+    questions = []
+    for order in range(QUESTIONS):
+        question = Question.objects.create(quiz=quiz, text=f"Question {order}", order=order)
+        Choice.objects.bulk_create(Choice(question=question, text=f"Choice {index}", order=index,
+                                          is_correct=index == 0) for index in range(4))
+        questions.append(question)
+    users = User.objects.bulk_create(
+        User(username=f"live{index}", email=f"live{index}@test.com") for index in range(PARTICIPANTS)
+    )
+    attempts = Attempt.objects.bulk_create(Attempt(quiz=quiz, participant=user) for user in users)
+
+    flushes = get_answer_buffer().metrics()["flushes"]
+    result = asyncio.run(run_session(quiz, owner, users, questions))
+    assert Answer.objects.filter(attempt__quiz=quiz).count() == PARTICIPANTS * QUESTIONS
+    assert not Attempt.objects.filter(quiz=quiz, status=Attempt.IN_PROGRESS).exists()
+    flushes = get_answer_buffer().metrics()["flushes"] - flushes
+
+    # The same answers written the way a submission request writes them
+    Answer.objects.all().delete()
+    Attempt.objects.filter(quiz=quiz).update(status=Attempt.IN_PROGRESS, score=0)
+    question, right = questions[0].pk, questions[0].choices.get(order=0).pk
+    started = time.perf_counter()
+    for attempt in attempts[:BASELINE_ANSWERS]:
+        submit_answers(attempt, [(question, right)])
+    baseline = BASELINE_ANSWERS / (time.perf_counter() - started)
+
+    print(f"\n{PARTICIPANTS} participants, {QUESTIONS} questions: {result['acknowledged']:.0f} answers/s acknowledged, "
+          f"{result['written']:.0f} answers/s written in {flushes} flushes; "
+          f"one transaction per answer: {baseline:.0f} answers/s")
@@ -0,0 +1,32 @@
+import json
+import timeit
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from quiz.renderers import FastJSONRenderer
+from quiz.serializers import QuizDetailSerializer
+
+pytestmark = [pytest.mark.django_db, pytest.mark.benchmark]
+
+QUESTIONS = 50
+CHOICES = 4
+ROUNDS = 200
+
+
+def test_quiz_detail_rendering(quiz_factory, question_factory, choice_factory):
+    quiz = quiz_factory()
+    for order in range(QUESTIONS):
+        question = question_factory(quiz=quiz, order=order)
+        for choice_order in range(CHOICES):
+            choice_factory(question=question, order=choice_order, is_correct=choice_order == 0)
+    data = QuizDetailSerializer(quiz).data
+
+    stdlib = JSONRenderer()
+    fast = FastJSONRenderer()
+    assert json.loads(fast.render(data)) == json.loads(stdlib.render(data))
+
+    before = timeit.timeit(lambda: stdlib.render(data), number=ROUNDS) / ROUNDS
+    after = timeit.timeit(lambda: fast.render(data), number=ROUNDS) / ROUNDS
+    print(f"\nQuizDetailSerializer payload ({QUESTIONS} questions): "
+          f"stdlib {before * 1000:.3f}ms, fast {after * 1000:.3f}ms ({before / after:.1f}x)")
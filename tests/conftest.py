@@ -7,6 +7,7 @@ from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 
 from quiz.models import Quiz, Question, Choice, Invitation, Attempt
+from quiz.presence import get_presence
 
 User = get_user_model()
 
@@ -18,6 +19,25 @@ def clear_channel_layer():
     async_to_sync(channel_layer.flush())
 
 
+# Keep leaderboards in process memory instead of the shared Redis
+@pytest.fixture(autouse=True)
+def in_memory_leaderboard(settings):
+    settings.LEADERBOARD_BACKEND = "quiz.leaderboard.InMemoryLeaderboard"
+
+
+# Same for presence, every test starts with nobody online
+@pytest.fixture(autouse=True)
+def in_memory_presence(settings):
+    settings.PRESENCE_BACKEND = "quiz.presence.InMemoryPresence"
+    get_presence().entries.clear()
+
+
+# Regrade in the test's own transaction, the regrader's thread would not see its rows
+@pytest.fixture(autouse=True)
+def inline_regrade(settings):
+    settings.REGRADE_IN_BACKGROUND = False
+
+
 @pytest.fixture
 def event_loop():
     loop = asyncio.get_event_loop_policy().new_event_loop()
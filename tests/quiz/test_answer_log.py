@@ -0,0 +1,155 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import DataError
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from quiz.answer_log import ANSWER_LOG_MAX_ATTEMPTS, RedisAnswerLog, flush_answer_log, get_answer_log
+from quiz.grading import ingest_answers
+from quiz.leaderboard import get_leaderboard
+from quiz.models import Answer, Attempt
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def write_behind(settings):
+    settings.ANSWER_WRITE_BEHIND = True
+    settings.ANSWER_LOG_BACKEND = "quiz.answer_log.InMemoryAnswerLog"
+    log = get_answer_log()
+    log.entries.clear()
+    log.pending_answers.clear()
+    log.failures.clear()
+    log.dead.clear()
+    return log
+
+
+@pytest.fixture
+def logged_quiz(authenticated_client, quiz_factory, question_factory, choice_factory, attempt_factory):
+    client, user = authenticated_client
+    quiz = quiz_factory()
+    answers = []
+    for order, points in enumerate([1, 2]):
+        question = question_factory(quiz=quiz, order=order, points=points)
+        right = choice_factory(question=question, text="Right", is_correct=True, order=0)
+        choice_factory(question=question, text="Wrong", order=1)
+        answers.append({"question": question.id, "selected_choice": right.id})
+    attempt = attempt_factory(quiz=quiz, participant=user)
+    return client, attempt, answers
+
+
+def test_submission_is_logged(logged_quiz, django_capture_on_commit_callbacks):
+    client, attempt, answers = logged_quiz
+    submission = reverse("quiz_attempt_submission", kwargs={"pk": attempt.id})
+    progress = reverse("quiz_attempt_progress", kwargs={"pk": attempt.id})
+    first_progress = client.get(progress)
+
+    response = client.patch(submission, {"answers": answers[:1]}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not Answer.objects.filter(attempt=attempt).exists()
+    assert [answer["id"] for answer in response.data["answers"]] == [None]
+    # Read your own writes, and never as a cached copy
+    response = client.get(progress, HTTP_IF_NONE_MATCH=first_progress["ETag"])
+    assert response.status_code == status.HTTP_200_OK
+    assert (response.data["score"], response.data["answered_questions_count"]) == (1, 1)
+
+    # Answered already, only the second question is logged
+    response = client.patch(submission, {"answers": answers}, format="json")
+    assert response.data["status"] == Attempt.COMPLETED
+    assert get_answer_log().size() == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert flush_answer_log() == (2, 2, 1, 1, 0)
+    attempt.refresh_from_db()
+    assert (attempt.score, attempt.status) == (3, Attempt.COMPLETED)
+    assert get_leaderboard().rank(attempt.quiz_id, attempt.participant_id) == (1, 3)
+    assert get_answer_log().pending(attempt.pk) == {}
+    response = client.get(progress)
+    assert (response.data["score"], response.data["answered_questions_count"]) == (3, 2)
+
+
+def test_replay_after_crash(logged_quiz, monkeypatch):
+    client, attempt, answers = logged_quiz
+    client.patch(reverse("quiz_attempt_submission", kwargs={"pk": attempt.id}), {"answers": answers}, format="json")
+    log = get_answer_log()
+
+    def crash(entries):
+        raise ConnectionError
+
+    # Written, but still in the log
+    with monkeypatch.context() as patched:
+        patched.setattr(log, "delete", crash)
+        with pytest.raises(ConnectionError):
+            flush_answer_log()
+
+    assert flush_answer_log() == (2, 0, 0, 0, 0)
+    attempt.refresh_from_db()
+    assert (attempt.score, Answer.objects.filter(attempt=attempt).count()) == (3, 2)
+    assert log.size() == 0
+
+
+def test_turned_down_answers_are_dead_lettered(logged_quiz, monkeypatch):
+    client, attempt, answers = logged_quiz
+    client.patch(reverse("quiz_attempt_submission", kwargs={"pk": attempt.id}), {"answers": answers}, format="json")
+    log = get_answer_log()
+    refused = answers[0]["question"]
+
+    def ingest(batch):
+        if any(answer.question_id == refused for answer in batch):
+            raise DataError("turned down")
+        return ingest_answers(batch)
+
+    monkeypatch.setattr("quiz.answer_log.ingest_answers", ingest)
+    # The other answer is written, the refused one retried
+    assert flush_answer_log() == (2, 1, 1, 0, 0)
+    assert list(log.pending(attempt.pk)) == [refused]
+
+    for _ in range(ANSWER_LOG_MAX_ATTEMPTS - 2):
+        assert flush_answer_log() == (1, 0, 0, 0, 0)
+    assert flush_answer_log() == (1, 0, 0, 0, 1)
+    assert (log.size(), log.dead_letters(), log.pending(attempt.pk)) == (0, 1, {})
+    assert Answer.objects.filter(attempt=attempt).count() == 1
+
+
+def test_flush_answers_once(logged_quiz):
+    client, attempt, answers = logged_quiz
+    client.patch(reverse("quiz_attempt_submission", kwargs={"pk": attempt.id}), {"answers": answers}, format="json")
+    out = StringIO()
+
+    call_command("flush_answers", "--once", "--batch-size", "1", stdout=out)
+
+    assert "Flushed 2 logged answers, 2 written" in out.getvalue()
+    assert Answer.objects.filter(attempt=attempt).count() == 2
+
+
+def test_redis_answer_log(settings, logged_quiz):
+    _, attempt, answers = logged_quiz
+    log = RedisAnswerLog(settings.REDIS_URL, stream="answer_log_test")
+    now = timezone.now()
+    first, second = [(answer["question"], answer["selected_choice"]) for answer in answers]
+    try:
+        assert log.append(attempt, [first], now) == [first[0]]
+        # Pending already
+        assert log.append(attempt, [first, second], now) == [second[0]]
+
+        entries = log.read(10)
+        assert [(answer.attempt_id, answer.question_id, answer.choice_id) for _, answer in entries] == [
+            (attempt.pk, *first), (attempt.pk, *second),
+        ]
+        assert entries[0][1].answered_at == now
+        assert log.pending(attempt.pk)[first[0]] == (first[1], now)
+
+        log.delete(entries[:1])
+        assert log.size() == 1
+        assert list(log.pending(attempt.pk)) == [second[0]]
+
+        assert [log.turned_down(entries[1][0]) for _ in range(2)] == [1, 2]
+        log.dead_letter(entries[1:])
+        assert (log.size(), log.dead_letters(), log.pending(attempt.pk)) == (0, 1, {})
+        assert not log.redis.hlen(log.failures_key)
+    finally:
+        log.redis.delete(log.stream, log.pending_key(attempt.pk), log.failures_key, log.dead_letter_stream)
@@ -0,0 +1,125 @@
+import asyncio
+import uuid
+
+import pytest
+from django.urls import include, path, resolve, reverse
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.throttling import BaseThrottle
+
+from quiz import urls as quiz_urls
+from quiz.async_views import AsyncAttemptProgress, AsyncListPlayableQuiz, AsyncQuizDetail, AsyncQuizProgress
+from quiz.views import AttemptProgress, ListPlayableQuiz, QuizDetail, QuizProgress
+
+# The API with the async read views, off by default
+ASYNC_VIEWS = {
+    "list_playable_quizzes": AsyncListPlayableQuiz,
+    "quiz_detail": AsyncQuizDetail,
+    "view_playable_quizzes": AsyncQuizDetail,
+    "quiz_progress": AsyncQuizProgress,
+    "quiz_attempt_progress": AsyncAttemptProgress,
+}
+urlpatterns = [path("api/", include([
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view() if pattern.name in ASYNC_VIEWS else pattern.callback,
+         name=pattern.name)
+    for pattern in quiz_urls.urlpatterns
+]))]
+
+pytestmark = [pytest.mark.django_db, pytest.mark.urls(__name__)]
+
+
+def sync_response(view_class, user, url, **kwargs):
+    request = APIRequestFactory().get(url)
+    force_authenticate(request, user=user)
+    response = view_class.as_view()(request, **kwargs)
+    return response.render()
+
+
+class TestAsyncReadViews:
+    @pytest.fixture
+    def played_quiz(self, authenticated_client, quiz_factory, question_factory, choice_factory, attempt_factory):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        question = question_factory(quiz=quiz)
+        choice_factory(question=question, is_correct=True)
+        choice_factory(question=question, order=1)
+        attempt = attempt_factory(quiz=quiz, participant=user)
+        return client, user, quiz, attempt
+
+    def test_urls_serve_async_views(self):
+        for name, kwargs in [("list_playable_quizzes", {}), ("quiz_detail", {"pk": uuid.uuid4()})]:
+            assert asyncio.iscoroutinefunction(resolve(reverse(name, kwargs=kwargs)).func)
+
+    @pytest.mark.parametrize("name, view_class, kwargs", [
+        ("list_playable_quizzes", ListPlayableQuiz, lambda quiz, attempt: {}),
+        ("quiz_detail", QuizDetail, lambda quiz, attempt: {"pk": quiz.id}),
+        ("quiz_progress", QuizProgress, lambda quiz, attempt: {"pk": quiz.id}),
+        ("quiz_attempt_progress", AttemptProgress, lambda quiz, attempt: {"pk": attempt.id}),
+    ])
+    def test_same_response_as_sync_view(self, played_quiz, name, view_class, kwargs):
+        client, user, quiz, attempt = played_quiz
+        kwargs = kwargs(quiz, attempt)
+        url = reverse(name, kwargs=kwargs)
+
+        response = client.get(url)
+        expected = sync_response(view_class, user, url, **kwargs)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == expected.data
+        assert response["ETag"] == expected["ETag"]
+
+    def test_participant_quiz_detail(self, played_quiz):
+        client, _, quiz, _ = played_quiz
+
+        response = client.get(reverse("view_playable_quizzes", kwargs={"pk": quiz.id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "is_correct" not in response.json()["questions"][0]["choices"][0]
+
+    def test_errors(self, played_quiz, api_client, quiz_factory, user_factory):
+        client, _, quiz, _ = played_quiz
+        other = quiz_factory(owner=user_factory(username="other", email="other@test.com"), title="Other")
+
+        assert client.get(reverse("quiz_progress", kwargs={"pk": other.id})).status_code == \
+            status.HTTP_403_FORBIDDEN
+        assert client.get(reverse("view_playable_quizzes", kwargs={"pk": other.id})).status_code == \
+            status.HTTP_404_NOT_FOUND
+
+        client.credentials(HTTP_AUTHORIZATION="Token nonsense")
+        response = client.get(reverse("list_playable_quizzes"))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.json() == {"detail": "Invalid token."}
+
+        client.credentials()
+        response = client.get(reverse("quiz_detail", kwargs={"pk": quiz.id}))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response["WWW-Authenticate"] == "Token"
+
+    def test_drf_view_steps(self, played_quiz, monkeypatch):
+        client, _, quiz, _ = played_quiz
+        url = reverse("quiz_detail", kwargs={"pk": quiz.id})
+
+        # The browsable API is left to the DRF view
+        response = client.get(url, HTTP_ACCEPT="text/html")
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"].startswith("text/html")
+
+        class Closed(BaseThrottle):
+            def allow_request(self, request, view):
+                return False
+
+            def wait(self):
+                return 10
+
+        monkeypatch.setattr(QuizDetail, "throttle_classes", [Closed])
+        response = client.get(url)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response["Retry-After"] == "10"
+
+    def test_writes_go_to_drf_view(self, played_quiz):
+        client, _, quiz, _ = played_quiz
+
+        response = client.patch(reverse("quiz_detail", kwargs={"pk": quiz.id}), {"title": "Renamed"}, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["title"] == "Renamed"
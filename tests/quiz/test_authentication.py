@@ -0,0 +1,80 @@
+import pytest
+from asgiref.sync import async_to_sync
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from quiz.authentication import TTLCache
+from quiz.middleware import get_user
+
+pytestmark = pytest.mark.django_db
+
+
+class TestTTLCache:
+    def test_entries_expire(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr("quiz.authentication.time.monotonic", lambda: now[0])
+        ttl_cache = TTLCache(size=10, ttl=5)
+        ttl_cache.set("key", "value")
+
+        assert ttl_cache.get("key") == "value"
+        now[0] += 6
+        assert ttl_cache.get("key") is None
+
+    def test_least_recently_used_evicted(self):
+        ttl_cache = TTLCache(size=2, ttl=60)
+        ttl_cache.set("a", 1)
+        ttl_cache.set("b", 2)
+        ttl_cache.get("a")
+        ttl_cache.set("c", 3)
+
+        assert ttl_cache.get("a") == 1
+        assert ttl_cache.get("b") is None
+
+
+class TestCachedTokenAuthentication:
+    def test_repeated_requests_skip_token_lookup(self, authenticated_client, django_assert_num_queries):
+        client, user = authenticated_client
+        url = reverse("owned_quizzes")
+        client.get(url)
+
+        # Only the conditional GET validators and the (empty) quiz listing itself
+        with django_assert_num_queries(2):
+            response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_deleted_token_rejected(self, authenticated_client, django_capture_on_commit_callbacks):
+        client, user = authenticated_client
+        url = reverse("owned_quizzes")
+        client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Token.objects.filter(user=user).delete()
+
+        assert client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_deactivated_user_rejected(self, authenticated_client, django_capture_on_commit_callbacks):
+        client, user = authenticated_client
+        url = reverse("owned_quizzes")
+        client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.is_active = False
+            user.save()
+
+        assert client.get(url).status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.django_db(transaction=True)
+    def test_websocket_middleware_uses_cache(self, user_factory, django_assert_num_queries):
+        user = user_factory(username="socketuser", email="socketuser@test.com")
+        token = Token.objects.create(user=user)
+
+        assert async_to_sync(get_user)(token.key) == user
+        with django_assert_num_queries(0):
+            cached = async_to_sync(get_user)(token.key)
+        assert cached == user
+        # A user of its own, without its password hash
+        assert cached is not async_to_sync(get_user)(token.key)
+        assert cached.username == "socketuser"
+        assert "password" in cached.get_deferred_fields()
+        assert not async_to_sync(get_user)("unknown").is_authenticated
@@ -0,0 +1,55 @@
+import datetime
+import io
+import decimal
+import json
+import uuid
+
+import pytest
+from django.utils.translation import gettext_lazy
+
+from quiz import codec
+from quiz.parsers import FastJSONParser
+from quiz.renderers import FastJSONRenderer
+
+PAYLOAD = {
+    "id": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "created_at": datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone.utc),
+    "points": decimal.Decimal("1.5"),
+    "label": gettext_lazy("Pending"),
+    "text": "Zürich",
+}
+
+
+@pytest.fixture(params=["fast", "stdlib"])
+def json_backend(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(codec, "orjson", None)
+    elif codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_codec_round_trip(json_backend):
+    data = codec.loads(codec.dumps(PAYLOAD))
+
+    assert data == {
+        "id": "12345678-1234-5678-1234-567812345678",
+        "created_at": "2024-05-01T12:30:00Z",
+        "points": 1.5,
+        "label": "Pending",
+        "text": "Zürich",
+    }
+
+
+def test_renderer_matches_parser(json_backend):
+    rendered = FastJSONRenderer().render({"answers": [{"question": 1, "text": "a\u2028b"}]})
+
+    assert b"\\u2028" in rendered
+    parsed = FastJSONParser().parse(io.BytesIO(rendered))
+    assert parsed == json.loads(rendered)
+
+
+def test_renderer_indents_on_request():
+    rendered = FastJSONRenderer().render({"a": 1}, "application/json; indent=2")
+
+    assert rendered == b'{\n  "a": 1\n}'
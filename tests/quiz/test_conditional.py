@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from quiz.grading import submit_answers
+from quiz.models import Attempt
+
+pytestmark = pytest.mark.django_db
+
+
+class TestConditionalGet:
+    def test_quiz_detail_not_modified(self, authenticated_client, quiz_factory, question_factory,
+                                      django_assert_num_queries):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        url = reverse("quiz_detail", kwargs={"pk": quiz.id})
+
+        response = client.get(url)
+        etag = response["ETag"]
+        assert response.status_code == status.HTTP_200_OK
+        assert "Last-Modified" in response
+
+        # Only the validators, nothing is serialized
+        with django_assert_num_queries(1):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+        assert not response.content
+
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        # Adding a question changes the nested payload
+        question_factory(quiz=quiz)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+        assert len(response.json()["questions"]) == 1
+
+    def test_attempt_progress_follows_answers(self, authenticated_client, quiz_factory, question_factory,
+                                              choice_factory, attempt_factory):
+        client, user = authenticated_client
+        quiz = quiz_factory()
+        question = question_factory(quiz=quiz)
+        choice = choice_factory(question=question, is_correct=True)
+        attempt = attempt_factory(quiz=quiz, participant=user)
+        url = reverse("quiz_attempt_progress", kwargs={"pk": attempt.id})
+
+        response = client.get(url)
+        etag = response["ETag"]
+        # The score and answer count have no timestamps of their own
+        assert "Last-Modified" not in response
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        submit_answers(attempt, [(question.id, choice.id)])
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["answered_questions_count"] == 1
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_question_analytics_follow_quiz_stats(self, authenticated_client, quiz_factory, question_factory,
+                                                  user_factory, attempt_factory):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        question_factory(quiz=quiz)
+        url = reverse("quiz_question_analytics", kwargs={"pk": quiz.id})
+        etag = client.get(url)["ETag"]
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        # Completed without answering, no choice counter moves
+        attempt = attempt_factory(quiz=quiz, participant=user_factory(username="silent", email="silent@test.com"))
+        attempt.status = Attempt.COMPLETED
+        attempt.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["completed_attempts"] == 1
+
+    def test_list_pages_have_their_own_validators(self, authenticated_client, quiz_factory, attempt_factory):
+        client, user = authenticated_client
+        owner = quiz_factory().owner
+        for index in range(3):
+            attempt_factory(quiz=quiz_factory(owner=owner, title=f"Quiz {index}"), participant=user)
+        url = reverse("quiz_attempt_creation")
+
+        first = client.get(url, {"page_size": 2})
+        second = client.get(first.data["next"])
+
+        assert first["ETag"] != second["ETag"]
+        assert client.get(url, {"page_size": 2}, HTTP_IF_NONE_MATCH=first["ETag"]).status_code == \
+            status.HTTP_304_NOT_MODIFIED
+
+    def test_progress_not_validated_for_others(self, authenticated_client, quiz_factory, user_factory):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        url = reverse("quiz_progress", kwargs={"pk": quiz.id})
+        etag = client.get(url)["ETag"]
+
+        other = user_factory(username="other", email="other@test.com")
+        token = Token.objects.create(user=other)
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    @pytest.mark.parametrize("name", ["quiz_progress", "quiz_question_analytics"])
+    def test_owner_views_refuse_anonymous(self, api_client, quiz_factory, user_factory, name):
+        quiz = quiz_factory(owner=user_factory())
+        response = api_client.get(reverse(name, kwargs={"pk": quiz.id}))
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert "ETag" not in response
@@ -4,11 +4,18 @@ from channels.db import database_sync_to_async
 from channels.layers import get_channel_layer
 from django.contrib.auth import get_user_model
 
-from quiz.models import Invitation
+from channels.routing import URLRouter
+
+from quiz.leaderboard import get_leaderboard, group_name
+from quiz.models import Answer, Attempt, Invitation, Notification
 from quiz.consumers import InvitationConsumer
+from quiz.presence import get_presence
+from quiz.routing import websocket_urlpatterns
 
 User = get_user_model()
 
+EMPTY_INBOX = {"type": "inbox", "cursor": None, "unread": 0, "more": False}
+
 
 @pytest.mark.django_db
 @pytest.mark.asyncio
@@ -23,6 +30,8 @@ async def test_websocket_connect(user_factory):
 
     connected, _ = await communicator.connect()
     assert connected
+    # Nothing waiting in the inbox
+    assert await communicator.receive_json_from() == EMPTY_INBOX
 
     await communicator.disconnect()
 
@@ -42,6 +51,8 @@ async def test_invitation_message(user_factory, quiz_factory, invitation_factory
     communicator.scope["user"] = participant
     connected, _ = await communicator.connect()
     assert connected
+    # Nothing waiting in the inbox
+    assert await communicator.receive_json_from() == EMPTY_INBOX
 
     # Create an invitation (this should trigger a WebSocket message)
     invitation = await database_sync_to_async(invitation_factory)(
@@ -78,6 +89,40 @@ async def test_invitation_message(user_factory, quiz_factory, invitation_factory
     await communicator.disconnect()
 
 
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+@pytest.mark.parametrize("layer", ["core", "pubsub", "memory"])
+async def test_invitation_delivery_on_each_layer(settings, user_factory, layer):
+    settings.CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": settings.CHANNEL_LAYER_BACKENDS[layer],
+            "CONFIG": {"hosts": [settings.REDIS_URL]} if layer != "memory" else {},
+        },
+    }
+    participant = await database_sync_to_async(user_factory)(username=f"layer_{layer}", email=f"{layer}@lay.er")
+
+    communicator = WebsocketCommunicator(
+        application=InvitationConsumer.as_asgi(),
+        path="/ws/invitations/"
+    )
+    communicator.scope["user"] = participant
+    connected, _ = await communicator.connect()
+    assert connected
+    # Nothing waiting in the inbox
+    assert await communicator.receive_json_from() == EMPTY_INBOX
+
+    channel_layer = get_channel_layer()
+    await channel_layer.group_send(
+        f"user_{participant.id}",
+        {"type": "invitation_message", "content": {"type": "invitation", "quiz_title": "Layered"}}
+    )
+
+    assert await communicator.receive_json_from() == {"type": "invitation", "quiz_title": "Layered"}
+
+    await communicator.disconnect()
+    await channel_layer.flush()
+
+
 @pytest.mark.django_db
 @pytest.mark.asyncio
 async def test_invitation_response(user_factory, quiz_factory, invitation_factory):
@@ -99,6 +144,8 @@ async def test_invitation_response(user_factory, quiz_factory, invitation_factor
     communicator.scope["user"] = participant
     connected, _ = await communicator.connect()
     assert connected
+    # Nothing waiting in the inbox
+    assert await communicator.receive_json_from() == EMPTY_INBOX
 
     # Send a response to the invitation via WebSocket
     await communicator.send_json_to({
@@ -118,3 +165,150 @@ async def test_invitation_response(user_factory, quiz_factory, invitation_factor
     assert invitation.status == Invitation.ACCEPTED
 
     await communicator.disconnect()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_presence(user_factory):
+    user = await database_sync_to_async(user_factory)(username="present", email="present@pre.sent")
+    communicator = WebsocketCommunicator(InvitationConsumer.as_asgi(), "/ws/invitations/")
+    communicator.scope["user"] = user
+
+    await communicator.connect()
+    assert get_presence().online([user.id]) == {user.id}
+
+    await communicator.disconnect()
+    assert get_presence().online([user.id]) == set()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_inbox_replay(user_factory):
+    user = await database_sync_to_async(user_factory)(username="returning", email="returning@ret.urn")
+    first, second = [
+        await database_sync_to_async(Notification.objects.create)(recipient=user, content={"type": "invitation", "n": n})
+        for n in range(2)
+    ]
+
+    communicator = WebsocketCommunicator(InvitationConsumer.as_asgi(), "/ws/invitations/")
+    communicator.scope["user"] = user
+    await communicator.connect()
+
+    assert await communicator.receive_json_from() == {"type": "invitation", "n": 0, "notification_id": first.id}
+    assert await communicator.receive_json_from() == {"type": "invitation", "n": 1, "notification_id": second.id}
+    assert await communicator.receive_json_from() == {"type": "inbox", "cursor": second.id, "unread": 2, "more": False}
+
+    await communicator.send_json_to({"type": "notifications_read", "cursor": first.id})
+    assert await communicator.receive_json_from() == {"type": "inbox", "cursor": first.id, "unread": 1, "more": False}
+    await communicator.disconnect()
+
+    # A client that has seen the first one resumes after it
+    communicator = WebsocketCommunicator(InvitationConsumer.as_asgi(), f"/ws/invitations/?cursor={first.id}")
+    communicator.scope["user"] = user
+    await communicator.connect()
+
+    assert await communicator.receive_json_from() == {"type": "invitation", "n": 1, "notification_id": second.id}
+    assert await communicator.receive_json_from() == {"type": "inbox", "cursor": second.id, "unread": 1, "more": False}
+
+    await communicator.send_json_to({"type": "replay", "cursor": second.id})
+    assert await communicator.receive_json_from() == {"type": "inbox", "cursor": second.id, "unread": 1, "more": False}
+    await communicator.disconnect()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_leaderboard_updates(user_factory, quiz_factory, attempt_factory):
+    owner = await database_sync_to_async(user_factory)(username="boardowner", email="board@own.er")
+    participant = await database_sync_to_async(user_factory)(username="boardplayer", email="board@play.er")
+    quiz = await database_sync_to_async(quiz_factory)(owner=owner)
+
+    communicator = WebsocketCommunicator(
+        application=URLRouter(websocket_urlpatterns),
+        path=f"/ws/quizzes/{quiz.id}/leaderboard/"
+    )
+    communicator.scope["user"] = owner
+    connected, _ = await communicator.connect()
+    assert connected
+
+    # The current standings are sent on connect
+    response = await communicator.receive_json_from()
+    assert response["type"] == "leaderboard"
+    assert response["entries"] == []
+
+    # A burst of changes results in a single push
+    await database_sync_to_async(attempt_factory)(quiz=quiz, participant=participant)
+    get_leaderboard().add(quiz.id, participant.id, 4)
+    for _ in range(3):
+        await get_channel_layer().group_send(group_name(quiz.id), {"type": "leaderboard_changed"})
+
+    response = await communicator.receive_json_from(timeout=2)
+    assert response["entries"] == [
+        {"rank": 1, "participant": {"id": str(participant.id), "username": "boardplayer"}, "score": 4}
+    ]
+    assert await communicator.receive_nothing(timeout=1)
+
+    await communicator.disconnect()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_leaderboard_rejects_outsiders(user_factory, quiz_factory):
+    owner = await database_sync_to_async(user_factory)(username="boardowner2", email="board2@own.er")
+    outsider = await database_sync_to_async(user_factory)(username="outsider", email="out@sid.er")
+    quiz = await database_sync_to_async(quiz_factory)(owner=owner)
+
+    communicator = WebsocketCommunicator(
+        application=URLRouter(websocket_urlpatterns),
+        path=f"/ws/quizzes/{quiz.id}/leaderboard/"
+    )
+    communicator.scope["user"] = outsider
+    connected, _ = await communicator.connect()
+    assert not connected
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.asyncio
+async def test_live_session(user_factory, quiz_factory, question_factory, choice_factory, attempt_factory):
+    owner = await database_sync_to_async(user_factory)(username="liveowner", email="live@own.er")
+    player = await database_sync_to_async(user_factory)(username="liveplayer", email="live@play.er")
+    outsider = await database_sync_to_async(user_factory)(username="liveoutsider", email="live@out.sider")
+    quiz = await database_sync_to_async(quiz_factory)(owner=owner)
+    question = await database_sync_to_async(question_factory)(quiz=quiz)
+    choice = await database_sync_to_async(choice_factory)(question=question, is_correct=True)
+    attempt = await database_sync_to_async(attempt_factory)(quiz=quiz, participant=player)
+
+    sockets = {}
+    for user in (owner, player, outsider):
+        sockets[user.username] = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/quizzes/{quiz.id}/live/")
+        sockets[user.username].scope["user"] = user
+    host, participant = sockets["liveowner"], sockets["liveplayer"]
+    assert (await host.connect())[0]
+    assert (await participant.connect())[0]
+    assert not (await sockets["liveoutsider"].connect())[0]
+
+    await host.send_json_to({"type": "next_question", "seconds": 30})
+    for socket in (host, participant):
+        received = await socket.receive_json_from()
+        assert received["type"] == "question"
+        assert received["question_id"] == question.id
+        assert received["choices"] == [{"id": choice.id, "text": choice.text, "order": 0}]
+
+    # Equal to the ids, but no ids
+    for question_id, choice_id in ((question.id, float(choice.id)), (float(question.id), choice.id)):
+        await participant.send_json_to({"type": "answer", "question_id": question_id, "choice_id": choice_id})
+        assert (await participant.receive_json_from())["message"] == "This is not a valid answer"
+    await participant.send_json_to({"type": "answer", "question_id": question.id, "choice_id": choice.id})
+    assert await participant.receive_json_from() == {"type": "answer_ack", "question_id": question.id}
+    await participant.send_json_to({"type": "answer", "question_id": question.id, "choice_id": choice.id})
+    assert (await participant.receive_json_from())["type"] == "error"
+
+    await host.send_json_to({"type": "end"})
+    for socket in (host, participant):
+        assert await socket.receive_json_from() == {"type": "ended"}
+    # Written when the session ended
+    answer = await database_sync_to_async(Answer.objects.select_related("attempt").get)(attempt=attempt)
+    assert answer.selected_choice_id == choice.id
+    assert answer.attempt.status == Attempt.COMPLETED
+
+    await host.disconnect()
+    await participant.disconnect()
@@ -0,0 +1,87 @@
+import gc
+import threading
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from quiz.backends.postgresql.base import PREPARE_THRESHOLD, DatabaseWrapper
+
+pytestmark = pytest.mark.django_db
+
+
+def backend_pid(wrapper) -> int:
+    with wrapper.cursor() as cursor:
+        cursor.execute("SELECT pg_backend_pid()")
+        return cursor.fetchone()[0]
+
+
+class TestPooledBackend:
+    @pytest.fixture
+    def make_wrapper(self):
+        def make(max_size=2):
+            settings_dict = {**connection.settings_dict, "ENGINE": "quiz.backends.postgresql",
+                             "OPTIONS": {"pool": {"min_size": 1, "max_size": max_size, "timeout": 5}}}
+            return DatabaseWrapper(settings_dict, alias="pooled")
+
+        yield make
+        make().close_pool()
+
+    def test_connections_are_reused(self, make_wrapper):
+        wrapper = make_wrapper(max_size=1)
+        pid = backend_pid(wrapper)
+        wrapper.close()
+
+        assert wrapper.connection is None
+        assert backend_pid(wrapper) == pid
+        wrapper.close()
+        assert wrapper.pool.get_stats()["pool_available"] == 1
+
+    def test_broken_connections_are_replaced(self, make_wrapper):
+        wrapper = make_wrapper()
+        pid = backend_pid(wrapper)
+        wrapper.close()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+
+        assert backend_pid(wrapper) != pid
+        wrapper.close()
+
+    def test_threads_get_their_own_connection(self, make_wrapper):
+        pids = []
+        connected = threading.Barrier(2)
+
+        def run():
+            # Each thread has its own wrapper, like django.db.connections, and never closes it
+            wrapper = make_wrapper()
+            pids.append(backend_pid(wrapper))
+            connected.wait(5)
+
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        gc.collect()
+
+        assert len(set(pids)) == 2
+        # The connections of the collected wrappers went back to the pool
+        wrapper = make_wrapper()
+        assert backend_pid(wrapper) in pids
+        wrapper.close()
+
+    def test_prepared_statements(self, make_wrapper):
+        wrapper = make_wrapper()
+        with wrapper.cursor() as cursor:
+            for _ in range(PREPARE_THRESHOLD + 1):
+                cursor.execute("SELECT %s::int", [1])
+            cursor.execute("SELECT count(*) FROM pg_prepared_statements")
+            assert cursor.fetchone()[0] >= 1
+        wrapper.close()
+
+    def test_persistent_connections_rejected(self):
+        settings_dict = {**connection.settings_dict, "CONN_MAX_AGE": 60, "OPTIONS": {"pool": True}}
+
+        with pytest.raises(ImproperlyConfigured):
+            DatabaseWrapper(settings_dict, alias="pooled").pool
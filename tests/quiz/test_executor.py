@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+import pytest
+from django.http import HttpResponse
+from django.urls import path
+
+from quiz import executor
+from quiz.executor import PooledASGIHandler, SyncExecutor, database_sync_to_async
+
+pytestmark = pytest.mark.urls(__name__)
+
+
+def thread_name(request):
+    return HttpResponse(threading.current_thread().name)
+
+
+urlpatterns = [path("thread/", thread_name)]
+
+
+async def get(application, path: str) -> bytes:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    body = b""
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal body
+        if message["type"] == "http.response.body":
+            body += message.get("body", b"")
+
+    await application(scope, receive, send)
+    return body
+
+
+class TestSyncExecutor:
+    def test_metrics(self):
+        pool = SyncExecutor(2)
+        release = threading.Event()
+        futures = [pool.submit(release.wait, 5) for _ in range(5)]
+        while pool.metrics()["busy"] < 2:
+            release.wait(0.01)
+
+        metrics = pool.metrics()
+        assert metrics["workers"] == 2
+        assert metrics["busy"] == 2
+        assert metrics["queued"] == 3
+        assert metrics["peak_queued"] >= 3
+
+        release.set()
+        for future in futures:
+            future.result()
+        metrics = pool.metrics()
+        assert metrics["busy"] == metrics["queued"] == 0
+        assert metrics["submitted"] == metrics["completed"] == 5
+        assert metrics["peak_busy"] == 2
+        assert metrics["average_wait"] > 0
+        pool.shutdown()
+
+    def test_requests_run_on_pool(self):
+        pool = SyncExecutor(2)
+        application = PooledASGIHandler(pool)
+
+        async def run():
+            return await asyncio.gather(*(get(application, "/thread/") for _ in range(10)))
+
+        names = asyncio.run(run())
+
+        assert {name.decode().rsplit("_", 1)[0] for name in names} == {"sync-executor"}
+        assert pool.metrics()["peak_busy"] <= 2
+        # Finished requests leave the pool running
+        assert pool.submit(lambda: 1).result() == 1
+        pool.shutdown()
+
+    def test_database_sync_to_async(self, monkeypatch):
+        monkeypatch.setattr(executor, "SYNC_EXECUTOR_WORKERS", 2)
+        monkeypatch.setattr(executor, "_executor", None)
+
+        name = asyncio.run(database_sync_to_async(lambda: threading.current_thread().name)())
+
+        assert name.startswith("sync-executor")
+        assert executor.get_executor().metrics()["completed"] == 1
+        executor.get_executor().shutdown()
+
+    def test_default_without_pool(self):
+        wrapped = database_sync_to_async(threading.current_thread)
+
+        assert executor.get_executor() is None
+        assert wrapped._thread_sensitive
+        assert wrapped._executor is None
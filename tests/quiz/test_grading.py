@@ -0,0 +1,256 @@
+import threading
+
+import pytest
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from quiz.grading import get_answer_key, get_regrader, regrade_quiz, submit_answers
+from quiz.models import Answer, Attempt, ChoiceStats, Quiz
+from quiz.serializers import AnswerSerializer
+from quiz.stats import with_stats
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def graded_quiz(quiz_factory, question_factory, choice_factory):
+    quiz = quiz_factory()
+    questions = []
+    for order in range(3):
+        question = question_factory(quiz=quiz, order=order, points=order + 1)
+        correct = choice_factory(question=question, is_correct=True, order=0)
+        wrong = choice_factory(question=question, order=1)
+        questions.append((question, correct, wrong))
+    return quiz, questions
+
+
+class TestAnswerKey:
+    def test_answer_key_contents(self, graded_quiz):
+        quiz, questions = graded_quiz
+        answer_key = get_answer_key(quiz.id)
+
+        assert len(answer_key.questions) == 3
+        question, correct, wrong = questions[2]
+        assert answer_key.points_for(question.id, correct.id) == 3
+        assert answer_key.points_for(question.id, wrong.id) == 0
+        assert answer_key.is_valid(question.id, wrong.id)
+        assert not answer_key.is_valid(question.id, questions[0][1].id)
+
+    def test_warm_answer_key_does_not_query(self, graded_quiz, django_assert_num_queries):
+        quiz, _ = graded_quiz
+        get_answer_key(quiz.id)
+        with django_assert_num_queries(0):
+            get_answer_key(quiz.id)
+
+    def test_choice_change_invalidates_answer_key(self, graded_quiz):
+        quiz, questions = graded_quiz
+        question, correct, wrong = questions[0]
+        get_answer_key(quiz.id)
+
+        correct.is_correct = False
+        correct.save()
+        wrong.is_correct = True
+        wrong.save()
+
+        assert get_answer_key(quiz.id).points_for(question.id, wrong.id) == 1
+
+    def test_question_change_invalidates_answer_key(self, graded_quiz):
+        quiz, questions = graded_quiz
+        question, correct, _ = questions[0]
+        get_answer_key(quiz.id)
+
+        question.points = 10
+        question.save()
+
+        assert get_answer_key(quiz.id).points_for(question.id, correct.id) == 10
+
+
+class TestAnswerGrading:
+    def test_validation_does_not_query(self, graded_quiz, user_factory, attempt_factory,
+                                       django_assert_num_queries):
+        quiz, questions = graded_quiz
+        attempt = attempt_factory(quiz=quiz, participant=user_factory(username="grader", email="g@r.ade"))
+        question, correct, _ = questions[0]
+        get_answer_key(quiz.id)
+
+        serializer = AnswerSerializer()
+        with django_assert_num_queries(0):
+            serializer.validate({"attempt": attempt, "question": question, "selected_choice": correct})
+
+    def test_invalid_choice_rejected(self, graded_quiz, user_factory, attempt_factory):
+        quiz, questions = graded_quiz
+        attempt = attempt_factory(quiz=quiz, participant=user_factory(username="cheat", email="c@h.eat"))
+        serializer = AnswerSerializer(data={
+            "attempt": attempt.id,
+            "question": questions[0][0].id,
+            "selected_choice": questions[1][1].id,
+        })
+        assert not serializer.is_valid()
+
+    def test_score_assigned_once(self, graded_quiz, user_factory, attempt_factory, django_assert_num_queries):
+        quiz, questions = graded_quiz
+        attempt = attempt_factory(quiz=quiz, participant=user_factory(username="scorer", email="s@c.ore"))
+        get_answer_key(quiz.id)
+
+        # INSERT answer, UPDATE score and the choice counter upsert, nothing else
+        with django_assert_num_queries(3):
+            Answer.objects.create(attempt=attempt, question=questions[1][0], selected_choice=questions[1][1])
+        Answer.objects.create(attempt=attempt, question=questions[2][0], selected_choice=questions[2][2])
+
+        attempt.refresh_from_db()
+        assert attempt.score == 2
+
+
+class TestRegrade:
+    @pytest.fixture
+    def answered_attempt(self, graded_quiz, user_factory, attempt_factory):
+        quiz, questions = graded_quiz
+        attempt = attempt_factory(quiz=quiz, participant=user_factory(username="regrade", email="re@gr.ade"))
+        # Right, right, wrong: 1 + 2 points
+        submit_answers(attempt, [(q.id, correct.id) for q, correct, _ in questions[:2]]
+                       + [(questions[2][0].id, questions[2][2].id)])
+        return attempt
+
+    def test_regrade_after_correct_choice_fixed(self, graded_quiz, answered_attempt):
+        quiz, questions = graded_quiz
+        _, correct, wrong = questions[2]
+        correct.is_correct = False
+        correct.save()
+        wrong.is_correct = True
+        wrong.save()
+
+        result = regrade_quiz(quiz.id, chunk_size=1)
+
+        answered_attempt.refresh_from_db()
+        assert answered_attempt.score == 6
+        assert result.attempts == 1
+        assert result.changed == 1
+
+    def test_points_change_regrades_on_commit(self, graded_quiz, answered_attempt,
+                                              django_capture_on_commit_callbacks):
+        quiz, questions = graded_quiz
+        question = questions[0][0]
+        with django_capture_on_commit_callbacks(execute=True):
+            question.points = 5
+            question.save()
+
+        answered_attempt.refresh_from_db()
+        assert answered_attempt.score == 7
+
+    # The regrader's thread only sees committed rows
+    @pytest.mark.django_db(transaction=True)
+    def test_changes_regrade_once_in_background(self, settings, graded_quiz, answered_attempt, monkeypatch):
+        settings.REGRADE_IN_BACKGROUND = True
+        quiz, questions = graded_quiz
+        regrades = []
+
+        def regrade(quiz_id):
+            regrades.append(quiz_id)
+            return regrade_quiz(quiz_id)
+
+        monkeypatch.setattr("quiz.grading.regrade_quiz", regrade)
+        with transaction.atomic():
+            for question, _, _ in questions:
+                question.points = 5
+                question.save()
+        get_regrader().flush()
+
+        answered_attempt.refresh_from_db()
+        assert answered_attempt.score == 10
+        assert regrades == [quiz.id]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_regrade_keeps_concurrent_submission(self, graded_quiz, user_factory, attempt_factory):
+        quiz, questions = graded_quiz
+        attempt = attempt_factory(quiz=quiz, participant=user_factory(username="racing", email="racing@test.com"))
+        submit_answers(attempt, [(q.id, correct.id) for q, correct, _ in questions[:2]])
+        submitted, release = threading.Event(), threading.Event()
+
+        def submit():
+            with transaction.atomic():
+                submit_answers(Attempt.objects.select_related("quiz").get(pk=attempt.pk),
+                               [(questions[2][0].id, questions[2][1].id)])
+                submitted.set()
+                release.wait(5)
+            connection.close()
+
+        def regrade():
+            regrade_quiz(quiz.id)
+            connection.close()
+
+        writer = threading.Thread(target=submit)
+        writer.start()
+        assert submitted.wait(5)
+        regrader = threading.Thread(target=regrade)
+        regrader.start()
+        regrader.join(0.5)
+        # Held off until the submission commits, then graded with its answer
+        assert regrader.is_alive()
+        release.set()
+        writer.join(5)
+        regrader.join(5)
+
+        attempt.refresh_from_db()
+        assert attempt.score == 6
+
+    def test_unchanged_scores_are_not_rewritten(self, graded_quiz, answered_attempt):
+        quiz, _ = graded_quiz
+        assert regrade_quiz(quiz.id).changed == 0
+
+    def test_regrade_command(self, graded_quiz, answered_attempt, capsys):
+        quiz, _ = graded_quiz
+        call_command("regrade_quiz", str(quiz.id))
+        assert "0 of 1 attempts changed" in capsys.readouterr().out
+
+
+class TestRebuildQuizStats:
+    def test_rebuild_matches_incremental_counters(self, graded_quiz, user_factory, attempt_factory):
+        quiz, questions = graded_quiz
+        for index in range(3):
+            attempt = attempt_factory(quiz=quiz, participant=user_factory(username=f"item{index}",
+                                                                          email=f"item{index}@test.com"))
+            submit_answers(attempt, [(q.id, (correct if index else wrong).id) for q, correct, wrong in questions])
+
+        def counters():
+            return sorted(ChoiceStats.objects.values_list("choice_id").annotate(
+                Sum("answer_count"), Sum("completed_answer_count"), Sum("completed_score_sum")))
+
+        incremental = counters()
+        call_command("rebuild_quiz_stats", str(quiz.id))
+        assert counters() == incremental
+
+    def test_late_answer_matches_rebuild(self, graded_quiz, user_factory, attempt_factory, monkeypatch,
+                                         django_capture_on_commit_callbacks):
+        quiz, questions = graded_quiz
+        attempts = []
+        for index in range(2):
+            attempt = attempt_factory(quiz=quiz, participant=user_factory(username=f"late{index}",
+                                                                          email=f"late{index}@test.com"))
+            # 1 point for the first attempt, none for the second
+            submit_answers(attempt, [(questions[0][0].id, questions[0][1 + index].id),
+                                     (questions[1][0].id, questions[1][2].id)])
+            attempt.refresh_from_db()
+            attempt.status = Attempt.COMPLETED
+            attempt.save()
+            attempts.append(attempt)
+
+        def snapshot():
+            stats = with_stats(Quiz.objects.filter(pk=quiz.pk)).get()
+            counters = ChoiceStats.objects.values_list("choice_id").annotate(
+                Sum("answer_count"), Sum("completed_answer_count"), Sum("completed_score_sum"))
+            # A rebuild has rows for the choices nobody picked as well
+            return ([getattr(stats, name) for name in vars(stats) if name.startswith("stats_")],
+                    sorted(row for row in counters if any(row[1:])))
+
+        rebuilds = []
+        monkeypatch.setattr("quiz.stats.rebuild_quiz_stats", rebuilds.append)
+        with django_capture_on_commit_callbacks(execute=True):
+            # Raises the highest score, the lowest stays
+            Answer.objects.create(attempt=attempts[0], question=questions[2][0], selected_choice=questions[2][1])
+        assert rebuilds == []
+        incremental = snapshot()
+        monkeypatch.undo()
+
+        call_command("rebuild_quiz_stats", str(quiz.id))
+        assert snapshot() == incremental
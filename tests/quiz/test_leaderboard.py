@@ -0,0 +1,118 @@
+import time
+import uuid
+
+import pytest
+from django.db import transaction
+
+from quiz import leaderboard
+from quiz.grading import submit_answers
+from quiz.leaderboard import InMemoryLeaderboard, get_leaderboard, leaderboard_snapshot, rebuild_leaderboard, record_score
+
+pytestmark = pytest.mark.django_db
+
+
+class TestInMemoryLeaderboard:
+    def test_ranking(self):
+        board = InMemoryLeaderboard()
+        quiz_id = uuid.uuid4()
+        board.add(quiz_id, "a", 3)
+        board.add(quiz_id, "b", 5)
+        board.add(quiz_id, "c", 1)
+        board.add(quiz_id, "c", 6)
+
+        assert board.top(quiz_id, 2) == [("c", 7), ("b", 5)]
+        assert board.rank(quiz_id, "a") == (3, 3)
+        assert board.rank(quiz_id, "missing") is None
+        assert board.size(quiz_id) == 3
+
+    def test_replace(self):
+        board = InMemoryLeaderboard()
+        quiz_id = uuid.uuid4()
+        board.add(quiz_id, "a", 3)
+        board.replace(quiz_id, {"b": 1, "c": 2})
+
+        assert board.top(quiz_id, 10) == [("c", 2), ("b", 1)]
+        assert board.rank(quiz_id, "a") is None
+
+
+class TestAnnouncements:
+    def test_changes_announced_once_per_interval(self, monkeypatch, django_capture_on_commit_callbacks):
+        monkeypatch.setattr(leaderboard, "LEADERBOARD_PUSH_RATE", 10)
+        sent = []
+        monkeypatch.setattr(leaderboard, "send_to_groups", sent.extend)
+        quiz_id = uuid.uuid4()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            for index in range(5):
+                record_score(quiz_id, f"participant{index}", index)
+        assert len(sent) == 1
+
+        # The changes after the first one, in one trailing announcement
+        time.sleep(0.3)
+        assert len(sent) == 2
+        assert get_leaderboard().size(quiz_id) == 5
+
+
+class TestLeaderboardScoring:
+    @pytest.fixture
+    def scored_quiz(self, quiz_factory, question_factory, choice_factory, user_factory, attempt_factory,
+                    django_capture_on_commit_callbacks):
+        quiz = quiz_factory()
+        questions = []
+        for order in range(2):
+            question = question_factory(quiz=quiz, order=order, points=order + 1)
+            questions.append((question, choice_factory(question=question, is_correct=True),
+                              choice_factory(question=question, order=1)))
+
+        attempts = []
+        with django_capture_on_commit_callbacks(execute=True):
+            for index in range(3):
+                participant = user_factory(username=f"board{index}", email=f"board{index}@test.com")
+                attempt = attempt_factory(quiz=quiz, participant=participant)
+                # Participant n answers the first n questions correctly
+                submit_answers(attempt, [(q.id, (right if n < index else wrong).id)
+                                         for n, (q, right, wrong) in enumerate(questions)])
+                attempts.append(attempt)
+        return quiz, questions, attempts
+
+    def test_submissions_update_board(self, scored_quiz):
+        quiz, _, attempts = scored_quiz
+
+        snapshot = leaderboard_snapshot(quiz.id)
+        assert [entry["score"] for entry in snapshot] == [3, 1, 0]
+        assert snapshot[0]["participant"]["username"] == "board2"
+        assert get_leaderboard().rank(quiz.id, attempts[1].participant_id) == (2, 1)
+
+    def test_regrade_rebuilds_board(self, scored_quiz, django_capture_on_commit_callbacks):
+        quiz, questions, attempts = scored_quiz
+        with django_capture_on_commit_callbacks(execute=True):
+            question = questions[1][0]
+            question.points = 10
+            question.save()
+
+        assert get_leaderboard().rank(quiz.id, attempts[2].participant_id) == (1, 11)
+        assert get_leaderboard().rank(quiz.id, attempts[0].participant_id) == (3, 0)
+
+    def test_deletions_rebuild_board_once(self, scored_quiz, monkeypatch, django_capture_on_commit_callbacks):
+        quiz, _, attempts = scored_quiz
+        rebuilds = []
+        monkeypatch.setattr("quiz.signals.rebuild_leaderboard", rebuilds.append)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                for attempt in attempts[1:]:
+                    attempt.delete()
+
+        assert rebuilds == [quiz.id]
+
+    def test_rebuild_sums_attempts(self, scored_quiz, attempt_factory, django_capture_on_commit_callbacks):
+        quiz, questions, attempts = scored_quiz
+        participant = attempts[1].participant
+        with django_capture_on_commit_callbacks(execute=True):
+            submit_answers(attempt_factory(quiz=quiz, participant=participant),
+                           [(q.id, right.id) for q, right, _ in questions])
+        incremental = get_leaderboard().rank(quiz.id, participant.id)
+
+        rebuild_leaderboard(quiz.id)
+
+        assert incremental == get_leaderboard().rank(quiz.id, participant.id) == (1, 4)
@@ -0,0 +1,121 @@
+import pytest
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+
+from quiz.leaderboard import get_leaderboard
+from quiz.grading import QueuedAnswer, get_answer_key, ingest_answers
+from quiz.live import AnswerBuffer
+from quiz.models import Answer, Attempt, ChoiceStats, Quiz, QuizStats
+from quiz.stats import rebuild_quiz_stats, with_stats
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def live_quiz(quiz_factory, question_factory, choice_factory, user_factory, attempt_factory):
+    quiz = quiz_factory()
+    questions = []
+    for order, points in enumerate([1, 2]):
+        question = question_factory(quiz=quiz, order=order, points=points)
+        right = choice_factory(question=question, text="Right", is_correct=True, order=0)
+        wrong = choice_factory(question=question, text="Wrong", order=1)
+        questions.append((question.pk, right.pk, wrong.pk))
+    attempts = [
+        attempt_factory(quiz=quiz, participant=user_factory(username=name, email=f"{name}@test.com"))
+        for name in ("first", "second")
+    ]
+    return quiz, questions, attempts
+
+
+def live_answer(attempt, question_id, choice_id) -> QueuedAnswer:
+    return QueuedAnswer(attempt.pk, attempt.quiz_id, attempt.participant_id, question_id, choice_id)
+
+
+def test_ingest_answers(live_quiz, django_capture_on_commit_callbacks):
+    quiz, [(q1, right1, wrong1), (q2, right2, _)], [first, second] = live_quiz
+
+    with django_capture_on_commit_callbacks(execute=True):
+        result = ingest_answers([
+            live_answer(first, q1, right1),
+            live_answer(first, q2, right2),
+            live_answer(second, q1, wrong1),
+            # Answered twice, the first one counts
+            live_answer(second, q1, right1),
+        ])
+
+    assert result == (3, 2, 1)
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert (first.score, first.status) == (3, Attempt.COMPLETED)
+    assert (second.score, second.status) == (0, Attempt.IN_PROGRESS)
+    assert Answer.objects.get(attempt=second).selected_choice_id == wrong1
+
+    stats = with_stats(Quiz.objects.filter(pk=quiz.pk)).get()
+    assert (stats.stats_in_progress_attempts, stats.stats_completed_attempts, stats.stats_score_sum) == (1, 1, 3)
+    counts = {row.choice_id: row.answer_count for row in ChoiceStats.objects.filter(question__quiz=quiz)}
+    assert (counts[right1], counts[wrong1], counts[right2]) == (1, 1, 1)
+    assert get_leaderboard().top(quiz.pk, 2)[0] == (str(first.participant_id), 3)
+
+    # Written already, and the attempt is complete
+    assert ingest_answers([live_answer(first, q1, wrong1)]) == (0, 0, 0)
+
+
+def test_ingest_completes_attempts_together(live_quiz, user_factory, attempt_factory):
+    quiz, [(q1, right1, wrong1), (q2, right2, _)], attempts = live_quiz
+    attempts += [attempt_factory(quiz=quiz, participant=user_factory(username=f"late{index}",
+                                                                     email=f"late{index}@test.com"))
+                 for index in range(2)]
+
+    def ingest(batch):
+        with CaptureQueriesContext(connection) as queries:
+            # Every other attempt gets the first question wrong
+            ingest_answers([answer for index, attempt in enumerate(batch) for answer in (
+                live_answer(attempt, q1, (right1, wrong1)[index % 2]), live_answer(attempt, q2, right2))])
+        return len(queries)
+
+    get_answer_key(quiz.pk)
+    # As many statements however many attempts complete
+    assert ingest(attempts[:1]) == ingest(attempts[1:])
+
+    def counters():
+        quiz_stats = QuizStats.objects.filter(quiz=quiz).aggregate(
+            Sum("in_progress_attempts"), Sum("completed_attempts"), Sum("score_sum"), Sum("score_squares_sum"))
+        choice_stats = sorted(ChoiceStats.objects.filter(question__quiz=quiz).values_list("choice_id").annotate(
+            Sum("answer_count"), Sum("completed_answer_count"), Sum("completed_score_sum")))
+        return quiz_stats, [row for row in choice_stats if any(row[1:])]
+
+    incremental = counters()
+    assert incremental[0]["completed_attempts__sum"] == 4
+    rebuild_quiz_stats(quiz.pk)
+    assert counters() == incremental
+
+
+def test_answer_buffer(live_quiz):
+    _, [(q1, right1, _), _], [first, second] = live_quiz
+    # Flushed by hand only
+    buffer = AnswerBuffer(interval=3600, max_size=1)
+
+    assert buffer.add(live_answer(first, q1, right1))
+    assert not buffer.add(live_answer(second, q1, right1))
+    buffer.flush()
+
+    assert buffer.metrics() == {
+        "buffered": 1, "rejected": 1, "written": 1, "failed": 0, "dead_lettered": 0, "flushes": 1, "backlog": 0,
+    }
+    assert Answer.objects.filter(attempt=first).exists()
+
+
+def test_answer_buffer_sets_aside_answers_turned_down(live_quiz):
+    _, [(q1, right1, _), (q2, right2, _)], [first, second] = live_quiz
+    buffer = AnswerBuffer(interval=3600)
+    poison = live_answer(first, q2 + 0.5, right2)
+    for answer in (live_answer(first, q1, right1), poison, live_answer(second, q1, right1)):
+        buffer.add(answer)
+
+    buffer.flush()
+
+    assert Answer.objects.filter(question_id=q1).count() == 2
+    assert list(buffer.dead_letters) == [poison]
+    metrics = buffer.metrics()
+    assert (metrics["written"], metrics["dead_lettered"], metrics["backlog"]) == (2, 1, 0)
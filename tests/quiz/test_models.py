@@ -1,7 +1,13 @@
+import threading
+from datetime import timedelta
+
 import pytest
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
+from django.utils import timezone
 
-from quiz.models import Invitation, Attempt, Answer
+from quiz.models import Invitation, Attempt, Answer, Quiz
+from quiz.stats import rebuild_quiz_stats, with_stats
 
 pytestmark = pytest.mark.django_db
 
@@ -25,6 +31,60 @@ class TestQuizModel:
         question_factory(quiz=quiz, order=1)
         assert quiz.total_questions == 2
 
+    def test_totals_follow_question_changes(self, quiz_factory, question_factory):
+        quiz = quiz_factory()
+        first = question_factory(quiz=quiz, points=2, order=0)
+        second = question_factory(quiz=quiz, points=3, order=1)
+
+        first.points = 5
+        first.save()
+        second.delete()
+
+        quiz.refresh_from_db()
+        assert quiz.total_questions == 1
+        assert quiz.max_score == 5
+
+    def test_content_version_follows_questions_and_choices(self, quiz_factory, question_factory, choice_factory):
+        quiz = quiz_factory()
+        question = question_factory(quiz=quiz)
+        choice = choice_factory(question=question)
+        choice.delete()
+
+        quiz.refresh_from_db()
+        assert quiz.content_version == 4
+
+    def test_totals_read_without_queries(self, quiz_factory, question_factory, django_assert_num_queries):
+        quiz = quiz_factory()
+        question_factory(quiz=quiz, points=2, order=0)
+        with django_assert_num_queries(0):
+            assert quiz.max_score == 2
+            assert quiz.total_questions == 1
+
+    def test_is_active_between_start_and_end(self, quiz_factory):
+        quiz = quiz_factory()
+        quiz.status = Quiz.ACTIVE
+        now = timezone.now()
+        assert quiz.is_active
+
+        quiz.end_time = now + timedelta(hours=1)
+        assert quiz.is_active
+        quiz.end_time = now - timedelta(seconds=1)
+        assert not quiz.is_active
+        quiz.start_time, quiz.end_time = now + timedelta(hours=1), None
+        assert not quiz.is_active
+
+    def test_published_before_start_is_scheduled(self, quiz_factory):
+        quiz = quiz_factory()
+        quiz.status = Quiz.ACTIVE
+        quiz.start_time = timezone.now() + timedelta(hours=1)
+        quiz.save()
+        assert quiz.status == Quiz.SCHEDULED
+
+        quiz.status = Quiz.ACTIVE
+        quiz.start_time = timezone.now() - timedelta(hours=1)
+        quiz.save()
+        assert quiz.status == Quiz.ACTIVE
+
 
 class TestQuestionModel:
     def test_question_creation(self, quiz_factory, question_factory):
@@ -117,3 +177,98 @@ class TestAnswerModel:
         assert answer.attempt == attempt
         assert answer.question == question
         assert answer.selected_choice == choice
+
+
+class TestQuizStats:
+    def stats(self, quiz):
+        return with_stats(Quiz.objects.filter(pk=quiz.pk)).get()
+
+    def test_stats_follow_attempt_transitions(self, quiz_factory, user_factory, attempt_factory):
+        quiz = quiz_factory()
+        attempts = [
+            attempt_factory(quiz=quiz, participant=user_factory(username=f"stat{i}", email=f"stat{i}@test.com"))
+            for i in range(3)
+        ]
+        for attempt, score in zip(attempts[:2], [2, 6]):
+            attempt.score = score
+            attempt.status = Attempt.COMPLETED
+            attempt.save()
+
+        stats = self.stats(quiz)
+        assert stats.stats_in_progress_attempts == 1
+        assert stats.stats_completed_attempts == 2
+        assert stats.stats_score_sum == 8
+        assert stats.stats_score_squares_sum == 40
+        assert (stats.stats_min_score, stats.stats_max_score) == (2, 6)
+
+        # Lowering a completed score falls back to a rebuild
+        attempts[1].score = 1
+        attempts[1].save()
+        stats = self.stats(quiz)
+        assert (stats.stats_min_score, stats.stats_max_score) == (1, 2)
+
+    def test_rebuild_matches_incremental_stats(self, quiz_factory, user_factory, attempt_factory):
+        quiz = quiz_factory()
+        for i in range(5):
+            attempt = attempt_factory(quiz=quiz, participant=user_factory(username=f"re{i}", email=f"re{i}@test.com"))
+            attempt.score = i
+            attempt.status = Attempt.COMPLETED if i % 2 else Attempt.EXPIRED
+            attempt.save()
+        incremental = self.stats(quiz)
+
+        rebuild_quiz_stats(quiz.id)
+
+        rebuilt = self.stats(quiz)
+        columns = [name for name in vars(rebuilt) if name.startswith("stats_")]
+        assert [getattr(rebuilt, c) for c in columns] == [getattr(incremental, c) for c in columns]
+
+    def test_deletions_rebuild_once_per_quiz(self, quiz_factory, user_factory, attempt_factory, monkeypatch,
+                                             django_capture_on_commit_callbacks):
+        quiz = quiz_factory()
+        for i in range(3):
+            attempt = attempt_factory(quiz=quiz, participant=user_factory(username=f"del{i}", email=f"del{i}@test.com"))
+            attempt.score, attempt.status = i, Attempt.COMPLETED
+            attempt.save()
+        rebuilds = []
+        monkeypatch.setattr("quiz.stats.rebuild_quiz_stats", rebuilds.append)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            with transaction.atomic():
+                for attempt in Attempt.objects.filter(quiz=quiz):
+                    attempt.delete()
+
+        assert rebuilds == [quiz.id]
+
+    # The writer and the rebuild run on connections of their own
+    @pytest.mark.django_db(transaction=True)
+    def test_rebuild_waits_for_recorded_deltas(self, quiz_factory, user_factory, attempt_factory):
+        quiz = quiz_factory()
+        attempt = attempt_factory(quiz=quiz, participant=user_factory(username="racing", email="racing@test.com"))
+        recorded, release = threading.Event(), threading.Event()
+
+        def complete():
+            with transaction.atomic():
+                attempt.status, attempt.score = Attempt.COMPLETED, 3
+                attempt.save()
+                recorded.set()
+                release.wait(5)
+            connection.close()
+
+        def rebuild():
+            rebuild_quiz_stats(quiz.id)
+            connection.close()
+
+        writer = threading.Thread(target=complete)
+        writer.start()
+        assert recorded.wait(5)
+        rebuilder = threading.Thread(target=rebuild)
+        rebuilder.start()
+        rebuilder.join(0.5)
+        # Held off until the change and its delta commit together
+        assert rebuilder.is_alive()
+        release.set()
+        writer.join(5)
+        rebuilder.join(5)
+
+        stats = self.stats(quiz)
+        assert (stats.stats_in_progress_attempts, stats.stats_completed_attempts, stats.stats_score_sum) == (0, 1, 3)
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+
+import pytest
+from django.db import transaction
+
+from quiz import notifications
+from quiz.models import Notification
+from quiz.notifications import GroupMessage, NotificationDispatcher, inbox, mark_read, notify_users
+from quiz.presence import get_presence
+
+
+class FakeChannelLayer:
+    def __init__(self, failures=0, gate=None):
+        self.failures = failures
+        self.gate = gate
+        self.started = threading.Event()
+        self.sent = []
+
+    async def group_send(self, group, event):
+        self.started.set()
+        if self.gate is not None:
+            while not self.gate.is_set():
+                await asyncio.sleep(0.01)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Redis unavailable")
+        self.sent.append((group, event))
+
+
+@pytest.fixture
+def channel_layer(monkeypatch):
+    def install(**kwargs):
+        layer = FakeChannelLayer(**kwargs)
+        monkeypatch.setattr(notifications, "get_channel_layer", lambda: layer)
+        return layer
+    return install
+
+
+@pytest.mark.django_db
+def test_notifications_wait_for_commit(channel_layer, user_factory, django_capture_on_commit_callbacks):
+    layer = channel_layer()
+    dispatcher = notifications.get_dispatcher()
+    user = user_factory(username="present", email="present@test.com")
+    get_presence().add(user.id, "channel")
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        notify_users([(user.id, {"type": "invitation"})])
+    assert len(callbacks) == 1
+    dispatcher.flush()
+    assert layer.sent == []
+
+    callbacks[0]()
+    dispatcher.flush()
+    notification = Notification.objects.get(recipient=user)
+    assert layer.sent == [(f"user_{user.id}", {
+        "type": "invitation_message", "content": {"type": "invitation", "notification_id": notification.id},
+    })]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rolled_back_notifications_are_not_sent(channel_layer, user_factory):
+    layer = channel_layer()
+    user = user_factory(username="rolledback", email="rolledback@test.com")
+    get_presence().add(user.id, "channel")
+    with pytest.raises(RuntimeError), transaction.atomic():
+        notify_users([(user.id, {"type": "invitation"})])
+        raise RuntimeError
+    notifications.get_dispatcher().flush()
+    assert layer.sent == []
+    assert not Notification.objects.filter(recipient=user).exists()
+
+
+@pytest.mark.django_db
+def test_every_notification_is_kept(channel_layer, user_factory, django_capture_on_commit_callbacks):
+    layer = channel_layer()
+    online = user_factory(username="online", email="online@test.com")
+    offline = user_factory(username="offline", email="offline@test.com")
+    get_presence().add(online.id, "channel")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        notify_users([(online.id, {"type": "invitation", "n": 1}), (offline.id, {"type": "invitation", "n": 2})])
+    notifications.get_dispatcher().flush()
+
+    sent = Notification.objects.get(recipient=online)
+    assert layer.sent == [(f"user_{online.id}", {
+        "type": "invitation_message", "content": {"type": "invitation", "n": 1, "notification_id": sent.id},
+    })]
+    # What a socket missed is replayed
+    assert inbox(online.id)["notifications"] == [{"type": "invitation", "n": 1, "notification_id": sent.id}]
+    assert list(Notification.objects.filter(recipient=offline).values_list("content", flat=True)) == [
+        {"type": "invitation", "n": 2}
+    ]
+
+
+@pytest.mark.django_db
+def test_inbox_replay(user_factory, monkeypatch):
+    monkeypatch.setattr(notifications, "INBOX_REPLAY_SIZE", 2)
+    user = user_factory(username="reader", email="reader@test.com")
+    ids = [Notification.objects.create(recipient=user, content={"n": n}).id for n in range(3)]
+
+    page = inbox(user.id)
+    assert page == {
+        "notifications": [{"n": 0, "notification_id": ids[0]}, {"n": 1, "notification_id": ids[1]}],
+        "cursor": ids[1], "more": True, "unread": 3,
+    }
+    assert inbox(user.id, page["cursor"])["notifications"] == [{"n": 2, "notification_id": ids[2]}]
+
+    assert mark_read(user.id, ids[1]) == 1
+    # Without a cursor only the unread ones, with one everything after it
+    assert inbox(user.id)["notifications"] == [{"n": 2, "notification_id": ids[2]}]
+    assert len(inbox(user.id, ids[0])["notifications"]) == 2
+    assert inbox(user.id, ids[2]) == {"notifications": [], "cursor": ids[2], "more": False, "unread": 1}
+
+
+def test_failed_sends_are_retried(channel_layer):
+    layer = channel_layer(failures=2)
+    dispatcher = NotificationDispatcher()
+
+    dispatcher.enqueue([GroupMessage("user_1", {"type": "invitation_message"})])
+    dispatcher.flush()
+
+    assert len(layer.sent) == 1
+    assert dispatcher.metrics() == {"queued": 1, "sent": 1, "retried": 2, "failed": 0, "dropped": 0, "backlog": 0}
+
+
+def test_full_queue_drops_messages(channel_layer):
+    gate = threading.Event()
+    layer = channel_layer(gate=gate)
+    dispatcher = NotificationDispatcher(queue_size=1)
+
+    dispatcher.enqueue([GroupMessage("user_1", {"type": "invitation_message"})])
+    layer.started.wait(timeout=5)
+    # The first message is being sent, one more fits in the queue
+    dispatcher.enqueue([GroupMessage(f"user_{index}", {"type": "invitation_message"}) for index in range(2, 5)])
+    assert dispatcher.metrics()["dropped"] == 2
+
+    gate.set()
+    dispatcher.flush()
+    assert len(layer.sent) == 2
@@ -0,0 +1,36 @@
+import threading
+import uuid
+
+from quiz import payloads
+
+
+def test_builds_lock_per_payload(monkeypatch):
+    """
+    Requests for one payload render it once, while another payload builds alongside.
+    """
+    slow, fast = f"slow-{uuid.uuid4()}", f"fast-{uuid.uuid4()}"
+    release = threading.Event()
+    renders = []
+
+    def render(quiz_id):
+        renders.append(quiz_id)
+        if quiz_id == slow:
+            assert release.wait(5)
+        return quiz_id.encode(), 60
+
+    monkeypatch.setattr(payloads, "render_participant_payload", render)
+    results = []
+    waiting = [threading.Thread(target=lambda: results.append(payloads.participant_payload(slow, "1")))
+               for _ in range(3)]
+    for thread in waiting:
+        thread.start()
+
+    # Not held up by the slow build
+    assert payloads.participant_payload(fast, "1") == fast.encode()
+
+    release.set()
+    for thread in waiting:
+        thread.join(5)
+    assert results == [slow.encode()] * 3
+    assert renders.count(slow) == 1
+    assert not payloads._build_locks
@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from quiz import presence
+from quiz.presence import PRESENCE_TTL, InMemoryPresence, RedisPresence
+
+
+@pytest.fixture(params=["redis", "memory"])
+def backend(request, settings):
+    if request.param == "memory":
+        yield InMemoryPresence()
+        return
+    backend = RedisPresence(settings.REDIS_URL)
+    yield backend
+    backend.redis.delete(*(backend.key(user_id) for user_id in ("alice", "bob")))
+
+
+def test_each_socket_counts(backend):
+    backend.add("alice", "tab1")
+    backend.add("alice", "tab2")
+    assert backend.online(["alice", "bob"]) == {"alice"}
+
+    backend.remove("alice", "tab1")
+    assert backend.online(["alice", "bob"]) == {"alice"}
+    backend.remove("alice", "tab2")
+    assert backend.online(["alice", "bob"]) == set()
+
+
+def test_sockets_expire_without_heartbeat(backend, monkeypatch):
+    backend.add("alice", "tab1")
+    backend.add("bob", "tab1")
+    later = time.time() + PRESENCE_TTL + 1
+    monkeypatch.setattr(presence.time, "time", lambda: later)
+    backend.add("bob", "tab1")
+
+    assert backend.online(["alice", "bob"]) == {"bob"}
+
+
+def test_unreachable_redis_means_offline():
+    backend = RedisPresence("redis://127.0.0.1:1")
+    assert backend.online(["alice"]) == set()
@@ -0,0 +1,145 @@
+"""
+Query plan regression tests for the hot lookups.
+
+The tables are seeded to the proportions of a long running deployment: many users, quizzes,
+attempts and invitations, each user or quiz owning a small slice of them, mostly finished. With
+the statistics of ANALYZE the planner then picks the plan it would in production, so a query
+losing its index shows up as a Seq Scan or as another index.
+"""
+import pytest
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from quiz.models import Attempt, Choice, Invitation, Question, Quiz, QuizUser
+
+pytestmark = pytest.mark.django_db
+
+USERS = 1000
+QUIZZES = 1000
+# Attempts and invitations per quiz
+PARTICIPANTS = 25
+
+QUESTIONS_SQL = f"""
+    INSERT INTO {Question._meta.db_table} (quiz_id, text, question_type, "order", points)
+    SELECT quiz.id, '?', {Question.MULTI}, question_order, 1
+    FROM unnest(%s::uuid[]) quiz(id), generate_series(0, 3) question_order
+"""
+
+CHOICES_SQL = f"""
+    INSERT INTO {Choice._meta.db_table} (question_id, text, is_correct, "order")
+    SELECT question.id, '!', choice_order = 0, choice_order
+    FROM {Question._meta.db_table} question, generate_series(0, 3) choice_order
+"""
+
+# Participant k of quiz n is user (7n + 40k) mod USERS, one in ten attempts/invitations still open
+PARTICIPANTS_SQL = f"""
+    FROM unnest(%(quizzes)s::uuid[]) WITH ORDINALITY quiz(id, n)
+    CROSS JOIN generate_series(0, {PARTICIPANTS - 1}) k
+    JOIN unnest(%(users)s::uuid[]) WITH ORDINALITY participant(id, n)
+      ON participant.n = mod(quiz.n * 7 + k * 40, {USERS}) + 1
+"""
+
+ATTEMPTS_SQL = f"""
+    INSERT INTO {Attempt._meta.db_table} (id, created_at, modified_at, quiz_id, participant_id, status, score)
+    SELECT gen_random_uuid(), now() - (quiz.n * {PARTICIPANTS} + k) * interval '1 minute', now(),
+           quiz.id, participant.id,
+           CASE WHEN mod(quiz.n + k, 10) = 0 THEN {Attempt.IN_PROGRESS} ELSE {Attempt.COMPLETED} END, 0
+    {PARTICIPANTS_SQL}
+"""
+
+INVITATIONS_SQL = f"""
+    INSERT INTO {Invitation._meta.db_table} (id, created_at, modified_at, quiz_id, participant_id, invited_by_id, status)
+    SELECT gen_random_uuid(), now() - (quiz.n * {PARTICIPANTS} + k) * interval '1 minute', now(),
+           quiz.id, participant.id, %(owner)s,
+           CASE WHEN mod(quiz.n + k, 10) = 0 THEN {Invitation.PENDING} ELSE {Invitation.ACCEPTED} END
+    {PARTICIPANTS_SQL}
+"""
+
+
+def quiz_status(index: int, now) -> dict:
+    """
+    A few quizzes scheduled or running, the rest closed.
+    """
+    if index % 100 == 1:
+        return {"status": Quiz.SCHEDULED, "start_time": now + timezone.timedelta(hours=index)}
+    if index % 50 == 2:
+        return {"status": Quiz.ACTIVE, "end_time": now + timezone.timedelta(hours=index)}
+    return {"status": Quiz.CLOSED, "end_time": now - timezone.timedelta(hours=index)}
+
+
+@pytest.fixture
+def seeded():
+    now = timezone.now()
+    owner = QuizUser.objects.create(username="planner", email="plan@ner.com")
+    users = QuizUser.objects.bulk_create(
+        QuizUser(username=f"plan{index}", email=f"plan{index}@test.com") for index in range(USERS)
+    )
+    # The owner has one quiz in every hundred, the others belong to users
+    quizzes = Quiz.objects.bulk_create(
+        Quiz(owner=owner if index % 100 == 0 else users[index % USERS], title=f"Plan {index}",
+             **quiz_status(index, now))
+        for index in range(QUIZZES)
+    )
+    quiz_ids = [quiz.pk for quiz in quizzes]
+    params = {"quizzes": quiz_ids, "users": [user.pk for user in users], "owner": owner.pk}
+
+    with connection.cursor() as cursor:
+        cursor.execute(QUESTIONS_SQL, [quiz_ids])
+        cursor.execute(CHOICES_SQL)
+        cursor.execute(ATTEMPTS_SQL, params)
+        cursor.execute(INVITATIONS_SQL, params)
+        for model in (QuizUser, Quiz, Question, Choice, Attempt, Invitation):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+    return owner, users[0], quizzes[0]
+
+
+def assert_uses_index(queryset, index_name):
+    plan = queryset.explain()
+    assert "Seq Scan" not in plan, plan
+    assert index_name in plan, plan
+
+
+def test_attempts_of_participant(seeded):
+    _, participant, _ = seeded
+    queryset = Attempt.objects.filter(participant=participant).order_by("-created_at", "-id")[:20]
+    assert_uses_index(queryset, "attempt_participant_idx")
+
+
+def test_attempts_of_quiz_by_status(seeded):
+    _, _, quiz = seeded
+    assert_uses_index(quiz.attempts.filter(status=Attempt.IN_PROGRESS), "attempt_quiz_status_idx")
+
+
+def test_pending_invitations_of_participant(seeded):
+    _, participant, _ = seeded
+    queryset = Invitation.objects.filter(participant=participant, status=Invitation.PENDING).order_by(
+        "-created_at", "-id"
+    )[:20]
+    assert_uses_index(queryset, "invitation_pending_idx")
+
+
+def test_quizzes_of_owner(seeded):
+    owner, _, _ = seeded
+    queryset = Quiz.objects.filter(owner=owner).order_by("-created_at", "-id")[:20]
+    assert_uses_index(queryset, "quiz_owner_created_idx")
+
+
+def test_questions_of_quiz(seeded):
+    _, _, quiz = seeded
+    # A handful of rows, found by the foreign key's index and sorted in memory
+    assert_uses_index(quiz.questions.order_by("order"), "quiz_question_quiz_id")
+
+
+def test_correct_choice(seeded):
+    _, _, quiz = seeded
+    question = quiz.questions.first()
+    assert_uses_index(question.choices.filter(is_correct=True).order_by()[:1], "unique_correct_choice_per_question")
+
+
+def test_scheduler_deadlines(seeded):
+    until = timezone.now()
+    starts = Quiz.objects.filter(Q(start_time__isnull=True) | Q(start_time__lte=until), status=Quiz.SCHEDULED)
+    assert_uses_index(starts, "quiz_scheduled_start_idx")
+    ends = Quiz.objects.filter(status__in=[Quiz.SCHEDULED, Quiz.ACTIVE], end_time__lte=until)
+    assert_uses_index(ends, "quiz_open_end_idx")
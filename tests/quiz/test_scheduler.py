@@ -0,0 +1,100 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from quiz import scheduler
+from quiz.leaderboard import group_name
+from quiz.models import Attempt, Invitation, Quiz
+from quiz.scheduler import DeadlineScheduler, apply_deadlines
+from quiz.stats import with_stats
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def owner(user_factory):
+    return user_factory(username="scheduler_owner", email="scheduler_owner@test.com")
+
+
+@pytest.fixture
+def make_quiz(owner):
+    def make(title, status, start_time=None, end_time=None):
+        return Quiz.objects.create(owner=owner, title=title, status=status, start_time=start_time, end_time=end_time)
+    return make
+
+
+@pytest.fixture
+def events(monkeypatch):
+    sent = []
+    monkeypatch.setattr(scheduler, "send_to_groups", sent.extend)
+    return sent
+
+
+def test_apply_deadlines(make_quiz, user_factory, attempt_factory, invitation_factory, owner, events):
+    now = timezone.now()
+    opening = make_quiz("Opening", Quiz.SCHEDULED, start_time=now - timedelta(seconds=1))
+    waiting = make_quiz("Waiting", Quiz.SCHEDULED, start_time=now + timedelta(hours=1))
+    closing = make_quiz("Closing", Quiz.ACTIVE, end_time=now - timedelta(seconds=1))
+    running = make_quiz("Running", Quiz.ACTIVE, end_time=now + timedelta(hours=1))
+    late, done, invited = [user_factory(username=name, email=f"{name}@test.com") for name in ("late", "done", "invited")]
+    attempt_factory(quiz=closing, participant=late)
+    attempt_factory(quiz=closing, participant=done, status=Attempt.COMPLETED)
+    invitation_factory(quiz=closing, participant=invited, invited_by=owner)
+    open_attempt = attempt_factory(quiz=running, participant=late)
+
+    # Quizzes other tests left behind are due as well, only this test's are looked at
+    quiz_ids = {opening.pk, waiting.pk, closing.pk, running.pk}
+
+    def own(result):
+        return tuple([quiz_id for quiz_id in moved if quiz_id in quiz_ids] for moved in (result.opened, result.closed))
+
+    result = apply_deadlines(now)
+
+    assert own(result) == ([opening.pk], [closing.pk])
+    assert dict(Quiz.objects.filter(pk__in=quiz_ids).values_list("pk", "status")) == {
+        opening.pk: Quiz.ACTIVE, waiting.pk: Quiz.SCHEDULED, closing.pk: Quiz.CLOSED, running.pk: Quiz.ACTIVE,
+    }
+    assert sorted(closing.attempts.values_list("status", flat=True)) == [Attempt.COMPLETED, Attempt.EXPIRED]
+    assert closing.invitations.get().status == Invitation.EXPIRED
+    open_attempt.refresh_from_db()
+    assert open_attempt.status == Attempt.IN_PROGRESS
+
+    stats = with_stats(Quiz.objects.filter(pk=closing.pk)).get()
+    assert (stats.stats_in_progress_attempts, stats.stats_completed_attempts, stats.stats_expired_attempts) == (0, 1, 1)
+
+    groups = {group_name(quiz_id) for quiz_id in quiz_ids}
+    assert [(message.group, message.event["status"]) for message in events if message.group in groups] == [
+        (group_name(opening.pk), Quiz.ACTIVE), (group_name(closing.pk), Quiz.CLOSED),
+    ]
+    # Nothing left to do
+    assert apply_deadlines(now) == ([], [], 0, 0)
+
+
+def test_scheduler_wakes_at_deadlines(make_quiz, events):
+    now = timezone.now()
+    opening = make_quiz("Opening", Quiz.SCHEDULED, start_time=now + timedelta(seconds=10))
+    closing = make_quiz("Closing", Quiz.ACTIVE, end_time=now + timedelta(seconds=20))
+    make_quiz("Later", Quiz.ACTIVE, end_time=now + timedelta(hours=2))
+    deadlines = DeadlineScheduler(horizon=3600, reload_interval=60)
+
+    assert deadlines.run_due(now) is None
+    # Beyond the horizon until a later reload
+    assert len(deadlines.deadlines) == 2
+    assert deadlines.seconds_until_next(now) == 10
+
+    assert deadlines.run_due(now + timedelta(seconds=10)).opened == [opening.pk]
+    assert deadlines.seconds_until_next(now + timedelta(seconds=10)) == 10
+    assert deadlines.run_due(now + timedelta(seconds=20)).closed == [closing.pk]
+    assert deadlines.seconds_until_next(now + timedelta(seconds=20)) == 40
+
+
+def test_run_scheduler_once(make_quiz):
+    make_quiz("Closing", Quiz.ACTIVE, end_time=timezone.now() - timedelta(seconds=1))
+    out = StringIO()
+
+    call_command("run_scheduler", "--once", stdout=out)
+
+    assert "Opened 0 quizzes, closed 1" in out.getvalue()
@@ -1,6 +1,17 @@
+import gzip
+import json
+
 import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.fields import DateTimeField
+
+from quiz.grading import submit_answers
+from quiz.notifications import get_dispatcher
+from quiz.models import Answer, Attempt, Invitation, Notification, Quiz
+from quiz.presence import get_presence
 
 pytestmark = pytest.mark.django_db
 
@@ -16,6 +27,19 @@ class TestQuizViews:
 
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data["results"]) == 2
+        # Bookkeeping fields stay internal
+        assert not {"question_count", "points_total", "content_version"} & set(response.data["results"][0])
+
+    def test_list_quizzes_by_status(self, authenticated_client, quiz_factory):
+        client, user = authenticated_client
+        quiz_factory(owner=user, title="Draft")
+        Quiz.objects.filter(pk=quiz_factory(owner=user, title="Closed").pk).update(status=Quiz.CLOSED)
+
+        response = client.get(reverse("owned_quizzes"), {"status": "closed"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [quiz["title"] for quiz in response.data["results"]] == ["Closed"]
+        assert len(client.get(reverse("owned_quizzes"), {"status": "unknown"}).data["results"]) == 2
 
     def test_create_quiz(self, authenticated_client):
         client, user = authenticated_client
@@ -39,8 +63,91 @@ class TestQuizViews:
         response = client.get(url)
 
         assert response.status_code == status.HTTP_200_OK
-        assert response.data["title"] == quiz.title
-        assert response.data["description"] == quiz.description
+        data = response.json()
+        assert data["title"] == quiz.title
+        assert data["description"] == quiz.description
+
+
+class TestPlayableQuizViews:
+    def test_participant_quiz_detail(self, authenticated_client, quiz_factory, question_factory, choice_factory,
+                                     attempt_factory, django_assert_num_queries):
+        client, user = authenticated_client
+        quiz = quiz_factory()
+        question = question_factory(quiz=quiz)
+        choice = choice_factory(question=question, text="Right", is_correct=True)
+        attempt_factory(quiz=quiz, participant=user)
+        url = reverse("view_playable_quizzes", kwargs={"pk": quiz.id})
+
+        client.get(url)
+        # Served from the cached payload, only access and version are read
+        with django_assert_num_queries(1):
+            response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_questions"] == 1
+        assert data["questions"][0]["choices"] == [{"id": choice.id, "text": "Right", "order": 0}]
+
+        compressed = client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        assert compressed["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(compressed.content)) == data
+
+        # Editing a choice renders a new version
+        choice.text = "Still right"
+        choice.save()
+        assert client.get(url).json()["questions"][0]["choices"][0]["text"] == "Still right"
+
+    def test_participant_quiz_detail_needs_attempt(self, authenticated_client, quiz_factory):
+        client, _ = authenticated_client
+        quiz = quiz_factory()
+
+        response = client.get(reverse("view_playable_quizzes", kwargs={"pk": quiz.id}))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_playable_quizzes_once(self, authenticated_client, quiz_factory, attempt_factory, user_factory):
+        client, user = authenticated_client
+        quiz = quiz_factory()
+        attempt_factory(quiz=quiz, participant=user)
+        attempt_factory(quiz=quiz, participant=user)
+        attempt_factory(quiz=quiz, participant=user_factory(username="other", email="other@test.com"))
+        quiz_factory(owner=quiz.owner, title="Not invited")
+
+        response = client.get(reverse("list_playable_quizzes"))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["id"] for result in response.json()["results"]] == [str(quiz.id)]
+
+    def test_dashboard(self, authenticated_client, quiz_factory, question_factory, choice_factory, attempt_factory,
+                       user_factory, django_assert_num_queries):
+        client, user = authenticated_client
+        answered = quiz_factory()
+        questions = [question_factory(quiz=answered, order=order, points=2) for order in range(3)]
+        choices = [choice_factory(question=question, is_correct=True) for question in questions]
+        attempt = attempt_factory(quiz=answered, participant=user)
+        submit_answers(attempt, [(questions[0].id, choices[0].id), (questions[1].id, choices[1].id)])
+        fresh = attempt_factory(quiz=quiz_factory(owner=answered.owner, title="Fresh"), participant=user)
+        # Other participants' attempts do not show up nor cost anything
+        for index in range(3):
+            other = user_factory(username=f"other{index}", email=f"other{index}@test.com")
+            attempt_factory(quiz=answered, participant=other)
+
+        url = reverse("participant_dashboard")
+        client.get(url)
+        # The conditional GET validators and the page
+        with django_assert_num_queries(2):
+            response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["id"] for result in response.data["results"]] == [str(fresh.id), str(attempt.id)]
+        entry = response.data["results"][1]
+        assert entry["quiz"]["id"] == str(answered.id)
+        assert entry["status"] == Attempt.IN_PROGRESS
+        assert entry["score"] == 4
+        assert entry["max_score"] == 6
+        assert entry["answered_questions_count"] == 2
+        assert entry["total_questions"] == 3
+        assert response.data["results"][0]["answered_questions_count"] == 0
 
 
 class TestQuestionViews:
@@ -77,6 +184,162 @@ class TestQuestionViews:
         assert len(response.data["choices"]) == 2
 
 
+class TestQuizProgressViews:
+    def test_quiz_progress(self, authenticated_client, quiz_factory, question_factory, user_factory,
+                           attempt_factory, django_assert_max_num_queries):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        question_factory(quiz=quiz, points=4)
+        for index, score in enumerate([1, 3, 4]):
+            participant = user_factory(username=f"progress{index}", email=f"progress{index}@test.com")
+            attempt = attempt_factory(quiz=quiz, participant=participant)
+            attempt.score = score
+            attempt.status = Attempt.COMPLETED
+            attempt.save()
+        attempt_factory(quiz=quiz, participant=user)
+
+        url = reverse("quiz_progress", kwargs={"pk": quiz.id})
+        # Token lookup, validators and the quiz with its statistics, whatever the number of attempts
+        with django_assert_max_num_queries(3):
+            response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["total_attempts"] == 4
+        assert data["average_score"] == 66.67
+        assert data["lowest_score"] == 1
+        assert data["highest_score"] == 4
+        assert {"status": Attempt.COMPLETED, "count": 3} in data["participant_stats"]
+
+
+class TestQuestionAnalyticsViews:
+    def test_question_analytics(self, authenticated_client, quiz_factory, question_factory, choice_factory,
+                                user_factory, attempt_factory, django_assert_max_num_queries):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        easy, hard = question_factory(quiz=quiz, order=0), question_factory(quiz=quiz, order=1)
+        easy_right, easy_wrong = choice_factory(question=easy, is_correct=True), choice_factory(question=easy, order=1)
+        hard_right, hard_wrong = choice_factory(question=hard, is_correct=True), choice_factory(question=hard, order=1)
+        picks = [(easy_right, hard_right), (easy_right, hard_wrong), (easy_right, hard_wrong), (easy_wrong, hard_wrong)]
+        for index, choices in enumerate(picks):
+            participant = user_factory(username=f"analytics{index}", email=f"analytics{index}@test.com")
+            attempt = attempt_factory(quiz=quiz, participant=participant)
+            submit_answers(attempt, [(choice.question_id, choice.id) for choice in choices])
+
+        url = reverse("quiz_question_analytics", kwargs={"pk": quiz.id})
+        with django_assert_max_num_queries(6):
+            response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["completed_attempts"] == 4
+        easy_stats, hard_stats = response.data["questions"]
+        assert easy_stats["answer_count"] == 4
+        assert easy_stats["p_value"] == 0.75
+        assert hard_stats["p_value"] == 0.25
+        assert [choice["count"] for choice in hard_stats["choices"]] == [1, 3]
+        assert easy_stats["discrimination"] > 0
+
+
+# The export reads on a thread of its own, which only sees committed rows
+@pytest.mark.django_db(transaction=True)
+class TestQuizExportViews:
+    def test_export_csv(self, authenticated_client, quiz_factory, question_factory, choice_factory, user_factory,
+                        attempt_factory):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        first, second = question_factory(quiz=quiz, order=0), question_factory(quiz=quiz, order=1)
+        right = choice_factory(question=first, is_correct=True)
+        wrong = choice_factory(question=second)
+        answered = attempt_factory(quiz=quiz, participant=user_factory(username="exported", email="exported@test.com"))
+        submit_answers(answered, [(first.id, right.id), (second.id, wrong.id)])
+        attempt_factory(quiz=quiz, participant=user_factory(username="idle", email="idle@test.com"))
+
+        response = client.get(reverse("quiz_export", kwargs={"pk": quiz.id}), {"format": "csv"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"].startswith("text/csv")
+        assert response["Content-Disposition"] == f'attachment; filename="quiz-{quiz.id}.csv"'
+        header, *rows = b"".join(response).decode().splitlines()
+        assert header == "attempt,participant,username,status,score,started_at,completed_at,question," \
+                         "selected_choice,is_correct,answered_at"
+        exported = sorted(row.split(",")[2:] for row in rows)
+        assert [(row[0], row[5], row[6], row[7]) for row in exported] == [
+            ("exported", str(first.id), str(right.id), "True"),
+            ("exported", str(second.id), str(wrong.id), "False"),
+            ("idle", "", "", ""),
+        ]
+
+    def test_export_ndjson(self, authenticated_client, quiz_factory, question_factory, choice_factory, user_factory,
+                           attempt_factory):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        question = question_factory(quiz=quiz)
+        right = choice_factory(question=question, is_correct=True)
+        attempt = attempt_factory(quiz=quiz, participant=user_factory(username="exported", email="exported@test.com"))
+        submit_answers(attempt, [(question.id, right.id)])
+
+        response = client.get(reverse("quiz_export", kwargs={"pk": quiz.id}), {"format": "ndjson"})
+
+        assert response["Content-Type"].startswith("application/x-ndjson")
+        [row] = [json.loads(line) for line in b"".join(response).splitlines()]
+        assert (row["attempt"], row["username"], row["status"], row["score"]) == (
+            str(attempt.id), "exported", Attempt.COMPLETED, 1,
+        )
+        assert (row["question"], row["selected_choice"], row["is_correct"]) == (question.id, right.id, True)
+        # Timestamps as the serializers of the JSON responses have them
+        answer = Answer.objects.get(attempt=attempt)
+        assert row["answered_at"] == DateTimeField().to_representation(answer.answered_at)
+
+    def test_export_is_for_the_owner(self, authenticated_client, quiz_factory, user_factory):
+        client, _ = authenticated_client
+        quiz = quiz_factory(owner=user_factory(username="owner", email="owner@test.com"))
+
+        response = client.get(reverse("quiz_export", kwargs={"pk": quiz.id}))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestLeaderboardViews:
+    @pytest.fixture
+    def ranked_quiz(self, quiz_factory, question_factory, choice_factory, user_factory, attempt_factory,
+                    django_capture_on_commit_callbacks):
+        quiz = quiz_factory(owner=user_factory(username="boardowner", email="board@own.er"))
+        question = question_factory(quiz=quiz, points=5)
+        right, wrong = choice_factory(question=question, is_correct=True), choice_factory(question=question, order=1)
+        participants = [user_factory(username=f"ranked{index}", email=f"ranked{index}@test.com") for index in range(3)]
+        with django_capture_on_commit_callbacks(execute=True):
+            for participant, choice in zip(participants, [wrong, right, wrong]):
+                submit_answers(attempt_factory(quiz=quiz, participant=participant), [(question.id, choice.id)])
+        return quiz, participants
+
+    def test_leaderboard(self, authenticated_client, ranked_quiz, attempt_factory, django_capture_on_commit_callbacks):
+        client, user = authenticated_client
+        quiz, participants = ranked_quiz
+        with django_capture_on_commit_callbacks(execute=True):
+            attempt_factory(quiz=quiz, participant=user)
+
+        response = client.get(reverse("quiz_leaderboard", kwargs={"pk": quiz.id}), {"limit": 2})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["size"] == 4
+        assert len(response.data["results"]) == 2
+        assert response.data["results"][0]["participant"]["username"] == "ranked1"
+        assert response.data["results"][0]["score"] == 5
+
+        response = client.get(reverse("quiz_leaderboard_rank", kwargs={"pk": quiz.id}))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["score"] == 0
+        assert response.data["rank"] >= 2
+
+    def test_leaderboard_hidden_from_outsiders(self, authenticated_client, ranked_quiz):
+        client, _ = authenticated_client
+        quiz, _ = ranked_quiz
+
+        response = client.get(reverse("quiz_leaderboard", kwargs={"pk": quiz.id}))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 class TestInvitationViews:
     def test_create_invitation(self, authenticated_client, quiz_factory, user_factory):
         client, user = authenticated_client
@@ -95,6 +358,72 @@ class TestInvitationViews:
         assert response.data["participant"] == participant.id
         assert response.data["invited_by"] == user.id
 
+    def test_bulk_create_invitations(self, authenticated_client, quiz_factory, user_factory, invitation_factory,
+                                     django_capture_on_commit_callbacks, django_assert_max_num_queries):
+        client, user = authenticated_client
+        quiz = quiz_factory(owner=user)
+        participants = [user_factory(username=f"cohort{index}", email=f"cohort{index}@test.com") for index in range(4)]
+        invitation_factory(quiz=quiz, participant=participants[3], invited_by=user)
+
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"user_{participants[0].id}", channel)
+        get_presence().add(participants[0].id, channel)
+
+        url = reverse("quiz_bulk_invitation", kwargs={"pk": quiz.id})
+        data = {"participants": [
+            str(participants[0].id), participants[1].email, str(participants[2].id), participants[2].email,
+            str(participants[3].id), "nobody@test.com",
+        ]}
+        # Constant whatever the number of participants
+        with django_assert_max_num_queries(8), django_capture_on_commit_callbacks(execute=True):
+            response = client.post(url, data, format="json")
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert [created["participant"] for created in response.data["created"]] == [p.id for p in participants[:3]]
+        assert response.data["skipped"] == [
+            {"participant": participants[2].email, "reason": "already_invited"},
+            {"participant": str(participants[3].id), "reason": "already_invited"},
+            {"participant": "nobody@test.com", "reason": "unknown_user"},
+        ]
+        assert Invitation.objects.filter(quiz=quiz).count() == 4
+
+        get_dispatcher().flush()
+        message = async_to_sync(channel_layer.receive)(channel)
+        assert message["content"]["invitation_id"] == str(response.data["created"][0]["id"])
+        assert message["content"]["quiz_title"] == quiz.title
+        # Every invitation waits in its participant's inbox, the one sent as well
+        # Other tests leave committed notifications behind, only look at this test's participants
+        notifications = Notification.objects.filter(recipient__in=participants)
+        assert message["content"]["notification_id"] == notifications.get(
+            recipient=participants[0], content__invitation_id=message["content"]["invitation_id"]
+        ).id
+        assert sorted(notifications.values_list("content__invitation_id", flat=True)) == \
+            sorted(str(created["id"]) for created in response.data["created"])
+
+    def test_bulk_invitations_need_quiz_owner(self, authenticated_client, quiz_factory, user_factory):
+        client, _ = authenticated_client
+        quiz = quiz_factory(owner=user_factory(username="other", email="other@own.er"))
+
+        url = reverse("quiz_bulk_invitation", kwargs={"pk": quiz.id})
+        response = client.post(url, {"participants": ["other@own.er"]}, format="json")
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_list_invitations(self, authenticated_client, quiz_factory, user_factory, invitation_factory):
+        client, user = authenticated_client
+        inviter = user_factory(username="inviter_l", email="inviter_l@inv.ite")
+        for index in range(3):
+            invitation_factory(quiz=quiz_factory(owner=inviter, title=f"Invite {index}"), participant=user,
+                               invited_by=inviter)
+
+        response = client.get(reverse("list_invitations"), {"page_size": 2, "count": "true"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 3
+        assert [invitation["quiz"]["title"] for invitation in response.data["results"]] == ["Invite 2", "Invite 1"]
+        assert response.data["next"]
+
     def test_respond_invitation(self, authenticated_client, quiz_factory, user_factory, invitation_factory):
         client, user = authenticated_client
         quiz = quiz_factory()
@@ -119,10 +448,38 @@ class TestAttemptViews:
         attempt_factory(quiz=quiz, participant=user)
 
         url = reverse("quiz_attempt_creation")
-        response = client.get(url)
+        response = client.get(url, {"count": "true"})
 
         assert response.status_code == status.HTTP_200_OK
         assert response.data["count"] == 1
+        assert len(response.data["results"]) == 1
+
+    def test_list_attempt_pages(self, authenticated_client, quiz_factory, attempt_factory,
+                                django_assert_num_queries):
+        client, user = authenticated_client
+        owner = quiz_factory().owner
+        attempts = [attempt_factory(quiz=quiz_factory(owner=owner, title=f"Quiz {index}"), participant=user)
+                    for index in range(5)]
+
+        url, seen = reverse("quiz_attempt_creation") + "?page_size=2", []
+        client.get(url)
+        while url:
+            # The validators and one query per page, no COUNT(*)
+            with django_assert_num_queries(2):
+                response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert "count" not in response.data
+            seen.extend(attempt["id"] for attempt in response.data["results"])
+            url = response.data["next"]
+
+        assert seen == [str(attempt.id) for attempt in reversed(attempts)]
+
+    def test_list_attempt_invalid_cursor(self, authenticated_client):
+        client, _ = authenticated_client
+
+        response = client.get(reverse("quiz_attempt_creation"), {"cursor": "nonsense"})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
 
     def test_submit_attempt(self, authenticated_client, quiz_factory, question_factory, choice_factory,
                             attempt_factory):
@@ -147,3 +504,42 @@ class TestAttemptViews:
 
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data["answers"]) == 1
+
+    def test_submit_attempt_query_count(self, authenticated_client, quiz_factory, question_factory, choice_factory,
+                                        attempt_factory, django_assert_max_num_queries):
+        client, user = authenticated_client
+        quiz = quiz_factory()
+        answers = []
+        for order in range(20):
+            question = question_factory(quiz=quiz, order=order, points=2)
+            correct_choice = choice_factory(question=question, is_correct=True, order=0)
+            choice_factory(question=question, order=1)
+            answers.append({"question": question.id, "selected_choice": correct_choice.id})
+        attempt = attempt_factory(quiz=quiz, participant=user)
+
+        url = reverse("quiz_attempt_submission", kwargs={"pk": attempt.id})
+        # Constant whatever the number of answers, including a cold answer key
+        with django_assert_max_num_queries(15):
+            response = client.patch(url, {"answers": answers}, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["answers"]) == 20
+        assert response.data["status"] == Attempt.COMPLETED
+        attempt.refresh_from_db()
+        assert attempt.score == 40
+
+    def test_submit_attempt_rejects_foreign_choice(self, authenticated_client, quiz_factory, question_factory,
+                                                  choice_factory, attempt_factory):
+        client, user = authenticated_client
+        quiz = quiz_factory()
+        question = question_factory(quiz=quiz)
+        choice_factory(question=question, is_correct=True)
+        other_question = question_factory(quiz=quiz_factory(owner=quiz.owner, title="Other"))
+        foreign_choice = choice_factory(question=other_question, is_correct=True)
+        attempt = attempt_factory(quiz=quiz, participant=user)
+
+        url = reverse("quiz_attempt_submission", kwargs={"pk": attempt.id})
+        data = {"answers": [{"question": question.id, "selected_choice": foreign_choice.id}]}
+        response = client.patch(url, data, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST